@@ -0,0 +1,254 @@
+"""
+animation.py
+------------
+Motor de animaciones de LEDs: las celebraciones, los parpadeos de fallo y los espectáculos
+de test_tile12 son clips que un único Renderer compone en fotogramas a un fps fijo.
+
+    - Un Clip es una línea de tiempo de fotogramas clave (instante, {destino: comando});
+      el estado de cada destino se mantiene hasta su siguiente fotograma clave.
+    - En cada fotograma el Renderer compone todos los clips activos (el más reciente manda
+      sobre los destinos que comparte con otros) y publica como mucho un comando por destino,
+      y solo si cambia respecto al fotograma anterior.
+    - Si la cola del broker va atrasada (backlog() > max_backlog) el fotograma se descarta
+      entero: los clips dependen del tiempo, así que el siguiente fotograma ya sale al día.
+
+Los destinos (tópicos de LED) y los comandos son opacos: dicts para el motor, bytes ya
+serializados para test_tile12. No importa config ni logic.
+"""
+
+import threading
+import time
+from bisect import bisect_right
+
+
+class Clip:
+    """
+    Animación como lista de fotogramas clave [(t, {destino: comando}), ...] con t en segundos
+    desde el inicio. Pasado `duration` el clip termina con el estado de su último fotograma clave.
+    """
+
+    __slots__ = ("name", "times", "states", "duration", "targets")
+
+    def __init__(self, keyframes, duration=None, name=""):
+        self.name = name
+        self.times = []
+        self.states = []       # estado acumulado en cada fotograma clave
+        current = {}
+        for t, frame in sorted(keyframes, key=lambda kf: kf[0]):
+            current = {**current, **frame}
+            if self.times and self.times[-1] == t:
+                self.states[-1] = current
+            else:
+                self.times.append(t)
+                self.states.append(current)
+        self.duration = duration if duration is not None else (self.times[-1] if self.times else 0.0)
+        self.targets = frozenset(current)
+
+    def frame(self, t):
+        """Estado {destino: comando} en el instante t (vacío antes del primer fotograma clave)."""
+        i = bisect_right(self.times, t) - 1
+        return self.states[i] if i >= 0 else {}
+
+    def final(self):
+        return self.states[-1] if self.states else {}
+
+    def then(self, other, name=None):
+        """Clip que reproduce `other` a continuación de este."""
+        shift = self.duration
+        keyframes = [(t, frame) for t, frame in zip(self.times, self.states)]
+        keyframes += [(shift + t, frame) for t, frame in zip(other.times, other.states)]
+        return Clip(keyframes, shift + other.duration, name if name is not None else self.name)
+
+
+# ======================
+# Constructores de clips
+# ======================
+def hold(targets, cmd, duration=0.0, name="hold"):
+    """Todos los destinos con `cmd` durante `duration` s."""
+    return Clip([(0.0, dict.fromkeys(targets, cmd))], duration, name)
+
+
+def mix(commands, duration=0.0, name="mix"):
+    """Cada destino con su comando ({destino: comando}) durante `duration` s."""
+    return Clip([(0.0, dict(commands))], duration, name)
+
+
+def chase(targets, cmd, delay, name="chase"):
+    """Enciende los destinos uno tras otro cada `delay` s (cada uno se queda encendido)."""
+    targets = list(targets)
+    keyframes = [(i * delay, {target: cmd}) for i, target in enumerate(targets)]
+    return Clip(keyframes, len(targets) * delay, name)
+
+
+def cycle(targets, commands, interval, duration, name="cycle"):
+    """Todos los destinos recorren `commands` en bucle, uno cada `interval` s, durante `duration` s."""
+    targets = list(targets)
+    steps = max(1, int(round(duration / interval)))
+    keyframes = [(i * interval, dict.fromkeys(targets, commands[i % len(commands)])) for i in range(steps)]
+    return Clip(keyframes, duration, name)
+
+
+def blink(targets, on_cmd, off_cmd, period, times, name="blink"):
+    """`times` parpadeos: `period` s en on_cmd y `period` s en off_cmd; termina en off_cmd."""
+    targets = list(targets)
+    keyframes = []
+    for i in range(times):
+        keyframes.append((2 * i * period, dict.fromkeys(targets, on_cmd)))
+        keyframes.append(((2 * i + 1) * period, dict.fromkeys(targets, off_cmd)))
+    return Clip(keyframes, 2 * times * period, name)
+
+
+# ======================
+# Renderer
+# ======================
+class _Playing:
+    __slots__ = ("clip", "start", "owner", "on_done")
+
+    def __init__(self, clip, start, owner, on_done):
+        self.clip = clip
+        self.start = start
+        self.owner = owner
+        self.on_done = on_done
+
+
+class Renderer:
+    """
+    Reproduce clips a `fps` fotogramas por segundo y publica con publish(destino, comando).
+
+    Los fotogramas se programan con schedule(delay, fn) (en el motor, el planificador de logic,
+    para que todo se ejecute en su hilo); sin schedule, el Renderer usa un hilo propio.
+    Solo hay fotogramas mientras queda algún clip activo.
+    """
+
+    def __init__(self, publish, fps=20, schedule=None, backlog=None, max_backlog=0, clock=time.monotonic):
+        self.publish = publish
+        self.fps = fps
+        self.schedule = schedule
+        self.backlog = backlog
+        self.max_backlog = max_backlog
+        self.clock = clock
+        self._playing = []       # en orden de inicio: el último manda
+        self._last = {}          # destino -> comando publicado en el último fotograma
+        self._lock = threading.RLock()
+        self._tick_pending = False
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.frames = 0
+        self.frames_dropped = 0
+        self.commands = 0
+
+    # ======================
+    # Clips
+    # ======================
+    def play(self, clip, owner=None, on_done=None):
+        """Empieza a reproducir `clip` en el siguiente fotograma; on_done() se llama al acabar."""
+        with self._lock:
+            self._playing.append(_Playing(clip, self.clock(), owner, on_done))
+            self._ensure_ticking(0.0)
+
+    def stop_owner(self, owner):
+        """Detiene sin más los clips de `owner` (sus LEDs quedan como estén)."""
+        with self._lock:
+            kept = [p for p in self._playing if p.owner is not owner]
+            for p in self._playing:
+                if p.owner is owner:
+                    self._forget(p.clip.targets)
+            self._playing[:] = kept
+
+    def stop_all(self):
+        with self._lock:
+            self._playing.clear()
+            self._last.clear()
+
+    def active(self):
+        with self._lock:
+            return len(self._playing)
+
+    def _forget(self, targets):
+        for target in targets:
+            self._last.pop(target, None)
+
+    # ======================
+    # Fotogramas
+    # ======================
+    def tick(self):
+        """Compone y publica un fotograma; devuelve True si quedan clips activos."""
+        with self._lock:
+            self._tick_pending = False
+            if not self._playing:
+                return False
+            if self.backlog is not None and self.backlog() > self.max_backlog:
+                self.frames_dropped += 1
+                self._ensure_ticking(1.0 / self.fps)
+                return True
+
+            now = self.clock()
+            frame = {}
+            finished = []
+            for p in self._playing:
+                t = now - p.start
+                if t >= p.clip.duration:
+                    frame.update(p.clip.final())
+                    finished.append(p)
+                else:
+                    frame.update(p.clip.frame(t))
+
+            last = self._last
+            for target, cmd in frame.items():
+                if last.get(target) != cmd:
+                    last[target] = cmd
+                    self.publish(target, cmd)
+                    self.commands += 1
+            self.frames += 1
+
+            done = []
+            if finished:
+                for p in finished:
+                    self._playing.remove(p)
+                    if p.on_done is not None:
+                        done.append(p.on_done)
+                still = set()
+                for p in self._playing:
+                    still |= p.clip.targets
+                self._forget([t for p in finished for t in p.clip.targets if t not in still])
+            if self._playing:
+                self._ensure_ticking(1.0 / self.fps)
+        for fn in done:
+            fn()
+        return bool(self._playing)
+
+    def _ensure_ticking(self, delay):
+        if self._tick_pending:
+            return
+        self._tick_pending = True
+        if self.schedule is not None:
+            self.schedule(delay, self.tick)
+        else:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="animation", daemon=True)
+                self._thread.start()
+            self._wakeup.set()
+
+    def _run(self):
+        """Bucle del hilo propio: fotogramas a paso fijo mientras haya clips; espera si no."""
+        period = 1.0 / self.fps
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            next_frame = self.clock()
+            while self.tick():
+                next_frame += period
+                delay = next_frame - self.clock()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame = self.clock()   # atrasados: no acumular fotogramas
+
+    def stats(self):
+        return {
+            "fps": self.fps,
+            "active_clips": len(self._playing),
+            "frames": self.frames,
+            "frames_dropped": self.frames_dropped,
+            "commands": self.commands,
+        }
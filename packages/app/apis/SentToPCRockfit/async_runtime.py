@@ -0,0 +1,293 @@
+"""
+async_runtime.py
+----------------
+Modo de ejecución asyncio del motor de circuitos, alternativo a mqtt.Client().loop_start()
+más hilos: la E/S MQTT (paho integrado en el bucle con add_reader/add_writer), las tareas
+diferidas (finalize, fotogramas de animación de LEDs, plazos de timeout) y el feed de
+instantáneas para la GUI corren todos en un único bucle asyncio.
+
+Uso:
+    asyncio.run(async_runtime.run(["circuito_2"]))
+o, desde la GUI, async_runtime.start_in_thread(["circuito_2"]).
+Para pruebas se puede pasar un local_broker.LocalClient como `client`.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+import logic
+from engine_loop import EngineLoop
+from scheduler import ScheduledTask
+
+# Última instantánea publicada por publish_snapshots (la lee la GUI desde su hilo)
+latest_snapshot = None
+
+
+class AsyncEngineLoop(EngineLoop):
+    """EngineLoop sobre un bucle asyncio: submit() programa la llamada en el bucle."""
+
+    def __init__(self, loop, maxsize=1024, name="rockfit-async-engine"):
+        super().__init__(maxsize, name)
+        self.loop = loop
+        self._maxsize = maxsize
+        self._depth = 0
+
+    def start(self):
+        pass
+
+    def stop(self, timeout=1.0):
+        pass
+
+    def in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def submit(self, fn, *args, block=False):
+        if self.in_loop():
+            self._execute(fn, args, time.perf_counter())
+            return True
+        with self._lock:
+            if self._depth >= self._maxsize and not block:
+                self.dropped += 1
+                logging.warning("[%s] Cola llena (%d); se descarta %s.", self.name, self._maxsize, getattr(fn, "__name__", fn))
+                return False
+            self._depth += 1
+            if self._depth > self.max_depth:
+                self.max_depth = self._depth
+        self.submitted += 1
+        self.loop.call_soon_threadsafe(self._run_item, fn, args, time.perf_counter())
+        return True
+
+    def depth(self):
+        return self._depth
+
+    def _run_item(self, fn, args, enqueued_at):
+        with self._lock:
+            self._depth -= 1
+        self._execute(fn, args, enqueued_at)
+
+
+class AsyncScheduler:
+    """
+    Misma API que scheduler.Scheduler sobre loop.call_at.
+    Debe usarse desde el hilo del bucle (el resto de hilos pasan por engine.submit), salvo
+    call_later/call_at: desde otro hilo (p. ej. la cola de salida de logic_devices, que se
+    mueve en el de la GUI y en el de paho) la tarea se arma con loop.call_soon_threadsafe.
+    """
+
+    def __init__(self, loop, name="rockfit-async-scheduler"):
+        self.name = name
+        self.loop = loop
+        self._handles = {}
+        self._by_owner = {}
+
+        # Contadores
+        self.executed = 0
+        self.cancelled = 0
+        self.errors = 0
+        self.late_total = 0.0
+        self.late_max = 0.0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        for handle in self._handles.values():
+            handle.cancel()
+        self._handles.clear()
+        self._by_owner.clear()
+
+    def call_later(self, delay, fn, *args, owner=None):
+        return self.call_at(time.monotonic() + delay, fn, *args, owner=owner)
+
+    def call_at(self, when, fn, *args, owner=None):
+        task = ScheduledTask(when, fn, args, owner)
+        if self._in_loop():
+            self._arm(task)
+        else:
+            self.loop.call_soon_threadsafe(self._arm, task)
+        return task
+
+    def _in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _arm(self, task):
+        if task.cancelled:
+            return
+        loop_when = self.loop.time() + (task.when - time.monotonic())
+        self._handles[task] = self.loop.call_at(loop_when, self._execute, task)
+        if task.owner is not None:
+            self._by_owner.setdefault(task.owner, set()).add(task)
+
+    def cancel(self, task):
+        handle = self._handles.pop(task, None)
+        if handle is None:
+            return
+        handle.cancel()
+        task.cancelled = True
+        self.cancelled += 1
+        self._forget_owner(task)
+
+    def cancel_owner(self, owner):
+        tasks = self._by_owner.pop(owner, ())
+        for task in tasks:
+            handle = self._handles.pop(task, None)
+            if handle is not None:
+                handle.cancel()
+                task.cancelled = True
+                self.cancelled += 1
+        return len(tasks)
+
+    def pending(self):
+        return len(self._handles)
+
+    def stats(self):
+        executed = self.executed
+        return {
+            "pending": len(self._handles),
+            "executed": executed,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+            "late_avg_ms": (self.late_total / executed * 1000.0) if executed else 0.0,
+            "late_max_ms": self.late_max * 1000.0,
+        }
+
+    def _forget_owner(self, task):
+        if task.owner is None:
+            return
+        tasks = self._by_owner.get(task.owner)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._by_owner[task.owner]
+
+    def _execute(self, task):
+        self._handles.pop(task, None)
+        task.queued = False
+        self._forget_owner(task)
+        late = time.monotonic() - task.when
+        self.late_total += late
+        if late > self.late_max:
+            self.late_max = late
+        try:
+            task.fn(*task.args)
+        except Exception:
+            self.errors += 1
+            logging.exception("[%s] Error ejecutando tarea programada %r", self.name, task.fn)
+        self.executed += 1
+
+
+class AsyncioMqttHelper:
+    """Conecta el socket de un cliente paho al bucle asyncio (sin hilo loop_start)."""
+
+    def __init__(self, loop, client):
+        self.loop = loop
+        self.client = client
+        self._misc = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self._misc = self.loop.create_task(self.misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        if self._misc is not None:
+            self._misc.cancel()
+            self._misc = None
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def misc_loop(self):
+        """Keepalive y reintentos de paho, una vez por segundo."""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                break
+
+
+def install(loop):
+    """Sustituye el bucle y el planificador de hilos de logic por sus equivalentes asyncio."""
+    logic.engine = AsyncEngineLoop(loop, logic.ENGINE_QUEUE_SIZE)
+    logic.scheduler = AsyncScheduler(loop)
+
+
+def ui_snapshot():
+    """Estado compacto de los circuitos para la GUI."""
+    return {
+        "ts": time.time(),
+        "circuits": [
+            {
+                "instance_id": c.instance_id,
+                "name": c.name,
+                "state": c.state,
+                "current_index": c.current_index,
+                "total_steps": len(c.sequence),
+                "elapsed": c.elapsed(),
+                "assigned_users": list(c.assigned_users),
+                "color": c.get_current_color(),
+            }
+            for c in logic.circuits
+        ],
+        "completed": len(logic.completed_circuits),
+        "engine": logic.engine.stats(),
+        "scheduler": logic.scheduler.stats(),
+    }
+
+
+async def publish_snapshots(interval=1.0):
+    """Refresca latest_snapshot cada `interval` segundos."""
+    global latest_snapshot
+    while True:
+        latest_snapshot = ui_snapshot()
+        await asyncio.sleep(interval)
+
+
+async def run(active_circuits, client=None, snapshot_interval=1.0):
+    """Arranca el motor en el bucle actual y lo mantiene vivo (se detiene cancelando la tarea)."""
+    loop = asyncio.get_running_loop()
+    install(loop)
+    if client is None:
+        client = mqtt.Client()
+        AsyncioMqttHelper(loop, client)
+    snap = logic.load_snapshot() if logic.config.SNAPSHOT_RESTORE else None
+    logic.init_mqtt_client(client, start_loop=False)
+    logic.start_config_watch()
+    if snap is not None:
+        logic.restore_state(snap, active_circuits)
+    else:
+        logic.apply_active_circuits(list(active_circuits))
+    logic.start_metrics_export()
+    logic.start_snapshots()
+    logic.start_liveness()
+    logic.start_results_flush()
+    logging.info("Motor en modo asyncio listo.")
+    await publish_snapshots(snapshot_interval)
+
+
+def start_in_thread(active_circuits, client=None):
+    """Ejecuta run() en un hilo propio con su bucle asyncio (para la GUI de Kivy)."""
+    thread = threading.Thread(
+        target=lambda: asyncio.run(run(active_circuits, client)),
+        name="rockfit-asyncio",
+        daemon=True,
+    )
+    thread.start()
+    return thread
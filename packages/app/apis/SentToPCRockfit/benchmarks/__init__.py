@@ -0,0 +1,7 @@
+"""
+benchmarks
+----------
+Scripts de medida del motor de circuitos. Se ejecutan desde la carpeta SentToPCRockfit:
+
+    python -m benchmarks.bench_dispatch
+"""
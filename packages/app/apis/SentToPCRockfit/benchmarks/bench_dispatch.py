@@ -0,0 +1,59 @@
+"""
+bench_dispatch.py
+-----------------
+Compara el coste de entregar un tap recorriendo todos los circuitos (método anterior)
+frente al índice global topic_index de logic, para 3 a 500 circuitos activos.
+
+    python -m benchmarks.bench_dispatch
+"""
+
+import argparse
+
+import logic
+from benchmarks.common import NullClient, quiet_logging, make_devices, make_circuit_config, time_per_call
+
+STEPS_PER_CIRCUIT = 3
+
+
+def build_venue(n_circuits, client):
+    logic.registry.clear_instances()
+    devices = make_devices(n_circuits * STEPS_PER_CIRCUIT)
+    for i in range(n_circuits):
+        members = devices[i * STEPS_PER_CIRCUIT:(i + 1) * STEPS_PER_CIRCUIT]
+        conf = make_circuit_config(f"bench_{i}", members)
+        logic.register_circuit(logic.StrictCircuit(conf, client))
+    # Tap sobre un dispositivo no de control del primer circuito: no cambia de estado
+    return logic.config.DEVICES_CONFIG[devices[1]]["tap_topic"]
+
+
+def legacy_dispatch(topic, payload):
+    for c in logic.circuits:
+        c.handle_event(topic, payload)
+
+
+def run(sizes, iterations):
+    client = NullClient()
+    print(f"{'circuitos':>10} {'recorrido (us)':>15} {'indice (us)':>12}")
+    for n in sizes:
+        topic = build_venue(n, client)
+
+        def legacy():
+            legacy_dispatch(topic, "")
+
+        def indexed():
+            logic.dispatch_event(topic, "")
+
+        t_legacy = time_per_call(legacy, iterations)
+        t_index = time_per_call(indexed, iterations)
+        for c in logic.circuits:
+            c.timestamps.clear()
+        print(f"{n:>10} {t_legacy:>15.2f} {t_index:>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de despacho tópico -> circuito")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[3, 10, 50, 100, 250, 500])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    quiet_logging()
+    run(args.sizes, args.iterations)
@@ -0,0 +1,94 @@
+"""
+bench_instances.py
+------------------
+Memoria por instancia y tiempo de creación de 10k circuitos: representación compacta
+actual (CircuitBase con __slots__ y especificación compartida) frente a la anterior
+(__dict__ con copia de la configuración, topic_map propio y uuid4 por instancia).
+
+    python -m benchmarks.bench_instances
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+import uuid
+
+import config
+import logic
+from benchmarks.common import NullClient, quiet_logging, make_devices, make_circuit_config
+
+
+class LegacyCircuit:
+    """Réplica del __init__ anterior de CircuitBase, solo para comparar."""
+
+    def __init__(self, circuit_config, client):
+        self.client = client
+        self.config = circuit_config
+        self.id = circuit_config["id"]
+        self.name = circuit_config.get("name", self.id)
+        self.description = circuit_config.get("description", "")
+        self.steps = sorted(circuit_config.get("steps", []), key=lambda x: x["order"])
+        self.sequence = [step["device"] for step in self.steps]
+        self.control_device = circuit_config.get("control_device", self.steps[0]["device"] if self.steps else None)
+        self.color_initial = circuit_config.get("color_initial", {"r": 0, "g": 255, "b": 0})
+        self.color_mode = circuit_config.get("color_mode", "variable")
+        self.max_time = circuit_config.get("max_time", 0)
+        self.completion_effect = circuit_config.get("completion_effect", "celebration")
+        self.order_mode = circuit_config.get("order_mode", "strict")
+        self.state_reposo = circuit_config.get("state_reposo", "only_active")
+        self.surpassed_light = circuit_config.get("surpassed_light", 0)
+        self.default_wait_brightness_strict = circuit_config.get("default_wait_brightness_strict", 50)
+        self.default_wait_brightness_flexible = circuit_config.get("default_wait_brightness_flexible", 60)
+        self.state = logic.STATE_WAITING
+        self.current_index = 0
+        self.start_time = None
+        self.timestamps = []
+        self.user_color = self.color_initial.copy()
+        self.topic_map = {}
+        for device in set(self.sequence):
+            dev_cfg = config.DEVICES_CONFIG.get(device, {})
+            tap_topic = dev_cfg.get("tap_topic")
+            double_tap_topic = dev_cfg.get("double_tap_topic")
+            if tap_topic:
+                self.topic_map[tap_topic] = (device, "tap")
+            if double_tap_topic:
+                self.topic_map[double_tap_topic] = (device, "double_tap")
+        self.instance_id = str(uuid.uuid4())[:8]
+        self.assigned_users = []
+        self.total_time = 0
+        self.deadline_task = None
+
+
+def measure(cls, conf, client, n):
+    """Devuelve (bytes por instancia, microsegundos por instancia)."""
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    instances = [cls(conf, client) for _ in range(n)]
+    elapsed = time.perf_counter() - start
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del instances
+    return used / n, elapsed / n * 1e6
+
+
+def run(n, steps):
+    client = NullClient()
+    conf = make_circuit_config("bench_instances", make_devices(steps))
+    config.get_circuit_spec(conf)  # la compilación es única por circuito, no por instancia
+    print(f"{n} instancias, {steps} pasos por circuito")
+    print(f"{'representación':>16} {'bytes/inst':>11} {'creación (us)':>14}")
+    for label, cls in (("anterior", LegacyCircuit), ("compacta", logic.StrictCircuit)):
+        per_inst, per_us = measure(cls, conf, client, n)
+        print(f"{label:>16} {per_inst:>11.0f} {per_us:>14.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de memoria por instancia de circuito")
+    parser.add_argument("--instances", type=int, default=10000)
+    parser.add_argument("--steps", type=int, default=5)
+    args = parser.parse_args()
+    quiet_logging()
+    run(args.instances, args.steps)
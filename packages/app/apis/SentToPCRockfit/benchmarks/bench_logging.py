@@ -0,0 +1,79 @@
+"""
+bench_logging.py
+----------------
+Mensajes por segundo que procesa logic.handle_message con el logging:
+  - desactivado (nivel WARNING),
+  - síncrono (FileHandler directo en el hilo que registra, como basicConfig),
+  - en cola (rockfit_logging: QueueHandler + QueueListener con fichero rotativo).
+Cada mensaje genera dos registros INFO (recepción y evento del circuito).
+
+    python -m benchmarks.bench_logging
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import logic
+import rockfit_logging
+from benchmarks.common import NullClient, make_devices, make_circuit_config
+
+
+def build_venue(client):
+    logic.registry.clear_instances()
+    devices = make_devices(3, prefix="benchlog")
+    logic.register_circuit(logic.StrictCircuit(make_circuit_config("bench_logging", devices), client))
+    # Tap en un dispositivo que no es el del paso actual: se registra pero no cambia el estado
+    return logic.config.DEVICES_CONFIG[devices[2]]["tap_topic"]
+
+
+def rate(topic, n):
+    """Mensajes/s; received_at avanza 1 s por mensaje para que el debounce no descarte nada."""
+    payload = b"1"
+    start = time.perf_counter()
+    for i in range(n):
+        logic.handle_message(topic, payload, float(i))
+    elapsed = time.perf_counter() - start
+    for c in logic.circuits:
+        c.timestamps.clear()
+    return n / elapsed
+
+
+def run(n):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    topic = build_venue(NullClient())
+    tmp = tempfile.mkdtemp(prefix="rockfit-logs-")
+    results = []
+
+    root.setLevel(logging.WARNING)
+    results.append(("desactivado", rate(topic, n), 0.0))
+
+    sync_handler = logging.FileHandler(os.path.join(tmp, "sync.log"), encoding="utf-8")
+    sync_handler.setFormatter(logging.Formatter(rockfit_logging.CONSOLE_FORMAT))
+    root.addHandler(sync_handler)
+    root.setLevel(logging.INFO)
+    results.append(("síncrono", rate(topic, n), 0.0))
+    root.removeHandler(sync_handler)
+    sync_handler.close()
+
+    rockfit_logging.setup(logging.INFO, log_dir=tmp, filename="queue.log", console=False)
+    msgs = rate(topic, n)
+    drain_start = time.perf_counter()
+    rockfit_logging.shutdown()
+    results.append(("en cola", msgs, time.perf_counter() - drain_start))
+
+    print(f"{n} mensajes (2 registros INFO por mensaje), logs en {tmp}")
+    print(f"{'logging':>12} {'mensajes/s':>12} {'vaciado cola (s)':>17}")
+    for label, msgs_s, drain in results:
+        print(f"{label:>12} {msgs_s:>12.0f} {drain:>17.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de logging en el camino caliente MQTT")
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+    run(args.messages)
@@ -0,0 +1,68 @@
+"""
+bench_metrics.py
+----------------
+Coste de la instrumentación de latencias (metrics.py): una observación suelta
+(perf_counter_ns + bisect + sumas) y el camino completo de un tap con todas sus etapas,
+frente al mismo tap sin instrumentar (histogramas sustituidos por uno nulo); se toma
+el mínimo de varias rondas alternas.
+
+    python -m benchmarks.bench_metrics
+"""
+
+import argparse
+
+import logic
+import metrics
+from benchmarks.common import NullClient, quiet_logging, make_devices, make_circuit_config, time_per_call
+
+
+class NullHistogram:
+    def observe_ns(self, ns):
+        pass
+
+
+def tap_loop(iterations):
+    """µs por tap (handle_message completo) alternando dos pasos de un circuito strict."""
+    devices = make_devices(2, prefix="metrics")
+    conf = make_circuit_config("metrics_0", devices)
+    circuit = logic.StrictCircuit(conf, NullClient())
+    logic.registry.clear_instances()
+    logic.register_circuit(circuit)
+    topics = [logic.config.DEVICES_CONFIG[d]["tap_topic"] for d in devices]
+    state = {"i": 0}
+
+    def tap():
+        i = state["i"] = state["i"] + 1
+        logic.handle_message(topics[i & 1], b"1", i, 0)
+
+    return time_per_call(tap, iterations)
+
+
+def run(iterations, rounds=3):
+    h = metrics.Histogram("bench")
+    print(f"observe_ns:          {time_per_call(lambda: h.observe_ns(1234), iterations):.3f} µs")
+
+    tap_loop(iterations)   # calentamiento (cachés de config, logging, shadow)
+    saved = {name: getattr(metrics, name) for name in
+             ("CALLBACK", "QUEUE_WAIT", "DISPATCH", "HANDLER", "COMMAND_BUILD", "PUBLISH_ENQUEUE")}
+    instrumented = bare = float("inf")
+    for _ in range(rounds):
+        instrumented = min(instrumented, tap_loop(iterations))
+        for name in saved:
+            setattr(metrics, name, NullHistogram())
+        try:
+            bare = min(bare, tap_loop(iterations))
+        finally:
+            for name, hist in saved.items():
+                setattr(metrics, name, hist)
+    print(f"tap instrumentado:   {instrumented:.3f} µs")
+    print(f"tap sin histogramas: {bare:.3f} µs  (sobrecoste {instrumented - bare:+.3f} µs por tap)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sobrecoste de los histogramas de latencia")
+    parser.add_argument("--iterations", type=int, default=50000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    quiet_logging()
+    run(args.iterations, args.rounds)
@@ -0,0 +1,90 @@
+"""
+bench_outbound.py
+-----------------
+Ráfaga de comandos de LED contra un broker lento (confirma cada publicación tras
+--ack-ms) con y sin la cola de salida (outbound.py): cuántos comandos llegan a paho,
+cuántos se fusionan o descartan, y cuánto tarda en salir el último estado de cada LED.
+Mitad de la ráfaga es cosmética (animación) y mitad crítica (juego).
+
+    python -m benchmarks.bench_outbound --devices 40 --commands 4000 --ack-ms 5
+"""
+
+import argparse
+import threading
+import time
+
+from local_broker import LocalPublishInfo
+from outbound import OutboundQueue, PRIORITY_CRITICAL, PRIORITY_COSMETIC
+
+
+class SlowClient:
+    """Cliente que confirma cada publicación `ack_s` después, en orden, desde otro hilo."""
+
+    def __init__(self, ack_s):
+        self.ack_s = ack_s
+        self.on_publish = None
+        self.published = 0
+        self.last = {}
+        self._next_free = time.monotonic()
+        self._lock = threading.Lock()
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        with self._lock:
+            self.published += 1
+            mid = self.published
+            # El "ESP32" procesa los comandos de uno en uno: cada uno espera a los anteriores
+            self._next_free = max(self._next_free, time.monotonic()) + self.ack_s
+            done_at = self._next_free
+        self.last[topic] = (payload, done_at)
+        if self.on_publish is not None:
+            threading.Timer(done_at - time.monotonic(), self.on_publish, (self, None, mid)).start()
+        return LocalPublishInfo(mid)
+
+
+def burst(devices, commands):
+    topics = [f"devices/bench{i}/light/leds/command" for i in range(devices)]
+    return [(topics[i % devices], f"{i}".encode(), PRIORITY_COSMETIC if i % 2 else PRIORITY_CRITICAL)
+            for i in range(commands)]
+
+
+def run(stream, ack_s, use_queue):
+    client = SlowClient(ack_s)
+    t0 = time.monotonic()
+    if use_queue:
+        outbox = OutboundQueue(max_pending=256, max_inflight=8)
+        client.on_publish = lambda c, u, mid: outbox.acked(mid)
+        for topic, payload, priority in stream:
+            outbox.put(topic, payload, priority, client)
+        while outbox.depth():
+            time.sleep(0.001)
+        stats = outbox.stats()
+    else:
+        for topic, payload, _ in stream:
+            client.publish(topic, payload)
+        stats = {}
+    final = {}
+    for topic, payload, _ in stream:
+        final[topic] = payload
+    ok = all(client.last[t][0] == p for t, p in final.items())
+    settled = max(done_at for _, done_at in client.last.values()) - t0
+    return client.published, settled, ok, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la cola de salida de comandos")
+    parser.add_argument("--devices", type=int, default=40)
+    parser.add_argument("--commands", type=int, default=4000)
+    parser.add_argument("--ack-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    stream = burst(args.devices, args.commands)
+    print(f"{args.commands} comandos a {args.devices} LEDs, confirmación a {args.ack_ms} ms por comando")
+    for label, use_queue in (("sin cola", False), ("con cola", True)):
+        published, settled, ok, stats = run(stream, args.ack_ms / 1000, use_queue)
+        extra = f"  fusiones={stats['merges']} descartes={stats['drops']} prof_max={stats['max_depth']}" if stats else ""
+        print(f"  {label}: publicados={published:5d}  último estado en {settled * 1000:8.1f} ms  "
+              f"estado final correcto={ok}{extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+bench_payload_cache.py
+----------------------
+Coste por comando de json.dumps(cmd) (camino anterior) frente a config.get_command_payload(cmd)
+para los comandos típicos del motor y para colores arbitrarios del selector de color.
+
+    python -m benchmarks.bench_payload_cache
+"""
+
+import argparse
+import json
+import random
+
+import config
+from benchmarks.common import time_per_call
+
+TYPICAL_COMMANDS = [
+    config.get_led_off_command(),
+    dict(config.get_led_on_command(color=config.COLOR_GREEN, brightness=config.DEFAULT_BRIGHTNESS), effect="none"),
+    dict(config.get_led_on_command(color=config.COLOR_MAGENTA, brightness=63), effect="none"),
+    dict(config.get_led_effect_command("Fast Pulse"), color=config.COLOR_CYAN, brightness=config.DEFAULT_BRIGHTNESS),
+]
+
+
+def picker_commands(n, seed=0):
+    rnd = random.Random(seed)
+    return [
+        config.get_led_on_command(color={"r": rnd.randrange(256), "g": rnd.randrange(256), "b": rnd.randrange(256)},
+                                  brightness=100)
+        for _ in range(n)
+    ]
+
+
+def bench(label, commands, iterations):
+    n = len(commands)
+    state = {"i": 0}
+
+    def dumps():
+        i = state["i"] = (state["i"] + 1) % n
+        json.dumps(commands[i])
+
+    def cached():
+        i = state["i"] = (state["i"] + 1) % n
+        config.get_command_payload(commands[i])
+
+    t_dumps = time_per_call(dumps, iterations)
+    t_cached = time_per_call(cached, iterations)
+    print(f"{label:<28} {t_dumps:>12.3f} {t_cached:>12.3f} {t_dumps / t_cached:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmark de la caché de payloads LED")
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+    print(f"{'comandos':<28} {'dumps (us)':>12} {'caché (us)':>12} {'mejora':>9}")
+    bench("paleta del motor", TYPICAL_COMMANDS, args.iterations)
+    bench("selector (64 colores)", picker_commands(64), args.iterations)
+    bench("selector (1000 colores)", picker_commands(1000), args.iterations)
+    print(config.payload_cache_info())
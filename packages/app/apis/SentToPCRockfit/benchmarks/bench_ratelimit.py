@@ -0,0 +1,111 @@
+"""
+bench_ratelimit.py
+------------------
+Limitador por LED (ratelimit.py) con las latencias de eco de ping.csv: cada baldosa
+simulada tarda su latencia en aplicar cada comando (uno detrás de otro) y publica el eco
+de estado. Se le manda una animación de --fps fotogramas por segundo durante --seconds s
+con y sin limitador, y se mide por baldosa cuántos comandos recibe y cuánto retraso
+acumula el último (lo que el público ve atrasado).
+
+    python -m benchmarks.bench_ratelimit --fps 20 --seconds 5
+"""
+
+import argparse
+import csv
+import heapq
+import os
+from collections import defaultdict
+
+from outbound import OutboundQueue
+from ratelimit import RateLimiter
+
+PING_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ping.csv")
+
+
+def tile_latencies(path=PING_CSV):
+    """Latencia mediana (s) por baldosa en ping.csv."""
+    samples = defaultdict(list)
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            samples[row["tile"]].append(float(row["lat_ms"]) / 1000)
+    return {tile: sorted(v)[len(v) // 2] for tile, v in samples.items()}
+
+
+class Simulation:
+    """Reloj virtual: baldosas que procesan comandos en serie y temporizadores del limitador."""
+
+    def __init__(self, latencies):
+        self.now = 0.0
+        self.latencies = latencies
+        self.events = []          # (instante, orden, fn, args)
+        self.seq = 0
+        self.busy_until = defaultdict(float)
+        self.received = defaultdict(int)
+        self.lag = defaultdict(float)
+
+    def clock(self):
+        return self.now
+
+    def at(self, t, fn, *args):
+        self.seq += 1
+        heapq.heappush(self.events, (t, self.seq, fn, args))
+
+    def schedule(self, delay, fn, *args):
+        self.at(self.now + delay, fn, *args)
+
+    def run_until(self, t):
+        while self.events and self.events[0][0] <= t:
+            self.now, _, fn, args = heapq.heappop(self.events)
+            fn(*args)
+        self.now = t
+
+    def deliver(self, tile, sent_at, on_echo):
+        """El ESP32 aplica el comando tras los anteriores y publica su eco."""
+        done = max(self.busy_until[tile], self.now) + self.latencies[tile]
+        self.busy_until[tile] = done
+        self.received[tile] += 1
+        self.lag[tile] = done - sent_at
+        self.at(done, on_echo, tile)
+
+
+def run(latencies, fps, seconds, limited):
+    sim = Simulation(latencies)
+    limiter = RateLimiter(clock=sim.clock) if limited else None
+    topic = "devices/{}/light/leds/command"
+
+    def publish(client, t, payload, qos, retain, priority):
+        sim.deliver(t.split("/")[1], payload, on_echo)
+        return None
+
+    def on_echo(tile):
+        if limiter is not None:
+            limiter.echo(topic.format(tile), sim.now)
+
+    outbox = OutboundQueue(publish, limiter=limiter, schedule=sim.schedule, clock=sim.clock)
+    for frame in range(int(fps * seconds)):
+        t = frame / fps
+        sim.run_until(t)
+        for tile in latencies:
+            outbox.put(topic.format(tile), t)   # el payload es el instante del fotograma
+    sim.run_until(seconds + 60)
+    return sim
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del limitador por LED")
+    parser.add_argument("--fps", type=float, default=20)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    latencies = tile_latencies()
+    sims = {label: run(latencies, args.fps, args.seconds, limited) for label, limited in
+            (("sin limitador", False), ("con limitador", True))}
+    print(f"Animación a {args.fps:g} fps durante {args.seconds:g} s; latencias de ping.csv")
+    print(f"  {'baldosa':8s} {'lat ms':>7s}  " + "  ".join(f"{label:>28s}" for label in sims))
+    for tile in sorted(latencies, key=lambda t: int(t[4:]) if t[4:].isdigit() else 0):
+        cells = [f"{s.received[tile]:5d} cmds  retraso {s.lag[tile] * 1000:7.0f} ms" for s in sims.values()]
+        print(f"  {tile:8s} {latencies[tile] * 1000:7.1f}  " + "  ".join(f"{c:>28s}" for c in cells))
+
+
+if __name__ == "__main__":
+    main()
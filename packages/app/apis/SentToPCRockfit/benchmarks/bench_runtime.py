@@ -0,0 +1,90 @@
+"""
+bench_runtime.py
+----------------
+Arranca y completa K circuitos a la vez sobre el broker en memoria, con todas sus
+celebraciones solapadas, y mide la latencia tap -> primer comando LED y el pico de
+hilos del proceso. Comparar ambos modos de ejecución:
+
+    python -m benchmarks.bench_runtime --runtime threads
+    python -m benchmarks.bench_runtime --runtime asyncio
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+import logic
+from local_broker import LocalBroker
+from benchmarks.common import quiet_logging, no_persistence, make_devices, make_circuit_config, percentile
+
+
+def run(runtime, k):
+    broker = LocalBroker()
+    devices = make_devices(2 * k)
+    confs = [make_circuit_config(f"bench_{i}", devices[2 * i:2 * i + 2]) for i in range(k)]
+
+    light_to_circuit = {}
+    for i in range(k):
+        for dev in devices[2 * i:2 * i + 2]:
+            light_to_circuit[logic.config.DEVICES_CONFIG[dev]["light_command_topic"]] = i
+
+    tap_at = {}
+    first_cmd = {}
+
+    def on_command(client, userdata, msg):
+        i = light_to_circuit.get(msg.topic)
+        if i is not None and i in tap_at and i not in first_cmd:
+            first_cmd[i] = time.perf_counter()
+
+    observer = broker.client("observer")
+    observer.on_message = on_command
+    observer.subscribe("devices/+/light/+/command")
+
+    engine_client = broker.client("engine")
+    ids = [c["id"] for c in confs]
+    if runtime == "asyncio":
+        import async_runtime
+        async_runtime.start_in_thread(ids, client=engine_client)
+    else:
+        logic.main(ids, client=engine_client)
+    while len(logic.circuits) < k:
+        time.sleep(0.01)
+
+    sensors = broker.client("sensors")
+    peak_threads = threading.active_count()
+    results = {}
+    for phase, dev_offset, key in (("inicio", 0, "double_tap_topic"), ("final", 1, "tap_topic")):
+        tap_at.clear()
+        first_cmd.clear()
+        for i in range(k):
+            tap_at[i] = time.perf_counter()
+            sensors.publish(logic.config.DEVICES_CONFIG[devices[2 * i + dev_offset]][key], b"1")
+        deadline = time.monotonic() + 5.0
+        while len(first_cmd) < k and time.monotonic() < deadline:
+            time.sleep(0.005)
+        results[phase] = [(first_cmd[i] - tap_at[i]) * 1000.0 for i in first_cmd]
+
+    # Celebraciones solapadas en curso
+    end = time.monotonic() + logic.END_ANIMATION_TIME + 0.5
+    while time.monotonic() < end:
+        peak_threads = max(peak_threads, threading.active_count())
+        time.sleep(0.05)
+
+    print(f"runtime={runtime} circuitos={k} hilos_pico={peak_threads} publicaciones={broker.published}")
+    for phase, lat in results.items():
+        print(f"  {phase:<7} n={len(lat):<5} p50={percentile(lat, 50):7.2f} ms  "
+              f"p95={percentile(lat, 95):7.2f} ms  max={max(lat, default=0):7.2f} ms  "
+              f"media={statistics.mean(lat) if lat else 0:7.2f} ms")
+    print(f"  engine={logic.engine.stats()}")
+    print(f"  scheduler={logic.scheduler.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de los modos de ejecución del motor")
+    parser.add_argument("--runtime", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--circuits", type=int, default=300)
+    args = parser.parse_args()
+    quiet_logging()
+    no_persistence()
+    run(args.runtime, args.circuits)
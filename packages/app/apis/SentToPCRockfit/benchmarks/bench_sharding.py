@@ -0,0 +1,90 @@
+"""
+bench_sharding.py
+-----------------
+Throughput del modo multiproceso (sharding.py): K circuitos independientes de S pasos,
+cada uno con sus propios tags, se arrancan y completan con un flujo de K*S eventos que
+el frontal reparte entre N shards. Se mide el tiempo hasta que todos los shards han
+procesado el flujo completo, para cada N:
+
+    python -m benchmarks.bench_sharding --workers 1 2 4 --circuits 500 --steps 8
+
+La escala solo puede ser lineal hasta el número de núcleos libres de la máquina.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import config
+import sharding
+from benchmarks.common import NullClient, quiet_logging, no_persistence, make_devices, make_circuit_config
+
+
+def make_stream(confs, rounds):
+    """Eventos (tópico, payload, instante) en orden de pasos, intercalando los circuitos."""
+    stream = []
+    steps = len(confs[0]["steps"])
+    for r in range(rounds):
+        for j in range(steps):
+            for conf in confs:
+                step = conf["steps"][j]
+                topic = config.DEVICES_CONFIG[step["device"]][f"{step['event']}_topic"]
+                # Instantes sintéticos espaciados: ningún evento cae en la ventana antirrebote
+                stream.append((topic, b"1", r * 60.0 + j * 0.5))
+    return stream
+
+
+def run(workers, ids, stream):
+    front = sharding.ShardedEngine(workers, client=NullClient()).start(ids, connect=False)
+    try:
+        ready = front.stats(timeout=60)
+        if None in ready["shards"]:
+            raise RuntimeError("Algún shard no arrancó a tiempo")
+        t0 = time.perf_counter()
+        for topic, payload, received_at in stream:
+            front.route(topic, payload, received_at)
+        done = front.stats(timeout=600)
+        elapsed = time.perf_counter() - t0
+    finally:
+        front.stop()
+    received = sum(s["received"] for s in done["shards"] if s)
+    return elapsed, received, done["published"] - ready["published"], front.plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del motor repartido en procesos")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--circuits", type=int, default=500)
+    parser.add_argument("--steps", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=1)
+    args = parser.parse_args()
+
+    quiet_logging()
+    no_persistence()
+    tmp = tempfile.mkdtemp(prefix="rockfit_shards_")
+    config.LOG_LEVEL = "WARNING"
+    config.LOG_DIR = None
+    config.RESULTS_DB_PATH = os.path.join(tmp, "results.db")
+    # NullClient no devuelve ecos: el limitador del frontal solo aparcaría comandos y
+    # competiría por la CPU con los shards; aquí se mide el motor repartido
+    config.RATE_LIMIT_ENABLED = False
+
+    devices = make_devices(args.circuits * args.steps)
+    confs = [make_circuit_config(f"shard_{i}", devices[i * args.steps:(i + 1) * args.steps])
+             for i in range(args.circuits)]
+    ids = [c["id"] for c in confs]
+    stream = make_stream(confs, args.rounds)
+
+    print(f"{args.circuits} circuitos x {args.steps} pasos, {len(stream)} eventos, {os.cpu_count()} CPUs")
+    base = None
+    for workers in args.workers:
+        elapsed, received, published, plan = run(workers, ids, stream)
+        rate = len(stream) / elapsed
+        base = base or rate
+        print(f"  shards={workers:<2d} {elapsed:7.3f} s  {rate:9.0f} eventos/s  x{rate / base:4.2f}  "
+              f"recibidos={received} comandos={published}  ({plan})")
+
+
+if __name__ == "__main__":
+    main()
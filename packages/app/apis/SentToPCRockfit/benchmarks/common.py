@@ -0,0 +1,118 @@
+"""Utilidades compartidas por los benchmarks: cliente nulo y venue sintético."""
+
+import atexit
+import logging
+import sys
+import time
+
+import config
+
+
+class NullClient:
+    """Cliente MQTT que descarta las publicaciones y solo las cuenta."""
+
+    def __init__(self):
+        self.published = 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.published += 1
+
+    def subscribe(self, topic, qos=0):
+        pass
+
+
+def quiet_logging():
+    """Silencia el logging del motor para no medir I/O de consola."""
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def no_persistence():
+    """
+    Sin instantáneas, métricas, resultados ni configuración externa en disco: un benchmark
+    no debe reanudarse, dejar estado ni depender del venue_config.json local.
+    Los resultados van a una base SQLite en memoria, nunca al results.db de producción.
+    """
+    config.SNAPSHOT_RESTORE = False
+    config.SNAPSHOT_INTERVAL = 0
+    config.METRICS_EXPORT_INTERVAL = 0
+    config.CONFIG_WATCH_INTERVAL = 0
+    config.RESULTS_DB_PATH = ":memory:"
+    logic = sys.modules.get("logic")
+    if logic is not None:
+        # Si ya se importó el motor: ni su almacén abierto ni el volcado al salir tocan el disco
+        atexit.unregister(logic.flush_results)
+        logic.results_store = None
+
+
+def make_devices(n, prefix="bench"):
+    """Registra n tags sintéticos en config.DEVICES_CONFIG y devuelve sus nombres."""
+    names = []
+    for i in range(n):
+        name = f"{prefix}{i}"
+        config.DEVICES_CONFIG[name] = {
+            "name": name,
+            "type": "tag",
+            "tap_topic": config.get_topic(config.TAG_TOPIC_TEMPLATES, name, "tap_topic"),
+            "double_tap_topic": config.get_topic(config.TAG_TOPIC_TEMPLATES, name, "double_tap_topic"),
+            "light_command_topic": config.get_topic(config.TAG_TOPIC_TEMPLATES, name, "light_command_topic"),
+        }
+        for event_type in ("tap", "double_tap"):
+            config.EVENT_TOPICS[config.DEVICES_CONFIG[name][f"{event_type}_topic"]] = (name, event_type)
+        names.append(name)
+    return names
+
+
+def make_tiles(n, prefix="benchtile"):
+    """Registra n baldosas sintéticas (loadcell + LEDs) en config.DEVICES_CONFIG."""
+    names = []
+    for i in range(n):
+        name = f"{prefix}{i}"
+        config.DEVICES_CONFIG[name] = {
+            "name": name,
+            "type": "tile",
+            "loadcell_topic": config.get_topic(config.TILE_TOPIC_TEMPLATES, name, "loadcell_topic"),
+            "light_command_topic": config.get_topic(config.TILE_TOPIC_TEMPLATES, name, "light_command_topic"),
+        }
+        names.append(name)
+    return names
+
+
+def make_circuit_config(cid, devices, order_mode="strict", max_time=60):
+    """
+    Circuito sintético: double_tap en el primer dispositivo y tap en el resto.
+    Queda registrado en config.registry como cualquier circuito de config.
+    """
+    steps = [{"order": 1, "device": devices[0], "event": "double_tap", "bonus": False}]
+    for i, dev in enumerate(devices[1:], start=2):
+        steps.append({"order": i, "device": dev, "event": "tap", "bonus": False})
+    conf = {
+        "id": cid,
+        "name": cid,
+        "control_device": devices[0],
+        "color_initial": {"r": 0, "g": 255, "b": 0},
+        "color_mode": "variable",
+        "max_time": max_time,
+        "completion_effect": "celebration",
+        "order_mode": order_mode,
+        "state_reposo": "all_active",
+        "surpassed_light": 25,
+        "steps": steps,
+    }
+    config.registry.set_definition(conf)
+    return conf
+
+
+def time_per_call(fn, iterations):
+    """Devuelve los microsegundos medios por llamada de fn()."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def percentile(values, p):
+    """Percentil p (0-100) por el método del rango más cercano; 0.0 si no hay valores."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
@@ -0,0 +1,271 @@
+"""
+load.py
+-------
+Benchmark de carga con un venue sintético: N tags, M baldosas y K circuitos repartidos entre
+los modos strict, flexible y competition, sobre el broker en memoria (local_broker).
+Cada circuito tiene un escalador simulado que toca sus tags con intervalos realistas
+(media --tap-interval s, con una fracción --error-rate de toques en el tag equivocado),
+descansa tras completar y vuelve a empezar. Las baldosas publican lecturas de loadcell
+a --tile-hz como tráfico de fondo.
+
+Informa de eventos/s, latencia de tratamiento (publicación -> fin de handle_message)
+p50/p95/p99, comandos LED por evento y RSS, y guarda todo en JSON para comparar versiones.
+
+    python -m benchmarks.load --tags 60 --tiles 18 --circuits 30 --duration 30
+    python -m benchmarks.load --speed 20 --json resultados.json
+
+Los circuitos competition aún no están implementados en el motor: sus arranques aparecen
+como errores en las estadísticas del engine.
+"""
+
+import argparse
+import datetime
+import heapq
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import config
+import logic
+from local_broker import LocalBroker
+from led_shadow import shadow
+from benchmarks.common import quiet_logging, no_persistence, make_devices, make_tiles, make_circuit_config, percentile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+MODES = ("strict", "flexible", "competition")
+
+
+def rss_kb():
+    """(RSS actual, RSS pico) en KB."""
+    current = 0
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1])
+                    break
+    except OSError:
+        pass
+    peak = 0
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak //= 1024
+    return current, peak
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_venue(n_tags, n_tiles, k, mix, steps, seed):
+    """Registra dispositivos y circuitos sintéticos; devuelve (confs, tags, tiles)."""
+    rng = random.Random(seed)
+    tags = make_devices(n_tags, prefix="loadtag")
+    tiles = make_tiles(n_tiles, prefix="loadtile")
+    modes = [mode for mode, share in zip(MODES, mix) for _ in range(share)] or ["strict"]
+    confs = []
+    for i in range(k):
+        members = rng.sample(tags, min(steps, len(tags)))
+        conf = make_circuit_config(f"load_{i}", members, order_mode=modes[i % len(modes)], max_time=600)
+        confs.append(conf)
+    return confs, tags, tiles
+
+
+class Climber:
+    """Recorre la secuencia de un circuito; next() devuelve (dispositivo, evento, espera)."""
+
+    def __init__(self, conf, tags, rng, tap_interval, error_rate, rest):
+        self.steps = [(s["device"], s["event"]) for s in sorted(conf["steps"], key=lambda s: s["order"])]
+        self.tags = tags
+        self.rng = rng
+        self.tap_interval = tap_interval
+        self.error_rate = error_rate
+        self.rest = rest
+        self.index = 0
+
+    def next(self):
+        device, event = self.steps[self.index]
+        if self.index > 0 and self.rng.random() < self.error_rate:
+            return self.rng.choice(self.tags), "tap", self._interval()
+        self.index += 1
+        if self.index == len(self.steps):
+            self.index = 0
+            return device, event, self.rest + self._interval()
+        return device, event, self._interval()
+
+    def _interval(self):
+        return max(0.2, self.rng.gauss(self.tap_interval, self.tap_interval / 3))
+
+
+class LoadRun:
+    def __init__(self, args):
+        self.args = args
+        self.latencies_ms = []
+        self.handled = 0
+        self.commands = 0
+
+    def _handle(self, published_at, topic, payload, received_at):
+        logic.handle_message(topic, payload, received_at)
+        self.latencies_ms.append((time.perf_counter() - published_at) * 1000.0)
+        self.handled += 1
+
+    def _on_command(self, client, userdata, msg):
+        self.commands += 1
+
+    def run(self):
+        a = self.args
+        confs, tags, tiles = build_venue(a.tags, a.tiles, a.circuits, a.mix, a.steps, a.seed)
+        broker = LocalBroker()
+        observer = broker.client("observer")
+        observer.on_message = self._on_command
+        observer.subscribe("devices/+/light/+/command")
+
+        engine_client = broker.client("engine")
+        logic.main([c["id"] for c in confs], client=engine_client)
+        deadline = time.monotonic() + 10.0
+        while len(logic.circuits) < len(confs) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        setup_commands, self.commands = self.commands, 0
+
+        # Mismo camino que logic.on_message, guardando el instante de publicación
+        engine_client.on_message = lambda c, u, msg: logic.engine.submit(
+            self._handle, time.perf_counter(), msg.topic, msg.payload, time.monotonic()
+        )
+
+        rng = random.Random(a.seed)
+        speed = a.speed
+        queue = []
+        seq = 0
+        # La animación final dura END_ANIMATION_TIME reales: en tiempo simulado, x speed
+        rest = logic.END_ANIMATION_TIME * speed + a.rest
+        for conf in confs:
+            climber = Climber(conf, tags, rng, a.tap_interval, a.error_rate, rest)
+            heapq.heappush(queue, (rng.uniform(0, a.tap_interval), seq, "climber", climber))
+            seq += 1
+        tile_period = 1.0 / a.tile_hz if a.tile_hz else 0
+        if tile_period:
+            for tile in tiles:
+                heapq.heappush(queue, (rng.uniform(0, tile_period), seq, "tile", tile))
+                seq += 1
+
+        sensors = broker.client("sensors")
+        rss_start = rss_kb()[0]
+        start = time.perf_counter()
+        taps = 0
+        loadcells = 0
+        while queue:
+            when, _, kind, who = heapq.heappop(queue)
+            if when >= a.duration:
+                break
+            delay = when / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+            if kind == "climber":
+                device, event, wait = who.next()
+                sensors.publish(config.DEVICES_CONFIG[device][f"{event}_topic"], b"1")
+                taps += 1
+                heapq.heappush(queue, (when + wait, seq, kind, who))
+            else:
+                sensors.publish(config.DEVICES_CONFIG[who]["loadcell_topic"], str(rng.randint(0, 9000)).encode())
+                loadcells += 1
+                heapq.heappush(queue, (when + tile_period, seq, kind, who))
+            seq += 1
+
+        drained = threading.Event()
+        logic.engine.submit(drained.set, block=True)
+        drained.wait()
+        elapsed = time.perf_counter() - start
+        rss_now, rss_peak = rss_kb()
+        lat = self.latencies_ms
+        return {
+            "taps": taps,
+            "loadcell_messages": loadcells,
+            "handled": self.handled,
+            "elapsed_s": elapsed,
+            "events_per_s": self.handled / elapsed if elapsed else 0.0,
+            "latency_ms": {
+                "p50": percentile(lat, 50),
+                "p95": percentile(lat, 95),
+                "p99": percentile(lat, 99),
+                "max": max(lat, default=0.0),
+            },
+            "setup_commands": setup_commands,
+            "led_commands": self.commands,
+            "commands_per_event": self.commands / self.handled if self.handled else 0.0,
+            "rss_kb": {"start": rss_start, "end": rss_now, "peak": rss_peak},
+            "active_instances": len(logic.circuits),
+            "completed": len(logic.completed_circuits),
+            "engine": logic.engine.stats(),
+            "scheduler": logic.scheduler.stats(),
+            "shadow": shadow.stats(),
+            "debounce": {k: v for k, v in logic.debouncer.stats().items() if k != "suppressed_by_device"},
+        }
+
+
+def print_results(result):
+    r = result["results"]
+    p = result["params"]
+    lat = r["latency_ms"]
+    print(f"Venue: {p['tags']} tags, {p['tiles']} baldosas, {p['circuits']} circuitos "
+          f"(mix strict/flexible/competition = {'/'.join(map(str, p['mix']))}), velocidad x{p['speed']}")
+    print(f"  taps={r['taps']} loadcell={r['loadcell_messages']} tratados={r['handled']} "
+          f"en {r['elapsed_s']:.2f} s -> {r['events_per_s']:.1f} eventos/s")
+    print(f"  latencia de tratamiento: p50={lat['p50']:.3f} ms  p95={lat['p95']:.3f} ms  "
+          f"p99={lat['p99']:.3f} ms  max={lat['max']:.3f} ms")
+    print(f"  comandos LED: {r['led_commands']} ({r['commands_per_event']:.2f} por evento), "
+          f"completados={r['completed']}, errores del motor={r['engine']['errors']}")
+    print(f"  RSS: inicio={r['rss_kb']['start']} KB fin={r['rss_kb']['end']} KB pico={r['rss_kb']['peak']} KB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de carga con un venue sintético")
+    parser.add_argument("--tags", type=int, default=60)
+    parser.add_argument("--tiles", type=int, default=18)
+    parser.add_argument("--circuits", type=int, default=30)
+    parser.add_argument("--mix", type=int, nargs=3, default=[2, 1, 0], metavar=("STRICT", "FLEXIBLE", "COMPETITION"),
+                        help="proporción de circuitos por modo")
+    parser.add_argument("--steps", type=int, default=5, help="pasos por circuito")
+    parser.add_argument("--tap-interval", type=float, default=3.0, help="segundos medios entre toques")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="fracción de toques en un tag equivocado")
+    parser.add_argument("--rest", type=float, default=5.0, help="descanso tras completar (s, además de la animación)")
+    parser.add_argument("--tile-hz", type=float, default=10.0, help="lecturas de loadcell por baldosa y segundo")
+    parser.add_argument("--duration", type=float, default=60.0, help="segundos simulados")
+    parser.add_argument("--speed", type=float, default=10.0, help="factor de aceleración del tiempo simulado")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="fichero de resultados (por defecto benchmarks/results/load_<fecha>.json)")
+    args = parser.parse_args()
+    quiet_logging()
+    no_persistence()
+
+    result = {
+        "benchmark": "load",
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "runtime": config.ENGINE_RUNTIME,
+        "params": vars(args),
+        "results": LoadRun(args).run(),
+    }
+    print_results(result)
+    path = args.json
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"load_{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {path}")
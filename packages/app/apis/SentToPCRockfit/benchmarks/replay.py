@@ -0,0 +1,190 @@
+"""
+replay.py
+---------
+Reproduce una sesión grabada con traffic_recorder.py contra el motor de circuitos, sobre el
+broker en memoria (local_broker), a velocidad 1x, 10x o "max" (sin esperas).
+
+El reloj que ve el debounce es el de la grabación (no se comprime con la velocidad); las
+tareas del planificador (celebraciones, timeouts) sí corren en tiempo real.
+
+Informe: latencia tap -> primer comando LED (p50/p95/p99), eventos por segundo y diferencia
+entre los comandos LED producidos y los grabados.
+
+    python -m benchmarks.replay sesion.jsonl.gz --speed 10
+    python -m benchmarks.replay sesion.jsonl.gz --speed max --json informe.json
+"""
+
+import argparse
+import difflib
+import json
+import threading
+import time
+
+import config
+import logic
+from local_broker import LocalBroker
+from traffic_recorder import DIRECTION_IN, DIRECTION_OUT, read_recording
+from benchmarks.common import quiet_logging, no_persistence, percentile
+
+
+def normalize(topic, payload):
+    """Clave comparable de un comando: el JSON se reordena para ignorar diferencias de formato."""
+    try:
+        payload = json.dumps(json.loads(payload), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        payload = payload.decode("utf-8", errors="replace")
+    return f"{topic} {payload}"
+
+
+def diff_commands(recorded, replayed, max_lines=10):
+    """Resumen de diferencias entre dos listas de claves de comando."""
+    matcher = difflib.SequenceMatcher(None, recorded, replayed, autojunk=False)
+    matched = sum(block.size for block in matcher.get_matching_blocks())
+    lines = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        for cmd in recorded[i1:i2]:
+            lines.append(f"- {cmd}")
+        for cmd in replayed[j1:j2]:
+            lines.append(f"+ {cmd}")
+        if len(lines) >= max_lines:
+            break
+    return {
+        "recorded": len(recorded),
+        "replayed": len(replayed),
+        "matched": matched,
+        "missing": len(recorded) - matched,
+        "extra": len(replayed) - matched,
+        "first_differences": lines[:max_lines],
+    }
+
+
+class Replayer:
+    def __init__(self, messages, speed=None, settle=None):
+        self.messages = messages
+        self.speed = speed            # None = tan rápido como sea posible
+        self.settle = logic.END_ANIMATION_TIME + 0.5 if settle is None else settle
+        self.published_at = {}        # índice del mensaje entrante -> perf_counter al publicarlo
+        self.latencies_ms = []
+        self.produced = []
+        self._current = None          # índice del mensaje que está procesando el motor
+        self._answered = set()
+        self._feeding = None          # (índice, ns en la grabación) del mensaje que se publica
+
+    # Hilo del motor -----------------------------------------------------------
+    def _handle(self, idx, topic, payload, received_at):
+        self._current = idx
+        try:
+            logic.handle_message(topic, payload, received_at)
+        finally:
+            self._current = None
+
+    def _on_command(self, client, userdata, msg):
+        self.produced.append(normalize(msg.topic, msg.payload))
+        idx = self._current
+        if idx is not None and idx not in self._answered:
+            self._answered.add(idx)
+            self.latencies_ms.append((time.perf_counter() - self.published_at[idx]) * 1000.0)
+
+    # Alimentación ---------------------------------------------------------------
+    def run(self, circuits):
+        broker = LocalBroker()
+        observer = broker.client("observer")
+        observer.on_message = self._on_command
+        observer.subscribe("devices/+/light/+/command")
+
+        engine_client = broker.client("engine")
+        logic.main(circuits, client=engine_client)
+        deadline = time.monotonic() + 5.0
+        while len(logic.circuits) < len(circuits) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.produced.clear()   # encendido inicial: no forma parte de la sesión grabada
+        base = time.monotonic()
+
+        def on_message(client, userdata, msg):
+            # La entrega del broker es síncrona: _feeding es el mensaje que se acaba de publicar
+            idx, offset = self._feeding
+            logic.engine.submit(self._handle, idx, msg.topic, msg.payload, base + offset / 1e9)
+
+        engine_client.on_message = on_message
+        sensors = broker.client("sensors")
+
+        inbound = [(i, m) for i, m in enumerate(self.messages) if m[1] == DIRECTION_IN]
+        start = time.perf_counter()
+        for idx, (offset, _, topic, payload) in inbound:
+            if self.speed:
+                delay = offset / 1e9 / self.speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            if topic in config.EVENT_TOPICS:
+                self.published_at[idx] = time.perf_counter()
+            self._feeding = (idx, offset)
+            sensors.publish(topic, payload)
+        # Marca al final de la cola: cuando se ejecuta, el motor ha procesado todo lo anterior
+        drained = threading.Event()
+        logic.engine.submit(drained.set, block=True)
+        drained.wait()
+        elapsed = time.perf_counter() - start
+        time.sleep(self.settle)
+        return len(inbound), elapsed
+
+
+def report(path, speed, circuits=None, settle=None):
+    header, messages = read_recording(path)
+    circuits = circuits or header.get("circuits") or []
+    replayer = Replayer(messages, speed, settle)
+    events, elapsed = replayer.run(circuits)
+    recorded = [normalize(topic, payload) for _, direction, topic, payload in messages if direction == DIRECTION_OUT]
+    lat = replayer.latencies_ms
+    return {
+        "recording": path,
+        "speed": speed or "max",
+        "circuits": circuits,
+        "events": events,
+        "taps": len(replayer.published_at),
+        "elapsed_s": elapsed,
+        "events_per_s": events / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "n": len(lat),
+            "p50": percentile(lat, 50),
+            "p95": percentile(lat, 95),
+            "p99": percentile(lat, 99),
+            "max": max(lat, default=0.0),
+        },
+        "commands": diff_commands(recorded, replayer.produced),
+    }
+
+
+def print_report(r):
+    lat = r["latency_ms"]
+    cmds = r["commands"]
+    print(f"Sesión {r['recording']} a velocidad {r['speed']} (circuitos: {', '.join(r['circuits'])})")
+    print(f"  eventos: {r['events']} ({r['taps']} taps) en {r['elapsed_s']:.2f} s -> {r['events_per_s']:.0f} eventos/s")
+    print(f"  tap -> primer comando LED (n={lat['n']}): p50={lat['p50']:.3f} ms  p95={lat['p95']:.3f} ms  "
+          f"p99={lat['p99']:.3f} ms  max={lat['max']:.3f} ms")
+    print(f"  comandos: grabados={cmds['recorded']} producidos={cmds['replayed']} coinciden={cmds['matched']} "
+          f"faltan={cmds['missing']} sobran={cmds['extra']}")
+    for line in cmds["first_differences"]:
+        print(f"    {line}")
+
+
+def parse_speed(value):
+    return None if value == "max" else float(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reproduce una sesión MQTT grabada contra el motor")
+    parser.add_argument("path", help="grabación de traffic_recorder.py (.jsonl.gz)")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1, 10, ... o max")
+    parser.add_argument("--circuits", nargs="*", help="circuitos activos (por defecto, los de la cabecera)")
+    parser.add_argument("--settle", type=float, help="segundos de espera final para animaciones")
+    parser.add_argument("--json", help="guarda el informe en este fichero")
+    args = parser.parse_args()
+    quiet_logging()
+    no_persistence()
+    result = report(args.path, args.speed, args.circuits, args.settle)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,214 @@
+"""
+circuit_registry.py
+-------------------
+Registro único de circuitos: definiciones validadas con su especificación compilada e índices
+por id, por dispositivo de control y por dispositivo miembro; e instancias vivas del motor
+indexadas por id de circuito, por estado y por tópico de evento (antes logic.topic_index).
+
+Motor, GUI y API consultan este registro en lugar de recorrer config.CIRCUITS o logic.circuits:
+todas las búsquedas son accesos a diccionario.
+Las definiciones las carga config (y config_loader en las recargas); las instancias las da de
+alta y de baja logic, siempre desde el hilo del motor. CircuitBase avisa de cada cambio de
+estado con state_changed() para mantener el índice por estado.
+No importa config ni logic.
+"""
+
+from circuit_spec import CircuitSpec, STATE_WAITING, STATE_IN_PROGRESS
+
+LIVE_STATES = (STATE_WAITING, STATE_IN_PROGRESS)
+
+
+class InvalidCircuit(ValueError):
+    """Definición de circuito incorrecta (id repetido o ausente, paso sin dispositivo conocido...)."""
+
+
+def validate_circuits(circuits, device_names):
+    """Comprueba ids únicos, pasos con order/device/event y que cada dispositivo exista."""
+    ids = set()
+    for circuit in circuits:
+        cid = circuit.get("id")
+        if cid is None or cid in ids:
+            raise InvalidCircuit(f"Circuito sin id o duplicado: {cid}")
+        ids.add(cid)
+        for step in circuit.get("steps", []):
+            if not {"order", "device", "event"} <= step.keys():
+                raise InvalidCircuit(f"[{cid}] Paso incompleto: {step}")
+            if step["device"] not in device_names:
+                raise InvalidCircuit(f"[{cid}] El paso {step['order']} usa un dispositivo desconocido: {step['device']}")
+
+
+class CircuitRegistry:
+    def __init__(self):
+        # Definiciones
+        self._definitions = {}     # id -> dict de config, en el orden de config.CIRCUITS
+        self.specs = {}            # id -> CircuitSpec
+        self._by_control = {}      # dispositivo de control -> {id: None}
+        self._by_member = {}       # dispositivo -> {id: None}
+        self._devices_config = {}
+
+        # Instancias (se modifican siempre en el mismo objeto: logic y la GUI guardan referencias)
+        self.instances = {}        # instancia -> None, en orden de alta (lo que muestra la GUI); baja O(1)
+        self._by_circuit = {}      # id -> [instancias]
+        self._by_state = {}        # estado -> {instancia: None}
+        self.topic_index = {}      # tópico de evento -> [instancias suscritas]
+
+    # ======================
+    # Definiciones
+    # ======================
+    def load(self, circuits, devices_config):
+        """Sustituye todas las definiciones. Lanza InvalidCircuit sin tocar nada si alguna no es válida."""
+        validate_circuits(circuits, devices_config)
+        self._devices_config = devices_config
+        self._definitions.clear()
+        self.specs.clear()
+        self._by_control.clear()
+        self._by_member.clear()
+        for conf in circuits:
+            self.set_definition(conf)
+
+    def set_devices_config(self, devices_config):
+        """Usa `devices_config` (p. ej. el dict nuevo tras una recarga) al compilar especificaciones."""
+        self._devices_config = devices_config
+
+    def set_definition(self, conf):
+        """Añade o sustituye (manteniendo su posición) la definición `conf` y la compila."""
+        cid = conf["id"]
+        self._unindex_definition(cid)
+        spec = CircuitSpec(conf, self._devices_config)
+        self._definitions[cid] = conf
+        self.specs[cid] = spec
+        if spec.control_device is not None:
+            self._by_control.setdefault(spec.control_device, {})[cid] = None
+        for device in spec.sequence:
+            self._by_member.setdefault(device, {})[cid] = None
+        return spec
+
+    def remove_definition(self, cid):
+        self._unindex_definition(cid)
+        self._definitions.pop(cid, None)
+
+    def reorder(self, ids):
+        """Ordena las definiciones como `ids` (las que no aparecen van al final)."""
+        ordered = {cid: self._definitions[cid] for cid in ids if cid in self._definitions}
+        ordered.update(self._definitions)
+        self._definitions.clear()
+        self._definitions.update(ordered)
+
+    def _unindex_definition(self, cid):
+        spec = self.specs.pop(cid, None)
+        if spec is None:
+            return
+        for index, devices in ((self._by_control, (spec.control_device,)), (self._by_member, spec.sequence)):
+            for device in devices:
+                ids = index.get(device)
+                if ids is not None:
+                    ids.pop(cid, None)
+                    if not ids:
+                        del index[device]
+
+    def get(self, cid):
+        """Definición (dict de config) del circuito, o None."""
+        return self._definitions.get(cid)
+
+    def spec(self, cid):
+        return self.specs.get(cid)
+
+    def spec_for(self, conf):
+        """Especificación de `conf`; se recompila si `conf` no es la definición registrada."""
+        spec = self.specs.get(conf["id"])
+        if spec is None or spec.source is not conf:
+            spec = CircuitSpec(conf, self._devices_config)
+        return spec
+
+    def definitions(self):
+        """Definiciones en el orden de config (para la GUI)."""
+        return list(self._definitions.values())
+
+    def ids(self):
+        return list(self._definitions)
+
+    def controlled_by(self, device):
+        """Ids de los circuitos cuyo dispositivo de control es `device`."""
+        return tuple(self._by_control.get(device, ()))
+
+    def using_device(self, device):
+        """Ids de los circuitos con algún paso en `device`."""
+        return tuple(self._by_member.get(device, ()))
+
+    def __contains__(self, cid):
+        return cid in self._definitions
+
+    def __len__(self):
+        return len(self._definitions)
+
+    # ======================
+    # Instancias
+    # ======================
+    def add_instance(self, inst):
+        self.instances[inst] = None
+        self._by_circuit.setdefault(inst.id, []).append(inst)
+        self._by_state.setdefault(inst.state, {})[inst] = None
+        for topic in inst.topic_map:
+            self.topic_index.setdefault(topic, []).append(inst)
+
+    def remove_instance(self, inst):
+        """Da de baja la instancia de todos los índices. Lanza ValueError si no estaba."""
+        try:
+            del self.instances[inst]
+        except KeyError:
+            raise ValueError(f"instancia no registrada: {inst!r}") from None
+        same = self._by_circuit.get(inst.id)
+        if same is not None:
+            same.remove(inst)
+            if not same:
+                del self._by_circuit[inst.id]
+        bucket = self._by_state.get(inst.state)
+        if bucket is not None:
+            bucket.pop(inst, None)
+        for topic in inst.topic_map:
+            subs = self.topic_index.get(topic)
+            if subs and inst in subs:
+                subs.remove(inst)
+                if not subs:
+                    del self.topic_index[topic]
+
+    def clear_instances(self):
+        """Da de baja todas las instancias (pruebas y benchmarks)."""
+        self.instances.clear()
+        self._by_circuit.clear()
+        self._by_state.clear()
+        self.topic_index.clear()
+
+    def state_changed(self, inst, old, new):
+        """Mueve la instancia al índice de su nuevo estado (si está dada de alta)."""
+        bucket = self._by_state.get(old)
+        if bucket is not None and inst in bucket:
+            del bucket[inst]
+            self._by_state.setdefault(new, {})[inst] = None
+
+    def instances_of(self, cid):
+        return tuple(self._by_circuit.get(cid, ()))
+
+    def in_state(self, state):
+        return tuple(self._by_state.get(state, ()))
+
+    def live_instance(self, cid):
+        """Instancia WAITING o IN_PROGRESS del circuito, o None."""
+        for inst in self._by_circuit.get(cid, ()):
+            if inst.state in LIVE_STATES:
+                return inst
+        return None
+
+    def subscribers(self, topic):
+        return self.topic_index.get(topic)
+
+    def reindex_topics(self):
+        """Reconstruye topic_index desde cero a partir de las instancias."""
+        self.topic_index.clear()
+        for inst in self.instances:
+            for topic in inst.topic_map:
+                self.topic_index.setdefault(topic, []).append(inst)
+
+
+# Registro único del proceso
+registry = CircuitRegistry()
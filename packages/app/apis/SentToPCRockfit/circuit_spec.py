@@ -0,0 +1,115 @@
+"""
+circuit_spec.py
+---------------
+Compilación de las definiciones de circuito (config.CIRCUITS) a una especificación de solo
+lectura compartida por todas las instancias del mismo circuito.
+La parte principal es la tabla de transiciones (estado, índice de paso, dispositivo, evento)
+-> acción, que CircuitBase.handle_event consulta con un único acceso a diccionario.
+Los dispositivos se identifican por su id entero de device_registry.
+No importa config ni logic: config compila las especificaciones al cargarse.
+"""
+
+from device_registry import device_id
+
+# ======================
+# Estados del circuito
+# ======================
+STATE_WAITING     = "waiting"
+STATE_READY       = "ready"
+STATE_IN_PROGRESS = "in_progress"
+STATE_COMPLETED   = "completed"
+STATE_TIMEOUT     = "timeout"
+STATE_DISABLED    = "disabled"
+
+# ======================
+# Acciones de la tabla de transiciones
+# ======================
+ACTION_START        = 1   # arrancar el circuito
+ACTION_CHANGE_COLOR = 2   # tap en ctrl con color variable: siguiente color
+ACTION_NEED_DOUBLE  = 3   # tap en ctrl ignorado: el primer paso exige double_tap
+ACTION_RESET        = 4   # double_tap en ctrl: reiniciar y dejar listo
+ACTION_ADVANCE      = 5   # evento esperado del paso actual
+ACTION_WRONG_EVENT  = 6   # dispositivo del paso actual, evento distinto
+
+EVENT_TYPES = ("tap", "double_tap")
+
+
+class CircuitSpec:
+    """Definición compilada de un circuito. Se comparte entre instancias: no modificar."""
+    __slots__ = (
+        "source", "id", "name", "description", "steps", "sequence", "sequence_ids", "step_events",
+        "control_device", "control_id", "color_initial", "color_mode", "max_time", "completion_effect",
+        "order_mode", "state_reposo", "surpassed_light",
+        "default_wait_brightness_strict", "default_wait_brightness_flexible",
+        "topic_map", "transitions",
+    )
+
+    def __init__(self, circuit_config, devices_config):
+        self.source = circuit_config
+        self.id = circuit_config["id"]
+        self.name = circuit_config.get("name", self.id)
+        self.description = circuit_config.get("description", "")
+
+        self.steps = tuple(sorted(circuit_config.get("steps", []), key=lambda x: x["order"]))
+        self.sequence = tuple(step["device"] for step in self.steps)
+        self.sequence_ids = tuple(device_id(device) for device in self.sequence)
+        self.step_events = tuple(step["event"] for step in self.steps)
+
+        # Por defecto, el dispositivo de control es el del primer paso
+        self.control_device = circuit_config.get("control_device", self.sequence[0] if self.sequence else None)
+        self.control_id = device_id(self.control_device) if self.control_device is not None else None
+
+        self.color_initial = circuit_config.get("color_initial", {"r": 0, "g": 255, "b": 0})
+        self.color_mode = circuit_config.get("color_mode", "variable")
+        self.max_time = circuit_config.get("max_time", 0)
+        self.completion_effect = circuit_config.get("completion_effect", "celebration")
+        self.order_mode = circuit_config.get("order_mode", "strict")
+        self.state_reposo = circuit_config.get("state_reposo", "only_active")
+        self.surpassed_light = circuit_config.get("surpassed_light", 0)
+        self.default_wait_brightness_strict = circuit_config.get("default_wait_brightness_strict", 50)
+        self.default_wait_brightness_flexible = circuit_config.get("default_wait_brightness_flexible", 60)
+
+        self.topic_map = build_topic_map(self.sequence, devices_config)
+        self.transitions = compile_transitions(self.sequence_ids, self.step_events, self.control_id, self.color_mode)
+
+
+def build_topic_map(sequence, devices_config):
+    """Tópico de evento -> (id de dispositivo, evento) para los dispositivos de la secuencia."""
+    topic_map = {}
+    for device in dict.fromkeys(sequence):
+        dev_cfg = devices_config.get(device, {})
+        tap_topic = dev_cfg.get("tap_topic")
+        double_tap_topic = dev_cfg.get("double_tap_topic")
+        if tap_topic:
+            topic_map[tap_topic] = (device_id(device), "tap")
+        if double_tap_topic:
+            topic_map[double_tap_topic] = (device_id(device), "double_tap")
+    return topic_map
+
+
+def compile_transitions(sequence, step_events, control_device, color_mode):
+    """
+    Tabla (estado, índice, id de dispositivo, evento) -> acción.
+    Las combinaciones que no aparecen no hacen nada (handle_event devuelve False).
+    """
+    table = {}
+    if not sequence:
+        return table
+
+    # En espera / listo solo responde el dispositivo de control (el índice siempre es 0)
+    if step_events[0] == "double_tap":
+        on_tap = ACTION_CHANGE_COLOR if color_mode == "variable" else ACTION_NEED_DOUBLE
+        on_double = ACTION_START
+    else:
+        on_tap = ACTION_START
+        on_double = ACTION_RESET
+    for state in (STATE_WAITING, STATE_READY):
+        table[(state, 0, control_device, "tap")] = on_tap
+        table[(state, 0, control_device, "double_tap")] = on_double
+
+    # En curso responde el dispositivo del paso actual
+    for index, (device, expected) in enumerate(zip(sequence, step_events)):
+        for event_type in EVENT_TYPES:
+            action = ACTION_ADVANCE if event_type == expected else ACTION_WRONG_EVENT
+            table[(STATE_IN_PROGRESS, index, device, event_type)] = action
+    return table
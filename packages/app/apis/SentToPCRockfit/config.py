@@ -1,5 +1,9 @@
 import os
 import json
+from functools import lru_cache
+
+from circuit_registry import registry
+from device_registry import device_id
 
 # ================================
 # Parámetros de Conexión MQTT
@@ -8,6 +12,49 @@ MQTT_BROKER = "192.168.8.163"
 MQTT_PORT = 1883
 EVENT_TOPIC = "rockfit/events/timestamp"
 
+# ================================
+# Modo de ejecución del motor:
+#   "threads" -> paho loop_start + hilo del motor + hilo planificador
+#   "asyncio" -> todo en un único bucle asyncio (ver async_runtime.py)
+#   "sharded" -> un proceso frontal con la conexión MQTT y SHARD_WORKERS procesos de circuitos
+#                (ver sharding.py). Solo sin GUI (python sharding.py): limbx arranca en "threads"
+# ================================
+ENGINE_RUNTIME = "threads"
+SHARD_WORKERS = 4              # procesos de circuitos en modo "sharded"
+SHARD_START_METHOD = "spawn"   # "spawn" funciona igual en Linux y Windows
+
+# ================================
+# Logging (ver rockfit_logging.py): ficheros rotativos en LOG_DIR
+# ================================
+LOG_LEVEL = "INFO"
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# Muestreo por categoría: pasa 1 de cada N registros INFO/DEBUG (WARNING y superiores siempre)
+LOG_SAMPLING = {"mqtt.rx": 1, "mqtt.tx": 1, "events": 1}
+
+# ================================
+# Métricas de latencia por etapa (metrics.py): fichero que sirve apis/rockfit_metrics.py
+# ================================
+METRICS_EXPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics.json")
+METRICS_EXPORT_INTERVAL = 5.0   # s entre exportaciones; 0 = desactivada
+
+# ================================
+# Instantánea del motor para arranque en caliente (engine_snapshot.py)
+# ================================
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "engine_state.json")
+SNAPSHOT_INTERVAL = 2.0     # s entre instantáneas; 0 = desactivadas
+SNAPSHOT_RESTORE = True     # al arrancar, reanudar la sesión desde la instantánea
+SNAPSHOT_MAX_AGE = 900      # s; una instantánea más antigua se ignora (arranque en frío)
+
+# ================================
+# Recarga en caliente de dispositivos y circuitos (config_loader.py)
+# Fichero JSON (o YAML si PyYAML está instalado) con listas "devices" y/o "circuits" que
+# sustituyen a DEVICES / CIRCUITS de este módulo; si no existe, se usa lo definido aquí.
+# ================================
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "venue_config.json")
+CONFIG_WATCH_INTERVAL = 1.0   # s entre comprobaciones del fichero; 0 = sin recarga
+
 # ================================
 # Plantillas para tópicos según el tipo de dispositivo
 # ================================
@@ -47,6 +94,34 @@ CELEBRATION_COLORS   = [COLOR_RED, COLOR_GREEN, COLOR_BLUE, COLOR_YELLOW, COLOR_
 CELEBRATION_INTERVAL = 0.5  # segundos
 CELEBRATION_DURATION = 5    # segundos
 
+# Cola de salida de comandos de LED (logic.outbox, ver outbound.py)
+OUTBOUND_MAX_PENDING = 256   # comandos en cola; con la cola llena se descartan primero los cosméticos
+OUTBOUND_MAX_INFLIGHT = 32   # publicaciones sin on_publish entregadas a paho
+OUTBOUND_ACK_TIMEOUT = 2.0   # s tras los que una publicación sin confirmar deja de contar
+
+# Limitador por LED (ratelimit.py): tasa = RATE_LIMIT_HEADROOM / latencia de eco, acotada
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_MIN = 2.0         # comandos/s para el dispositivo más lento
+RATE_LIMIT_MAX = 50.0        # comandos/s sin medidas o con latencia baja
+RATE_LIMIT_BURST = 3         # comandos seguidos antes de aplicar la tasa
+RATE_LIMIT_WINDOW = 3        # comandos sin eco por LED como mucho
+RATE_LIMIT_HEADROOM = 1.0    # comandos por latencia de eco
+
+# Espejo de estado de los LEDs (device_mirror.py) a partir de sus ecos devices/+/light/+/state
+MIRROR_EXPECT_TIMEOUT = 2.0   # s sin eco tras los que un comando cuenta como no confirmado
+MIRROR_SKIP_CONFIRMED = True  # no mandar lo que el LED ya muestra según su eco
+
+# Dispositivos vivos (liveness.py): cualquier mensaje suyo o su devices/<nombre>/status
+LIVENESS_STALE_AFTER = 30.0     # s sin noticias: se le pregunta reenviando su estado de LED
+LIVENESS_PROBE_TIMEOUT = 10.0   # s sin responder a esa pregunta: sin conexión (también con su LWT "offline")
+LIVENESS_TICK = 1.0             # s entre revisiones de la rueda de tiempos; 0 = desactivado
+LIVENESS_AUTO_SKIP = False      # saltar los pasos cuyo dispositivo está sin conexión
+LIVENESS_EXPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.json")   # la sirve apis/rockfit_devices.py
+
+# Renderer de animaciones de LEDs (logic.animator)
+ANIMATION_FPS = 20           # fotogramas por segundo
+ANIMATION_MAX_BACKLOG = 64   # comandos en cola + sin confirmar a partir de los que se descartan fotogramas
+
 DEFAULT_BRIGHTNESS = 255
 LOW_BRIGHTNESS = int(0.2 * DEFAULT_BRIGHTNESS)
 
@@ -76,10 +151,50 @@ EFFECTS = {
 }
 
 def get_led_effect_command(effect_name):
-    return EFFECTS.get(effect_name, {"state": "ON", "effect": effect_name})
+    # Copia: quien llama suele añadir color/brillo y no debe modificar EFFECTS
+    return dict(EFFECTS.get(effect_name, {"state": "ON", "effect": effect_name}))
+
+# ================================
+# Caché de payloads ya serializados (bytes listos para publicar)
+# ================================
+# Una única LRU (functools.lru_cache) con clave (state, brightness, (r, g, b), effect): la
+# paleta del motor y los colores del selector caben de sobra. Un fallo cuesta poco más que
+# json.dumps porque el codificador compacto se crea una sola vez (json.dumps con
+# separators=... construye un JSONEncoder en cada llamada).
+PAYLOAD_CACHE_SIZE = 4096
+
+_compact_json = json.JSONEncoder(separators=(",", ":"))
+
+@lru_cache(maxsize=PAYLOAD_CACHE_SIZE)
+def get_led_payload(state, brightness=None, color=None, effect=None):
+    """
+    Devuelve el payload JSON (bytes inmutables) para la combinación dada.
+    color es una tupla (r, g, b) o None.
+    """
+    cmd = {"state": state}
+    if brightness is not None:
+        cmd["brightness"] = brightness
+    if color is not None:
+        cmd["color"] = {"r": color[0], "g": color[1], "b": color[2]}
+    if effect is not None:
+        cmd["effect"] = effect
+    return _compact_json.encode(cmd).encode("utf-8")
+
+def get_command_payload(cmd):
+    """Equivalente cacheado de json.dumps(cmd) para los comandos de LED (dict)."""
+    color = cmd.get("color")
+    if color is not None:
+        color = (color["r"], color["g"], color["b"])
+    # Argumentos posicionales: la clave de lru_cache es más barata que con nombres
+    return get_led_payload(cmd.get("state"), cmd.get("brightness"), color, cmd.get("effect"))
+
+def payload_cache_info():
+    return get_led_payload.cache_info()._asdict()
 
 # ================================
 # Definición de Dispositivos
+# Opcional por dispositivo: "debounce_window" (s) para descartar golpes repetidos
+# del mismo dispositivo; por defecto logic.DUPLICATE_EVENT_WINDOW.
 # ================================
 DEVICES = [
     {"name": "r1", "type": "tag"},
@@ -115,7 +230,10 @@ DEVICES = [
 ]
 
 DEVICES_CONFIG = {}
-for device in DEVICES:
+EVENT_TOPICS = {}   # tópico de evento -> (dispositivo, "tap" | "double_tap")
+
+def build_device_config(device):
+    """Entrada de DEVICES_CONFIG para una definición de DEVICES, con sus tópicos."""
     name = device["name"]
     device_type = device["type"]
     config_entry = device.copy()
@@ -126,7 +244,49 @@ for device in DEVICES:
     elif device_type == "tile":
         config_entry["loadcell_topic"] = get_topic(TILE_TOPIC_TEMPLATES, name, "loadcell_topic")
         config_entry["light_command_topic"] = get_topic(TILE_TOPIC_TEMPLATES, name, "light_command_topic")
-    DEVICES_CONFIG[name] = config_entry
+    return config_entry
+
+def register_device(device, devices_config=None, event_topics=None):
+    """Añade (o sustituye) un dispositivo en DEVICES_CONFIG y EVENT_TOPICS (o en los dicts indicados)."""
+    return install_device_config(build_device_config(device), devices_config, event_topics)
+
+def install_device_config(config_entry, devices_config=None, event_topics=None):
+    """Añade (o sustituye) una entrada ya construida de DEVICES_CONFIG (p. ej. la recibida por un shard)."""
+    devices_config = DEVICES_CONFIG if devices_config is None else devices_config
+    event_topics = EVENT_TOPICS if event_topics is None else event_topics
+    name = config_entry["name"]
+    unregister_device(name, devices_config, event_topics)
+    devices_config[name] = config_entry
+    device_id(name)
+    for event_type in ("tap", "double_tap"):
+        topic = config_entry.get(f"{event_type}_topic")
+        if topic:
+            event_topics[topic] = (name, event_type)
+    return config_entry
+
+def unregister_device(name, devices_config=None, event_topics=None):
+    """Quita un dispositivo de DEVICES_CONFIG y EVENT_TOPICS (su id numérico se conserva)."""
+    devices_config = DEVICES_CONFIG if devices_config is None else devices_config
+    event_topics = EVENT_TOPICS if event_topics is None else event_topics
+    config_entry = devices_config.pop(name, None)
+    if config_entry is None:
+        return None
+    for event_type in ("tap", "double_tap"):
+        topic = config_entry.get(f"{event_type}_topic")
+        if topic and event_topics.get(topic, (None,))[0] == name:
+            del event_topics[topic]
+    return config_entry
+
+for device in DEVICES:
+    register_device(device)
+
+# ================================
+# Historial de resultados
+# ================================
+COMPLETED_HISTORY_SIZE = 50   # resultados recientes que se mantienen en memoria (GUI)
+RESULTS_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.db")
+RESULTS_BATCH_SIZE = 20       # inserciones agrupadas por transacción
+RESULTS_FLUSH_INTERVAL = 2.0  # s como mucho hasta que un resultado llega a results.db; 0 = solo por lotes
 
 # ================================
 # LISTA DE USUARIOS
@@ -592,4 +752,14 @@ CIRCUITS = [
             {"order": 5, "device": "r5",   "event": "tap", "bonus": False},
         ]
     }
-]
\ No newline at end of file
+]
+# ======================
+# Registro de circuitos: definiciones validadas, especificaciones compiladas e índices
+# (ver circuit_registry.py). Motor, GUI y API lo consultan en lugar de recorrer CIRCUITS.
+# ======================
+registry.load(CIRCUITS, DEVICES_CONFIG)
+CIRCUIT_SPECS = registry.specs
+
+def get_circuit_spec(circuit_config):
+    """Especificación compilada para `circuit_config` (se recompila si no es la registrada)."""
+    return registry.spec_for(circuit_config)
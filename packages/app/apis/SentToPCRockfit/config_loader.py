@@ -0,0 +1,222 @@
+"""
+config_loader.py
+----------------
+Recarga en caliente de dispositivos y circuitos desde un fichero externo (config.CONFIG_FILE),
+sin reiniciar el motor. El fichero es JSON, o YAML si la extensión es .yaml/.yml y PyYAML
+está instalado, con las listas "devices" y/o "circuits" en el mismo formato que
+config.DEVICES y config.CIRCUITS; la que falte se deja como está.
+
+Se calcula la diferencia con la configuración en uso y solo se aplica esa diferencia:
+    - dispositivos añadidos / quitados / cambiados: solo se regeneran sus entradas de
+      DEVICES_CONFIG y EVENT_TOPICS, y se devuelven los tópicos a (des)suscribir;
+    - circuitos añadidos / quitados / cambiados (incluidos los que usan un dispositivo
+      cambiado, en sus pasos o como dispositivo de control): solo se recompila su especificación en config.registry.
+Las instancias del motor las actualiza logic.apply_config_diff con el ConfigDiff devuelto;
+las de circuitos no afectados siguen tal cual.
+"""
+
+import json
+import os
+
+import config
+from circuit_registry import InvalidCircuit, validate_circuits
+
+try:
+    import yaml
+except ImportError:  # YAML es opcional: sin PyYAML solo se aceptan ficheros JSON
+    yaml = None
+
+# yaml.YAMLError no hereda de ValueError
+PARSE_ERRORS = (ValueError, yaml.YAMLError) if yaml is not None else (ValueError,)
+
+EVENT_TOPIC_KEYS = ("tap_topic", "double_tap_topic")
+
+
+class ConfigError(ValueError):
+    """El fichero no se puede leer o su contenido no es una configuración válida."""
+
+
+class ConfigDiff:
+    def __init__(self):
+        self.devices_added = []
+        self.devices_removed = []
+        self.devices_changed = []
+        self.circuits_added = []
+        self.circuits_removed = []
+        self.circuits_changed = []   # definición cambiada o dispositivos cambiados
+        self.subscribe = set()       # tópicos de evento nuevos
+        self.unsubscribe = set()     # tópicos de evento que ya no existen
+        self.stale_light_topics = set()   # LEDs cuyo estado conocido ya no vale
+
+    def empty(self):
+        return not (self.devices_added or self.devices_removed or self.devices_changed
+                    or self.circuits_added or self.circuits_removed or self.circuits_changed)
+
+    def __str__(self):
+        parts = []
+        for label, items in (
+            ("dispositivos +", self.devices_added), ("dispositivos -", self.devices_removed),
+            ("dispositivos ~", self.devices_changed), ("circuitos +", self.circuits_added),
+            ("circuitos -", self.circuits_removed), ("circuitos ~", self.circuits_changed),
+        ):
+            if items:
+                parts.append(f"{label}{', '.join(items)}")
+        return "; ".join(parts) or "sin cambios"
+
+
+def read_file(path):
+    """Contenido del fichero como dict. Lanza ConfigError si no se puede leer o interpretar."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    except OSError as e:
+        raise ConfigError(f"No se pudo leer {path}: {e}") from e
+    is_yaml = path.endswith((".yaml", ".yml"))
+    if is_yaml and yaml is None:
+        raise ConfigError(f"{path} es YAML pero PyYAML no está instalado.")
+    try:
+        data = yaml.safe_load(text) if is_yaml else json.loads(text)
+    except PARSE_ERRORS as e:
+        raise ConfigError(f"{path} no es válido: {e}") from e
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path} debe contener un objeto con 'devices' y/o 'circuits'.")
+    return data
+
+
+def validate(devices, circuits):
+    """Comprueba nombres e ids únicos y que cada paso use un dispositivo definido."""
+    names = set()
+    for device in devices:
+        if "name" not in device or "type" not in device:
+            raise ConfigError(f"Dispositivo sin name/type: {device}")
+        if device["name"] in names:
+            raise ConfigError(f"Dispositivo duplicado: {device['name']}")
+        names.add(device["name"])
+    try:
+        validate_circuits(circuits, names)
+    except InvalidCircuit as e:
+        raise ConfigError(str(e)) from e
+
+
+def _event_topics(config_entry):
+    return {config_entry[key] for key in EVENT_TOPIC_KEYS if config_entry.get(key)}
+
+
+def _circuit_devices(circuit):
+    """Dispositivos de los que depende un circuito: los de sus pasos y el de control."""
+    devices = {step["device"] for step in circuit.get("steps", [])}
+    if circuit.get("control_device"):
+        devices.add(circuit["control_device"])
+    return devices
+
+
+def apply(data, cfg=config):
+    """
+    Aplica a `cfg` la diferencia entre su configuración y `data` y devuelve el ConfigDiff.
+    Si `data` no es válido lanza ConfigError sin tocar nada.
+    """
+    new_devices = data.get("devices", cfg.DEVICES)
+    new_circuits = data.get("circuits", cfg.CIRCUITS)
+    validate(new_devices, new_circuits)
+    diff = ConfigDiff()
+
+    # Dispositivos: solo se regeneran las entradas de los que cambian
+    old_by_name = {d["name"]: d for d in cfg.DEVICES}
+    new_by_name = {d["name"]: d for d in new_devices}
+    for name, device in old_by_name.items():
+        if name not in new_by_name:
+            diff.devices_removed.append(name)
+        elif new_by_name[name] != device:
+            diff.devices_changed.append(name)
+    diff.devices_added = [name for name in new_by_name if name not in old_by_name]
+
+    # Dicts nuevos en lugar de modificar los compartidos: la GUI puede estar recorriéndolos
+    # desde su hilo mientras el motor aplica la recarga.
+    devices_config = dict(cfg.DEVICES_CONFIG)
+    event_topics = dict(cfg.EVENT_TOPICS)
+    old_topics = set()
+    for name in diff.devices_removed + diff.devices_changed:
+        entry = cfg.unregister_device(name, devices_config, event_topics)
+        if entry is not None:
+            old_topics |= _event_topics(entry)
+            if entry.get("light_command_topic"):
+                diff.stale_light_topics.add(entry["light_command_topic"])
+    new_topics = set()
+    for name in diff.devices_changed + diff.devices_added:
+        new_topics |= _event_topics(cfg.register_device(new_by_name[name], devices_config, event_topics))
+    diff.subscribe = new_topics - old_topics
+    diff.unsubscribe = old_topics - new_topics
+    cfg.DEVICES_CONFIG = devices_config
+    cfg.EVENT_TOPICS = event_topics
+    cfg.registry.set_devices_config(devices_config)
+    cfg.DEVICES[:] = new_devices
+
+    # Circuitos: se recompilan los cambiados y los que usan un dispositivo cambiado
+    touched_devices = set(diff.devices_removed) | set(diff.devices_changed)
+    old_by_id = {c["id"]: c for c in cfg.CIRCUITS}
+    for circuit in new_circuits:
+        cid = circuit["id"]
+        old = old_by_id.get(cid)
+        if old is None:
+            diff.circuits_added.append(cid)
+        elif old != circuit or touched_devices.intersection(_circuit_devices(circuit)):
+            diff.circuits_changed.append(cid)
+    new_ids = {c["id"] for c in new_circuits}
+    diff.circuits_removed = [cid for cid in old_by_id if cid not in new_ids]
+
+    # Lista nueva en el mismo objeto: quien guardó la referencia ve la configuración actual.
+    # Los circuitos sin cambios conservan su dict (y con él su especificación compilada).
+    cfg.CIRCUITS[:] = [old_by_id[c["id"]] if c["id"] in old_by_id and c["id"] not in diff.circuits_changed else c
+                       for c in new_circuits]
+    by_id = {c["id"]: c for c in cfg.CIRCUITS}
+    for cid in diff.circuits_removed:
+        cfg.registry.remove_definition(cid)
+    for cid in diff.circuits_added + diff.circuits_changed:
+        cfg.registry.set_definition(by_id[cid])
+    cfg.registry.reorder(by_id)
+    return diff
+
+
+class ConfigWatcher:
+    """
+    Comprueba si el fichero cambió (mtime y tamaño) y, si es así, lo aplica con apply().
+    Un cambio se aplica cuando el fichero sigue igual en la comprobación siguiente,
+    para no leer a medias un fichero que un editor aún está escribiendo.
+    """
+
+    def __init__(self, path, cfg=config):
+        self.path = path
+        self.cfg = cfg
+        self._signature = None   # fichero aplicado por última vez
+        self._pending = None     # cambio visto en la comprobación anterior
+        self.reloads = 0
+        self.errors = 0
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def poll(self, settle=True):
+        """
+        ConfigDiff si el fichero cambió y se aplicó; None si no hay nada nuevo. Lanza ConfigError.
+        Con settle=False se aplica sin esperar a la comprobación siguiente (arranque).
+        """
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            self._pending = None
+            return None
+        if settle and signature != self._pending:
+            self._pending = signature
+            return None
+        self._signature = signature
+        self._pending = None
+        try:
+            diff = apply(read_file(self.path), self.cfg)
+        except ConfigError:
+            self.errors += 1
+            raise
+        self.reloads += 1
+        return diff
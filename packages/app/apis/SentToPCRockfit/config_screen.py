@@ -73,7 +73,7 @@ class ConfigScreen(Screen):
         self.circuit_grid = GridLayout(cols=1, spacing=5, size_hint_y=None)
         self.circuit_grid.bind(minimum_height=self.circuit_grid.setter('height'))
 
-        for circuit in config.CIRCUITS:
+        for circuit in config.registry.definitions():
             btn = Button(
                 text=f"{circuit['id']}: {circuit['name']}",
                 size_hint_y=None,
@@ -115,17 +115,13 @@ class ConfigScreen(Screen):
         update_active_circuits(list(self.selected_circuits))
 
     def reiniciar_todos(self, instance):
-        from logic import circuits
-        for circuit in circuits:
-            if circuit.state not in ["waiting", "disabled"]:
-                circuit.restart()
+        import logic
+        logic.submit(logic.restart_circuits)
         print("Se han reiniciado todos los circuitos activos.")
 
     def desactivar_todos(self, instance):
-        from logic import circuits
-        for circuit in circuits:
-            if circuit.state != "disabled":
-                circuit.deactivate()
+        import logic
+        logic.submit(logic.deactivate_circuits)
         print("Se han desactivado todos los circuitos activos.")
 
     # -------------------------------------------------------------------------
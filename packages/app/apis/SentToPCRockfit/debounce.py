@@ -0,0 +1,53 @@
+"""
+debounce.py
+-----------
+Filtro de "golpes fantasma" por dispositivo y tipo de evento.
+Cada (dispositivo, evento) guarda en un pequeño buffer circular los instantes de sus
+últimos eventos aceptados; un evento que llega antes de `window` segundos desde el
+anterior del MISMO dispositivo se descarta. Taps de dispositivos distintos no se
+bloquean entre sí.
+"""
+
+from collections import deque
+
+
+class Debouncer:
+    def __init__(self, default_window, history=8):
+        self.default_window = default_window
+        self.history = history
+        self._recent = {}
+
+        # Contadores de eventos descartados por dispositivo
+        self.suppressed = {}
+        self.accepted = 0
+
+    def accept(self, device, event_type, now, window=None):
+        """Devuelve True si el evento debe procesarse. `now` en segundos monotónicos."""
+        if window is None:
+            window = self.default_window
+        key = (device, event_type)
+        recent = self._recent.get(key)
+        if recent is None:
+            recent = self._recent[key] = deque(maxlen=self.history)
+        elif now - recent[-1] < window:
+            self.suppressed[device] = self.suppressed.get(device, 0) + 1
+            return False
+        recent.append(now)
+        self.accepted += 1
+        return True
+
+    def recent(self, device, event_type):
+        """Instantes (monotónicos) de los últimos eventos aceptados, del más antiguo al más nuevo."""
+        return list(self._recent.get((device, event_type), ()))
+
+    def reset(self):
+        self._recent.clear()
+        self.suppressed.clear()
+        self.accepted = 0
+
+    def stats(self):
+        return {
+            "accepted": self.accepted,
+            "suppressed": sum(self.suppressed.values()),
+            "suppressed_by_device": dict(self.suppressed),
+        }
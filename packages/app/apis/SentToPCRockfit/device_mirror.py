@@ -0,0 +1,255 @@
+"""
+device_mirror.py
+----------------
+Espejo de lo que muestra cada LED según sus propios ecos de estado: tras aplicar un comando
+el ESP32 publica en devices/<dispositivo>/light/<id>/state un JSON como
+
+    {"state": "ON", "brightness": 255, "color_mode": "rgb", "color": {"r": 255, "g": 0, "b": 0}, "effect": "None"}
+
+Cada eco se reduce a un registro compacto por LED (DeviceRecord, clave light_command_topic como
+la sombra de led_shadow) con el estado en la misma tupla (state, brightness, color, effect),
+el instante del último eco y la latencia de confirmación del último comando.
+
+La sombra sabe qué se ha mandado; el espejo, qué se está viendo:
+
+    - expect(topic, estado) al encolar un comando; el primer eco que coincide lo confirma
+      (latencia = eco - encolado). unconfirmed() lista los que no llegaron en expect_timeout s.
+    - shows(topic, estado) es True si el LED ya muestra ese estado y no tiene nada pendiente:
+      el motor se ahorra ese comando aunque la sombra lo haya olvidado (reconexión, arranque).
+    - subscribe(fn) avisa de los cambios de estado (o de todos los ecos, con echoes=True)
+      al motor, a logic_devices y a la GUI; fn(record, anterior) corre en el hilo de paho.
+
+Consultas O(1) por tópico o por nombre de dispositivo. Seguro entre hilos; no importa config
+ni logic, así que lo pueden usar los scripts de prueba de baldosas.
+"""
+
+import json
+import threading
+import time
+
+from led_shadow import merge_command
+
+STATE_TOPIC = "devices/+/light/+/state"
+STATE_SUFFIX = "/state"
+COMMAND_SUFFIX = "/command"
+
+
+def is_light_state(topic):
+    return topic.endswith(STATE_SUFFIX) and "/light/" in topic
+
+
+def command_topic_for(state_topic):
+    return state_topic[:-len(STATE_SUFFIX)] + COMMAND_SUFFIX
+
+
+def _normalize(state):
+    """ESPHome informa "None" cuando no hay efecto."""
+    if state[3] == "None":
+        return state[:3] + (None,)
+    return state
+
+
+def _unit_color(color):
+    top = max(color) or 1
+    return tuple(round(c * 255 / top) for c in color)
+
+
+def same_light(a, b):
+    """
+    True si los estados `a` y `b` se ven igual. Apagado es apagado; los campos que uno de los
+    dos no conoce no cuentan, el brillo admite ±1 y el color se compara normalizado (el ESP32
+    escala el canal mayor a 255).
+    """
+    if a is None or b is None or a[0] != b[0]:
+        return False
+    if a[0] == "OFF":
+        return True
+    if a[1] is not None and b[1] is not None and abs(a[1] - b[1]) > 1:
+        return False
+    if a[2] is not None and b[2] is not None:
+        if any(abs(x - y) > 2 for x, y in zip(_unit_color(a[2]), _unit_color(b[2]))):
+            return False
+    return a[3] == b[3]
+
+
+class DeviceRecord:
+    __slots__ = ("device", "topic", "state", "last_seen", "latency", "echoes", "expected", "expected_at")
+
+    def __init__(self, device, topic):
+        self.device = device
+        self.topic = topic             # light_command_topic
+        self.state = None              # (state, brightness, color, effect) según el último eco
+        self.last_seen = None          # instante (clock) del último eco
+        self.latency = None            # s entre encolar el último comando confirmado y su eco
+        self.echoes = 0
+        self.expected = None           # estado comandado aún sin confirmar
+        self.expected_at = None
+
+    def as_dict(self):
+        return {
+            "device": self.device,
+            "state": list(self.state) if self.state is not None else None,
+            "last_seen": self.last_seen,
+            "latency_ms": self.latency * 1000 if self.latency is not None else None,
+            "echoes": self.echoes,
+            "pending": self.expected is not None,
+        }
+
+
+class DeviceMirror:
+    def __init__(self, expect_timeout=2.0, clock=time.monotonic):
+        self.expect_timeout = expect_timeout
+        self.clock = clock
+        self._records = {}       # light_command_topic -> DeviceRecord
+        self._by_device = {}     # nombre -> DeviceRecord
+        self._on_change = []
+        self._on_echo = []
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.echoes = 0
+        self.changes = 0
+        self.confirmed = 0
+        self.skipped = 0
+        self.parse_errors = 0
+
+    def configure(self, **settings):
+        for name, value in settings.items():
+            if not hasattr(self, name):
+                raise AttributeError(name)
+            setattr(self, name, value)
+
+    def subscribe_mqtt(self, client, qos=0):
+        """Una sola suscripción con comodines para los ecos de todos los LEDs."""
+        client.subscribe(STATE_TOPIC, qos)
+
+    def _record(self, topic):
+        record = self._records.get(topic)
+        if record is None:
+            parts = topic.split("/")
+            device = parts[1] if len(parts) > 1 else topic
+            record = self._records[topic] = DeviceRecord(device, topic)
+            self._by_device.setdefault(device, record)
+        return record
+
+    # ======================
+    # Ecos
+    # ======================
+    def handle(self, state_topic, payload, now=None):
+        """Procesa el eco de `state_topic` (bytes o str JSON). Devuelve el registro o None si no se entiende."""
+        now = self.clock() if now is None else now
+        try:
+            data = json.loads(payload)
+        except (TypeError, ValueError):
+            data = None
+        if not isinstance(data, dict):
+            self.parse_errors += 1
+            return None
+        with self._lock:
+            record = self._record(command_topic_for(state_topic))
+            previous = record.state
+            record.state = _normalize(merge_command(previous, data))
+            record.last_seen = now
+            record.echoes += 1
+            self.echoes += 1
+            if record.expected is not None and same_light(record.state, record.expected):
+                record.latency = now - record.expected_at
+                record.expected = record.expected_at = None
+                self.confirmed += 1
+            changed = record.state != previous
+            if changed:
+                self.changes += 1
+            listeners = self._on_echo + self._on_change if changed else list(self._on_echo)
+        for fn in listeners:
+            fn(record, previous)
+        return record
+
+    def expect(self, topic, state, now=None):
+        """Anota que se ha encolado un comando que deja `topic` en `state` (tupla de la sombra)."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            record = self._record(topic)
+            record.expected = state
+            record.expected_at = now
+
+    # ======================
+    # Consultas
+    # ======================
+    def get(self, topic):
+        """Registro del LED con ese light_command_topic (None si nunca respondió ni se le mandó nada)."""
+        return self._records.get(topic)
+
+    def device(self, name):
+        return self._by_device.get(name)
+
+    def state(self, topic):
+        record = self._records.get(topic)
+        return record.state if record is not None else None
+
+    def shows(self, topic, state):
+        """True si el LED ya muestra `state` según su último eco y no espera otro comando."""
+        record = self._records.get(topic)
+        if record is None or record.expected is not None or not same_light(record.state, state):
+            return False
+        self.skipped += 1
+        return True
+
+    def pending(self, topic):
+        record = self._records.get(topic)
+        return record is not None and record.expected is not None
+
+    def unconfirmed(self, now=None):
+        """Tópicos cuyo último comando lleva más de expect_timeout s sin eco que lo confirme."""
+        now = self.clock() if now is None else now
+        limit = now - self.expect_timeout
+        with self._lock:
+            return [r.topic for r in self._records.values() if r.expected is not None and r.expected_at < limit]
+
+    def silent_since(self, seconds, now=None):
+        """Dispositivos cuyo último eco es de hace más de `seconds` s."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            return [r.device for r in self._records.values() if r.last_seen is not None and now - r.last_seen > seconds]
+
+    # ======================
+    # Suscripciones
+    # ======================
+    def subscribe(self, fn, echoes=False):
+        """fn(record, estado_anterior) en cada cambio de estado (o en cada eco con echoes=True)."""
+        with self._lock:
+            (self._on_echo if echoes else self._on_change).append(fn)
+        return fn
+
+    def unsubscribe(self, fn):
+        with self._lock:
+            for listeners in (self._on_change, self._on_echo):
+                if fn in listeners:
+                    listeners.remove(fn)
+
+    def reset(self):
+        with self._lock:
+            self._records.clear()
+            self._by_device.clear()
+
+    def dump(self):
+        """Copia serializable {dispositivo: registro} (API y GUI)."""
+        with self._lock:
+            return {r.device: r.as_dict() for r in self._records.values()}
+
+    def stats(self):
+        with self._lock:
+            latencies = [r.latency for r in self._records.values() if r.latency is not None]
+            return {
+                "devices": len(self._records),
+                "echoes": self.echoes,
+                "changes": self.changes,
+                "confirmed": self.confirmed,
+                "pending": sum(1 for r in self._records.values() if r.expected is not None),
+                "skipped": self.skipped,
+                "parse_errors": self.parse_errors,
+                "max_latency_ms": max(latencies) * 1000 if latencies else 0.0,
+            }
+
+
+# Espejo único del proceso (motor, logic_devices y GUI)
+mirror = DeviceMirror()
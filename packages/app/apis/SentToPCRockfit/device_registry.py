@@ -0,0 +1,28 @@
+"""
+device_registry.py
+------------------
+Registro global de dispositivos: asigna a cada nombre un id entero, estable durante la sesión.
+Las especificaciones compiladas de circuito (circuit_spec) guardan ids en lugar de nombres,
+y el nombre solo se recupera para logs, la GUI y los comandos MQTT.
+"""
+
+_ids = {}     # nombre -> id
+_names = []   # id -> nombre
+
+
+def device_id(name):
+    """Id entero de `name`; lo registra si es la primera vez que se ve."""
+    did = _ids.get(name)
+    if did is None:
+        did = len(_names)
+        _ids[name] = did
+        _names.append(name)
+    return did
+
+
+def device_name(did):
+    return _names[did]
+
+
+def known_devices():
+    return tuple(_names)
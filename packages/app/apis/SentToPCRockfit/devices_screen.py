@@ -1,3 +1,4 @@
+from kivy.clock import Clock
 from kivy.uix.screenmanager import Screen
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
@@ -6,12 +7,19 @@ from kivy.uix.slider import Slider
 from kivy.uix.colorpicker import ColorPicker
 from kivy.uix.label import Label
 import logic_devices
+from device_mirror import mirror
 
 class DevicesScreen(Screen):
     def __init__(self, **kwargs):
         super(DevicesScreen, self).__init__(**kwargs)
         layout = BoxLayout(orientation="vertical", spacing=10, padding=10)
         layout.add_widget(Label(text="Pantalla de Dispositivos", font_size="24sp", size_hint=(1, 0.1)))
+
+        # Lo que muestran los LEDs según sus ecos; los cambios llegan por el hilo de paho
+        self.mirror_label = Label(text="Sin ecos de los LEDs todavía", size_hint=(1, 0.05))
+        layout.add_widget(self.mirror_label)
+        self._refresh_mirror = Clock.create_trigger(self.update_mirror)
+        mirror.subscribe(lambda record, previous: self._refresh_mirror())
         
         global_controls = GridLayout(cols=2, spacing=10, size_hint=(1, 0.3))
         btn_on = Button(text="Encender Todas")
@@ -42,3 +50,9 @@ class DevicesScreen(Screen):
         layout.add_widget(btn_apply_color)
         
         self.add_widget(layout)
+
+    def update_mirror(self, dt=None):
+        stats = mirror.stats()
+        lit = sum(1 for record in mirror.dump().values() if record["state"] and record["state"][0] == "ON")
+        self.mirror_label.text = (f"LEDs: {stats['devices']} ({lit} encendidos) | "
+                                  f"sin confirmar: {stats['pending']} | latencia máx: {stats['max_latency_ms']:.0f} ms")
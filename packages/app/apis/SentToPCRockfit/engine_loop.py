@@ -0,0 +1,132 @@
+"""
+engine_loop.py
+--------------
+Bucle de eventos de un solo consumidor para el motor de circuitos.
+Todas las mutaciones de estado (eventos MQTT, tareas del planificador, acciones de la GUI)
+se encolan en una cola acotada y las ejecuta un único hilo, en orden de llegada.
+Así los callbacks de paho y de Kivy solo encolan y nunca tocan los circuitos directamente.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class EngineLoop:
+    def __init__(self, maxsize=1024, name="rockfit-engine"):
+        self.name = name
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.service_total = 0.0
+        self.service_max = 0.0
+
+    # ----------------------------------------------------------------------
+    # Ciclo de vida
+    # ----------------------------------------------------------------------
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=1.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        if thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def in_loop(self):
+        """True si se llama desde el hilo del motor."""
+        return self._thread is threading.current_thread()
+
+    # ----------------------------------------------------------------------
+    # API
+    # ----------------------------------------------------------------------
+    def submit(self, fn, *args, block=False):
+        """
+        Encola fn(*args) para ejecutarla en el hilo del motor.
+        Con block=False (callbacks de red) nunca espera: si la cola está llena el evento
+        se descarta y se cuenta en `dropped`. Devuelve True si se aceptó.
+        Llamado desde el propio hilo del motor, se ejecuta en el acto.
+        """
+        if self._thread is None:
+            self.start()
+        if self.in_loop():
+            self._execute(fn, args, time.perf_counter())
+            return True
+        try:
+            self._queue.put((fn, args, time.perf_counter()), block=block)
+        except queue.Full:
+            self.dropped += 1
+            logging.warning("[%s] Cola llena (%d); se descarta %s.", self.name, self._queue.maxsize, getattr(fn, "__name__", fn))
+            return False
+        self.submitted += 1
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        processed = self.processed
+        return {
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "processed": processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "wait_avg_ms": (self.wait_total / processed * 1000.0) if processed else 0.0,
+            "wait_max_ms": self.wait_max * 1000.0,
+            "service_avg_us": (self.service_total / processed * 1e6) if processed else 0.0,
+            "service_max_us": self.service_max * 1e6,
+        }
+
+    # ----------------------------------------------------------------------
+    # Interno
+    # ----------------------------------------------------------------------
+    def _execute(self, fn, args, enqueued_at):
+        start = time.perf_counter()
+        try:
+            fn(*args)
+        except Exception:
+            self.errors += 1
+            logging.exception("[%s] Error procesando %s", self.name, getattr(fn, "__name__", fn))
+        end = time.perf_counter()
+        wait = start - enqueued_at
+        service = end - start
+        self.processed += 1
+        self.wait_total += wait
+        self.service_total += service
+        if wait > self.wait_max:
+            self.wait_max = wait
+        if service > self.service_max:
+            self.service_max = service
+
+    def _run(self):
+        get = self._queue.get
+        while True:
+            item = get()
+            if item is _STOP:
+                return
+            fn, args, enqueued_at = item
+            self._execute(fn, args, enqueued_at)
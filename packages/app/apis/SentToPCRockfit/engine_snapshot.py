@@ -0,0 +1,54 @@
+"""
+engine_snapshot.py
+------------------
+Instantánea compacta del estado del motor en disco para un arranque en caliente:
+instancias en curso (estado, paso, inicio, parciales, color, usuarios), circuitos activos,
+sombra de LEDs y resultados recientes aún no volcados al almacén.
+
+La construye y la aplica logic.py (snapshot_state / restore_state); aquí solo se escribe
+de forma atómica (fichero temporal + fsync + os.replace) y se lee validando versión y edad.
+Los instantes se guardan en ns de reloj de pared: el reloj monotónico no sobrevive al proceso.
+"""
+
+import json
+import os
+import time
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "engine_state.json")
+FORMAT_VERSION = 1
+
+
+def save(data, path=DEFAULT_PATH):
+    """Escribe la instantánea `data` (dict) en `path`; un corte a mitad deja la anterior intacta."""
+    data = dict(data, version=FORMAT_VERSION, saved_at=time.time())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load(path=DEFAULT_PATH, max_age=None):
+    """
+    Última instantánea, o None si no existe, está corrupta, es de otra versión
+    o tiene más de `max_age` segundos.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != FORMAT_VERSION:
+        return None
+    if max_age is not None and time.time() - data.get("saved_at", 0) > max_age:
+        return None
+    return data
+
+
+def discard(path=DEFAULT_PATH):
+    """Borra la instantánea (p. ej. para forzar un arranque en frío)."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
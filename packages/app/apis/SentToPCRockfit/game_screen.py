@@ -9,15 +9,17 @@ from kivy.uix.popup import Popup
 from kivy.uix.spinner import Spinner
 from kivy.uix.textinput import TextInput
 from kivy.properties import ListProperty
-import time
 import logging
 
 import logic
 import config
+import liveness
+import timebase
 
 # --- Constantes de color para los fondos de cada sección ---
 ACTIVE_BG_COLOR = [0, 0, 0, 1]        # Fondo para circuitos activos
 COMPLETED_BG_COLOR = [0.10, 0.10, 0, 1]         # Fondo circuitos completados
+OFFLINE_TEXT_COLOR = [1, 0.35, 0.35, 1]         # Aviso de dispositivos sin conexión
 
 # --- Widget personalizado para fondo coloreado ---
 class ColoredBoxLayout(BoxLayout):
@@ -45,6 +47,9 @@ class GameScreen(Screen):
     def __init__(self, **kwargs):
         super(GameScreen, self).__init__(**kwargs)
         self.layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
+        # Dispositivos sin conexión (liveness.py): batería agotada, fuera de la red...
+        self.offline_label = Label(text="", font_size="14sp", size_hint_y=None, height=0, color=OFFLINE_TEXT_COLOR)
+        self.layout.add_widget(self.offline_label)
         self.scroll = ScrollView(size_hint=(1, 1))
         # Main layout containing the cards
         self.main_layout = BoxLayout(orientation='vertical', spacing=5, size_hint_y=None)
@@ -76,11 +81,16 @@ class GameScreen(Screen):
     def update_cards(self, dt):
         self.main_layout.clear_widgets()
 
+        offline = liveness.tracker.offline()
+        self.offline_label.text = f"Sin conexión: {', '.join(offline)}" if offline else ""
+        self.offline_label.height = 30 if offline else 0
+
         # --- Circuitos Activos ---
         active_layout = BoxLayout(orientation='vertical', spacing=5, size_hint_y=None)
         active_layout.bind(minimum_height=active_layout.setter('height'))
         active_layout.add_widget(Label(text="Circuitos Activos", font_size="18sp", size_hint_y=None, height=30))
-        for circuit in logic.circuits:
+        # Copia: el motor da de alta y de baja instancias desde su hilo
+        for circuit in tuple(logic.circuits):
             if circuit.state in ["waiting", "in_progress", "timeout"]:
                 card = self.create_active_card(circuit)
                 active_layout.add_widget(card)
@@ -93,7 +103,7 @@ class GameScreen(Screen):
         completed_layout = BoxLayout(orientation='vertical', spacing=5, size_hint_y=None)
         completed_layout.bind(minimum_height=completed_layout.setter('height'))
         completed_layout.add_widget(Label(text="Circuitos Completados", font_size="18sp", size_hint_y=None, height=30))
-        for result in logic.completed_circuits:
+        for result in logic.completed_snapshot:
             card = self.create_completed_card(result)
             completed_layout.add_widget(card)
         # Envolvemos completed_layout en un ColoredBoxLayout con fondo para completados
@@ -117,8 +127,8 @@ class GameScreen(Screen):
 
         if circuit.state == "completed" and hasattr(circuit, "total_time"):
             time_text = f"{circuit.total_time:.2f}s"
-        elif circuit.start_time:
-            elapsed = time.time() - circuit.start_time
+        elif circuit.start_time is not None:
+            elapsed = circuit.elapsed()
             time_text = f"{elapsed:.2f}s"
         else:
             time_text = "0s"
@@ -133,6 +143,8 @@ class GameScreen(Screen):
                 dev = circuit.sequence[current_index]
                 evt = circuit.steps[current_index]["event"]
                 next_step_str = f" - {dev}({evt})"
+                if liveness.tracker.is_offline(dev):
+                    next_step_str += " [sin conexión]"
 
         title_text = f"{circuit.name}: {circuit.state}{next_step_str}"
         col2 = BoxLayout(orientation='vertical', size_hint_x=0.34)
@@ -147,8 +159,8 @@ class GameScreen(Screen):
                 spinner_assigned.text = assigned
                 self.show_new_user_popup(circuit=circuit, result=None)
             else:
-                circuit.assigned_users = [new_selection] if new_selection != "Sin asignar" else []
-                self.update_cards(0)
+                users = [new_selection] if new_selection != "Sin asignar" else []
+                logic.submit(setattr, circuit, "assigned_users", users)
 
         spinner_assigned.bind(text=on_select_user)
         col3 = BoxLayout(orientation='vertical', size_hint_x=0.33)
@@ -170,10 +182,7 @@ class GameScreen(Screen):
         btn_finish.background_color = normalized_color
         btn_more.background_color = normalized_color
 
-        def on_skip(_instance):
-            circuit.skip_step()
-            self.update_cards(0)
-        btn_skip.bind(on_release=on_skip)
+        btn_skip.bind(on_release=lambda instance: self.skip_step(circuit))
         btn_finish.bind(on_release=lambda instance: self.finish_circuit(circuit))
         btn_more.bind(on_release=lambda instance: self.show_more_info(circuit))
 
@@ -209,11 +218,8 @@ class GameScreen(Screen):
                 spinner_assigned.text = assigned
                 self.show_new_user_popup(circuit=None, result=result)
             else:
-                if new_selection == "Sin asignar":
-                    result["assigned_users"] = []
-                else:
-                    result["assigned_users"] = [new_selection]
-                self.update_cards(0)
+                users = [] if new_selection == "Sin asignar" else [new_selection]
+                logic.submit(logic.assign_result_users, result, users)
 
         spinner_assigned.bind(text=on_select_user_completed)
         col3 = BoxLayout(orientation='vertical', size_hint_x=0.33)
@@ -234,26 +240,22 @@ class GameScreen(Screen):
         self.add_border(card, color)
         return card
 
+    # Las acciones se encolan en el hilo del motor; la vista se refresca en el siguiente update_cards
     def skip_step(self, circuit):
-        try:
-            circuit.skip_step()
-            self.update_cards(0)
-        except Exception as e:
-            logging.error(f"Error al saltar paso en {circuit.name}: {e}")
+        if not logic.submit(circuit.skip_step):
+            logging.error(f"No se pudo encolar el salto de paso en {circuit.name}.")
 
     def finish_circuit(self, circuit):
-        try:
-            circuit.complete_circuit()
-        except Exception as e:
-            logging.error(f"Error al finalizar circuito {circuit.name}: {e}")
+        if not logic.submit(circuit.complete_circuit):
+            logging.error(f"No se pudo encolar la finalización del circuito {circuit.name}.")
 
     def show_more_info(self, circuit):
         content = BoxLayout(orientation='vertical', spacing=10, padding=10)
         details = f"Circuito: {circuit.name}\n"
         details += f"Estado: {circuit.state}\n"
         details += f"Progreso: {circuit.current_index}/{len(circuit.sequence)}\n"
-        if circuit.start_time:
-            elapsed = time.time() - circuit.start_time
+        if circuit.start_time is not None:
+            elapsed = circuit.elapsed()
             details += f"Tiempo transcurrido: {elapsed:.2f}s\n"
         if hasattr(circuit, 'total_time') and circuit.total_time:
             details += f"Tiempo total: {circuit.total_time:.2f}s\n"
@@ -261,7 +263,7 @@ class GameScreen(Screen):
         details += f"Asignado a: {assigned}\n"
         details += "Eventos:\n"
         for ev in circuit.timestamps:
-            details += f"  {ev[2]} - {ev[0]} en {ev[1]}\n"
+            details += f"  {timebase.format_ts(ev[2])} - {ev[0]} en {ev[1]}\n"
         content.add_widget(Label(text=details))
         btn_close = Button(text="Cerrar", size_hint_y=None, height=40)
         content.add_widget(btn_close)
@@ -277,7 +279,7 @@ class GameScreen(Screen):
         details += f"Asignado a: {assigned}\n"
         details += "Eventos:\n"
         for ev in result["timestamps"]:
-            details += f"  {ev[2]} - {ev[0]} en {ev[1]}\n"
+            details += f"  {timebase.format_ts(ev[2])} - {ev[0]} en {ev[1]}\n"
         content.add_widget(Label(text=details))
         btn_close = Button(text="Cerrar", size_hint_y=None, height=40)
         content.add_widget(btn_close)
@@ -302,11 +304,10 @@ class GameScreen(Screen):
                 config.USER_LIST.append(new_user)
             if new_user:
                 if circuit:
-                    circuit.assigned_users = [new_user]
+                    logic.submit(setattr, circuit, "assigned_users", [new_user])
                 elif result is not None:
-                    result["assigned_users"] = [new_user]
+                    logic.submit(logic.assign_result_users, result, [new_user])
             popup_new_user.dismiss()
-            self.update_cards(0)
         def on_cancel(_instance):
             popup_new_user.dismiss()
         btn_ok.bind(on_release=on_ok)
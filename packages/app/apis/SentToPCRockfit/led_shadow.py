@@ -0,0 +1,125 @@
+"""
+led_shadow.py
+-------------
+Sombra del último estado de LED comandado a cada dispositivo (por light_command_topic):
+(state, brightness, color, effect). La comparten todos los circuitos y logic_devices,
+de modo que solo llegan al broker los comandos que cambian algo en el dispositivo.
+Los campos que un comando no incluye se heredan del estado anterior, igual que hace
+el componente light del ESP32.
+"""
+
+import threading
+
+_EMPTY = (None, None, None, None)
+
+
+def merge_command(prev, cmd):
+    """Aplica el comando `cmd` (dict) sobre el estado previo y devuelve el nuevo estado (tupla)."""
+    state, brightness, color, effect = prev or _EMPTY
+    color_cmd = cmd.get("color")
+    if color_cmd is not None:
+        color = (color_cmd.get("r", 0), color_cmd.get("g", 0), color_cmd.get("b", 0))
+    return (
+        cmd.get("state", state),
+        cmd.get("brightness", brightness),
+        color,
+        cmd.get("effect", effect),
+    )
+
+
+def state_to_command(state_tuple):
+    """Reconstruye el comando (dict) equivalente a un estado de la sombra."""
+    state, brightness, color, effect = state_tuple
+    cmd = {"state": state}
+    if state == "ON":
+        if brightness is not None:
+            cmd["brightness"] = brightness
+        if color is not None:
+            cmd["color"] = {"r": color[0], "g": color[1], "b": color[2]}
+        if effect is not None:
+            cmd["effect"] = effect
+    return cmd
+
+
+class LedShadow:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+        self._held = None   # durante hold(): topic -> estado antes de retener
+
+        # Contadores
+        self.sent = 0
+        self.suppressed = 0
+        self.forced = 0
+
+    def should_send(self, topic, cmd, force=False):
+        """
+        Devuelve True si `cmd` cambia el estado conocido de `topic` (o si force=True)
+        y en ese caso actualiza la sombra. Si no cambia nada, cuenta el comando como suprimido.
+        """
+        with self._lock:
+            prev = self._state.get(topic)
+            new = merge_command(prev, cmd)
+            if self._held is not None:
+                self._held.setdefault(topic, prev)
+                self._state[topic] = new
+                return False
+            if new == prev and not force:
+                self.suppressed += 1
+                return False
+            self._state[topic] = new
+            self.sent += 1
+            if force:
+                self.forced += 1
+            return True
+
+    def hold(self):
+        """
+        Retiene los comandos: should_send solo actualiza la sombra y devuelve False
+        hasta release(), que indica qué tópicos acabaron en un estado distinto del inicial.
+        """
+        with self._lock:
+            self._held = {}
+
+    def release(self):
+        """Termina hold() y devuelve {topic: estado final} de los LEDs que cambiaron."""
+        with self._lock:
+            held, self._held = self._held or {}, None
+            return {topic: self._state[topic] for topic, before in held.items() if self._state[topic] != before}
+
+    def get(self, topic):
+        return self._state.get(topic)
+
+    def invalidate(self, topics=None):
+        """Olvida el estado de `topics` (o de todos) para que el siguiente comando se envíe sí o sí."""
+        with self._lock:
+            if topics is None:
+                self._state.clear()
+            else:
+                for topic in topics:
+                    self._state.pop(topic, None)
+
+    def dump(self):
+        """Copia del estado conocido {topic: [state, brightness, color, effect]} (serializable)."""
+        with self._lock:
+            return {topic: list(state) for topic, state in self._state.items()}
+
+    def load(self, states):
+        """Sustituye el estado conocido por uno volcado con dump() (arranque en caliente)."""
+        with self._lock:
+            self._state = {
+                topic: (state, brightness, tuple(color) if color is not None else None, effect)
+                for topic, (state, brightness, color, effect) in states.items()
+            }
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "suppressed": self.suppressed,
+            "forced": self.forced,
+            "tracked": len(self._state),
+        }
+
+
+# Sombra única del proceso
+shadow = LedShadow()
@@ -9,10 +9,24 @@ import logging
 import logic
 import logic_devices
 import config
+import rockfit_logging
 
 active_circuits = ["circuito_2"]
 logic_thread = None
 
+
+def engine_runtime():
+    """
+    Modo del motor con la GUI. "sharded" no se admite: las pantallas leen logic.circuits y
+    mandan sus acciones con logic.submit a este proceso, y en ese modo los circuitos viven
+    en los shards. Se arranca en "threads".
+    """
+    if config.ENGINE_RUNTIME == "sharded":
+        logging.error("ENGINE_RUNTIME='sharded' no es compatible con la GUI; se usa 'threads'.")
+        return "threads"
+    return config.ENGINE_RUNTIME
+
+
 def update_active_circuits(new_active):
     global active_circuits, logic_thread
     active_circuits = new_active
@@ -65,15 +79,20 @@ class LimbxApp(App):
         return root
 
     def on_start(self):
+        # Logging en cola (consola + logs/ rotativos); nivel INFO por defecto en config.LOG_LEVEL
+        rockfit_logging.setup_from_config(config)
+
         def init_logic():
-            logic.main(active_circuits)  # Arranca la lógica con los circuitos por defecto
+            # Arranca la lógica con los circuitos por defecto
+            if engine_runtime() == "asyncio":
+                import async_runtime
+                async_runtime.start_in_thread(active_circuits)
+            else:
+                logic.main(active_circuits)
             logic_devices.init_devices_client()
 
         init_thread = threading.Thread(target=init_logic, daemon=True)
         init_thread.start()
 
-        # Forzamos el nivel de log a INFO para ocultar mensajes DEBUG
-        logging.getLogger().setLevel(logging.INFO)
-
 if __name__ == '__main__':
     LimbxApp().run()
@@ -0,0 +1,323 @@
+"""
+liveness.py
+-----------
+Seguimiento de qué dispositivos siguen vivos (tags con la batería agotada, baldosas
+desenchufadas). Cualquier mensaje de devices/<nombre>/... cuenta como señal de vida: taps,
+ecos de estado de los LEDs, la célula de carga y el tópico de disponibilidad de ESPHome
+(devices/<nombre>/status, "online"/"offline"; "offline" es su última voluntad y marca
+el dispositivo sin conexión en el acto).
+
+Estados: UNKNOWN (aún sin noticias) -> ONLINE <-> STALE (stale_after s sin noticias)
+-> OFFLINE. Los tags de ESPHome solo publican al tocarlos, así que el silencio no basta para
+darlos por caídos: STALE solo invita a preguntar (el motor solo pregunta a los que tienen un
+comando sin confirmar; uno en reposo y al día no genera tráfico). Un dispositivo pasa a OFFLINE
+únicamente por su última voluntad o si no responde a una pregunta (probe(): quien la hace le
+reenvía su estado de LED y su eco cuenta como respuesta) en probe_timeout s. Sin pregunta se
+queda en STALE.
+
+Cada dispositivo tiene como mucho una entrada en una rueda de tiempos (TimingWheel): un mensaje
+solo actualiza last_seen y, al vencer la entrada, se mira cuánto hace del último y se
+reprograma o cambia de estado. tick() solo toca las entradas vencidas, nunca recorre todos
+los dispositivos.
+
+Los cambios de estado se notifican a subscribe(fn) como fn(dispositivo, anterior, nuevo) en
+el hilo que los provoca (seen() desde el de paho, tick() desde el del motor).
+Solo usa la librería estándar para poder importarse tanto desde el motor como desde Flask.
+"""
+
+import json
+import os
+import threading
+import time
+
+UNKNOWN = "unknown"
+ONLINE = "online"
+STALE = "stale"
+OFFLINE = "offline"
+
+STATUS_TOPIC = "devices/+/status"
+DEFAULT_EXPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.json")
+
+
+def device_of(topic):
+    """Nombre del dispositivo de un tópico devices/<nombre>/... (None si no es de un dispositivo)."""
+    parts = topic.split("/", 2)
+    if len(parts) < 3 or parts[0] != "devices":
+        return None
+    return parts[1]
+
+
+def is_status(topic):
+    return topic.endswith("/status") and topic.count("/") == 2
+
+
+class TimingWheel:
+    """
+    Rueda de tiempos con `slots` ranuras de `tick` s. Una entrada más lejana que una vuelta
+    se queda en su ranura hasta que le toca (se guarda el tick absoluto en que vence).
+    """
+
+    def __init__(self, tick=1.0, slots=64, now=0.0):
+        self.tick = tick
+        self._slots = [[] for _ in range(slots)]
+        self._current = int(now // tick)   # último tick procesado
+        self.size = 0
+
+    def add(self, key, deadline):
+        due = max(-int(-deadline // self.tick), self._current + 1)
+        self._slots[due % len(self._slots)].append((due, key))
+        self.size += 1
+
+    def advance(self, now):
+        """Avanza hasta `now` y devuelve las claves vencidas."""
+        target = int(now // self.tick)
+        if target <= self._current:
+            return []
+        expired = []
+        slots = len(self._slots)
+        for step in range(1, min(target - self._current, slots) + 1):
+            index = (self._current + step) % slots
+            slot = self._slots[index]
+            if not slot:
+                continue
+            keep = []
+            for entry in slot:
+                (expired if entry[0] <= target else keep).append(entry)
+            self._slots[index] = keep
+        self._current = target
+        self.size -= len(expired)
+        return [key for _, key in expired]
+
+
+class _Device:
+    __slots__ = ("name", "state", "last_seen", "due", "changed_at", "probe_at")
+
+    def __init__(self, name, now):
+        self.name = name
+        self.state = UNKNOWN
+        self.last_seen = now       # el arranque cuenta como última noticia
+        self.due = None            # vencimiento de su entrada en la rueda (None si no tiene)
+        self.changed_at = now
+        self.probe_at = None       # instante de la pregunta aún sin respuesta
+
+
+class LivenessTracker:
+    def __init__(self, stale_after=30.0, probe_timeout=10.0, tick=1.0, slots=128, clock=time.monotonic):
+        self.stale_after = stale_after
+        self.probe_timeout = probe_timeout
+        self.clock = clock
+        self._wheel = TimingWheel(tick, slots, clock())
+        self._devices = {}
+        self._offline = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.transitions = 0
+        self.suppressed = 0        # publicaciones ahorradas a dispositivos sin conexión (las cuenta quien publica)
+
+    def configure(self, **settings):
+        for name, value in settings.items():
+            if not hasattr(self, name):
+                raise AttributeError(name)
+            setattr(self, name, value)
+
+    @property
+    def wheel_tick(self):
+        return self._wheel.tick
+
+    @wheel_tick.setter
+    def wheel_tick(self, tick):
+        """Rehace la rueda con ranuras de `tick` s (config.LIVENESS_TICK) conservando las entradas."""
+        with self._lock:
+            wheel = TimingWheel(tick, len(self._wheel._slots), self.clock())
+            for device in self._devices.values():
+                if device.due is not None:
+                    wheel.add(device.name, device.due)
+            self._wheel = wheel
+
+    def subscribe_mqtt(self, client, qos=0):
+        client.subscribe(STATUS_TOPIC, qos)
+
+    def subscribe(self, fn):
+        """fn(dispositivo, estado_anterior, estado_nuevo) en cada cambio de estado."""
+        with self._lock:
+            self._listeners.append(fn)
+        return fn
+
+    def unsubscribe(self, fn):
+        with self._lock:
+            if fn in self._listeners:
+                self._listeners.remove(fn)
+
+    def watch(self, names, now=None):
+        """Sigue exactamente los dispositivos `names` (p. ej. config.DEVICES_CONFIG): altas y bajas."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            names = set(names)
+            for name in set(self._devices) - names:
+                del self._devices[name]
+                self._offline.discard(name)
+            for name in names - set(self._devices):
+                device = self._devices[name] = _Device(name, now)
+                self._arm(device, now + self.stale_after)
+
+    def _arm(self, device, deadline):
+        device.due = deadline
+        self._wheel.add(device.name, deadline)
+
+    def _set(self, device, state, now, changes):
+        if device.state == state:
+            return
+        changes.append((device.name, device.state, state))
+        device.state = state
+        device.changed_at = now
+        if state == OFFLINE:
+            self._offline.add(device.name)
+        else:
+            self._offline.discard(device.name)
+        self.transitions += 1
+
+    def _notify(self, changes):
+        if changes:
+            with self._lock:
+                listeners = list(self._listeners)
+            for name, old, new in changes:
+                for fn in listeners:
+                    fn(name, old, new)
+        return changes
+
+    # ======================
+    # Señales de vida
+    # ======================
+    def seen(self, name, now=None):
+        """Mensaje de `name`: O(1). Devuelve los cambios de estado [(dispositivo, anterior, nuevo)]."""
+        now = self.clock() if now is None else now
+        changes = []
+        with self._lock:
+            device = self._devices.get(name)
+            if device is None:
+                return changes
+            device.last_seen = now
+            device.probe_at = None
+            self._set(device, ONLINE, now, changes)
+            # Normalmente ya tiene entrada (y vence antes): no se toca la rueda. Si estaba STALE
+            # u OFFLINE no tiene ninguna.
+            deadline = now + self.stale_after
+            if device.due is None or device.due > deadline:
+                self._arm(device, deadline)
+        return self._notify(changes)
+
+    def seen_topic(self, topic, payload=None, now=None):
+        """seen() a partir de un tópico; un "offline" en devices/<nombre>/status lo marca sin conexión."""
+        name = device_of(topic)
+        if name is None:
+            return []
+        if payload is not None and is_status(topic):
+            if isinstance(payload, bytes):
+                payload = payload.decode("utf-8", errors="replace")
+            if payload.strip() == "offline":
+                return self.mark_offline(name, now)
+        return self.seen(name, now)
+
+    def mark_offline(self, name, now=None):
+        now = self.clock() if now is None else now
+        changes = []
+        with self._lock:
+            device = self._devices.get(name)
+            if device is not None:
+                device.probe_at = None
+                self._set(device, OFFLINE, now, changes)
+        return self._notify(changes)
+
+    def probe(self, name, now=None):
+        """Se acaba de preguntar a `name`: si no se sabe de él en probe_timeout s, pasa a OFFLINE."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            device = self._devices.get(name)
+            if device is None or device.state == OFFLINE:
+                return
+            device.probe_at = now
+            self._arm(device, now + self.probe_timeout)
+
+    def tick(self, now=None):
+        """Procesa las entradas vencidas de la rueda. Devuelve los cambios de estado."""
+        now = self.clock() if now is None else now
+        changes = []
+        with self._lock:
+            for name in self._wheel.advance(now):
+                device = self._devices.get(name)
+                if device is None or device.due is None or device.due > now:
+                    continue   # entrada de un dispositivo dado de baja (y quizá de alta otra vez)
+                device.due = None
+                idle = now - device.last_seen
+                if device.probe_at is not None:
+                    # seen() la habría borrado: la pregunta se quedó sin respuesta
+                    device.probe_at = None
+                    self._set(device, OFFLINE, now, changes)
+                elif idle >= self.stale_after:
+                    # Sin entrada: sigue en STALE hasta que se sepa de él o se le pregunte
+                    self._set(device, STALE, now, changes)
+                else:
+                    self._arm(device, device.last_seen + self.stale_after)
+        return self._notify(changes)
+
+    # ======================
+    # Consultas
+    # ======================
+    def state(self, name):
+        device = self._devices.get(name)
+        return device.state if device is not None else None
+
+    def is_offline(self, name):
+        return name in self._offline
+
+    def offline(self):
+        return sorted(self._offline)
+
+    def dump(self, now=None):
+        """{dispositivo: {"state", "idle_s"}} serializable (API y GUI)."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            return {
+                d.name: {"state": d.state, "idle_s": round(now - d.last_seen, 1)}
+                for d in self._devices.values()
+            }
+
+    def stats(self):
+        with self._lock:
+            counts = {ONLINE: 0, STALE: 0, OFFLINE: 0, UNKNOWN: 0}
+            for device in self._devices.values():
+                counts[device.state] += 1
+            return {
+                "devices": len(self._devices),
+                "online": counts[ONLINE],
+                "stale": counts[STALE],
+                "offline": counts[OFFLINE],
+                "unknown": counts[UNKNOWN],
+                "transitions": self.transitions,
+                "suppressed": self.suppressed,
+                "wheel_entries": self._wheel.size,
+            }
+
+
+# Seguimiento único del proceso (motor, logic_devices y GUI)
+tracker = LivenessTracker()
+
+
+# ======================
+# Exportación para la API (apis/rockfit_devices.py)
+# ======================
+def export(path, devices):
+    """Escribe `devices` (dump() y demás) en `path` de forma atómica, con marca de tiempo."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"ts": time.time(), "devices": devices}, f)
+    os.replace(tmp, path)
+
+
+def load(path=DEFAULT_EXPORT_PATH):
+    """Última exportación, o None si todavía no existe."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,143 @@
+"""
+local_broker.py
+---------------
+Broker MQTT en memoria para pruebas y benchmarks del motor sin red.
+LocalClient imita la parte de paho.mqtt.client.Client que usa el motor
+(publish, subscribe, on_connect, on_message, connect, loop_start...), y LocalBroker
+entrega cada publicación de forma síncrona a los clientes suscritos (admite + y #).
+"""
+
+import itertools
+
+
+def topic_matches(pattern, topic):
+    """Comprueba si `topic` encaja con el filtro MQTT `pattern` (comodines + y #)."""
+    if pattern == topic:
+        return True
+    p_parts = pattern.split("/")
+    t_parts = topic.split("/")
+    for i, part in enumerate(p_parts):
+        if part == "#":
+            return True
+        if i >= len(t_parts):
+            return False
+        if part != "+" and part != t_parts[i]:
+            return False
+    return len(p_parts) == len(t_parts)
+
+
+class LocalMessage:
+    __slots__ = ("topic", "payload", "qos", "retain", "mid")
+
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+
+
+class LocalPublishInfo:
+    """Equivalente mínimo de MQTTMessageInfo."""
+    __slots__ = ("mid", "rc")
+
+    def __init__(self, mid):
+        self.mid = mid
+        self.rc = 0
+
+    def is_published(self):
+        return True
+
+    def wait_for_publish(self, timeout=None):
+        return None
+
+
+class LocalBroker:
+    def __init__(self):
+        self._subs = []   # (filtro, cliente)
+        self._exact = {}  # tópico exacto -> [clientes]
+        self._mid = itertools.count(1)
+        self.published = 0
+        # Si no es None, cada publicación se añade aquí como (tópico, payload)
+        self.log = None
+
+    def client(self, client_id=""):
+        return LocalClient(self, client_id)
+
+    def subscribe(self, client, pattern):
+        if "+" in pattern or "#" in pattern:
+            if (pattern, client) not in self._subs:
+                self._subs.append((pattern, client))
+        else:
+            subs = self._exact.setdefault(pattern, [])
+            if client not in subs:
+                subs.append(client)
+
+    def unsubscribe(self, client, pattern):
+        if (pattern, client) in self._subs:
+            self._subs.remove((pattern, client))
+        subs = self._exact.get(pattern)
+        if subs and client in subs:
+            subs.remove(client)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        mid = next(self._mid)
+        self.published += 1
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        elif payload is None:
+            payload = b""
+        if self.log is not None:
+            self.log.append((topic, payload))
+        targets = list(self._exact.get(topic, ()))
+        for pattern, client in self._subs:
+            if client not in targets and topic_matches(pattern, topic):
+                targets.append(client)
+        for client in targets:
+            client._deliver(LocalMessage(topic, payload, qos, retain, mid))
+        return mid
+
+
+class LocalClient:
+    def __init__(self, broker, client_id=""):
+        self.broker = broker
+        self.client_id = client_id
+        self.userdata = None
+        self.on_connect = None
+        self.on_message = None
+        self.on_publish = None
+        self.connected = False
+
+    def connect(self, host=None, port=None, keepalive=60):
+        self.connected = True
+        if self.on_connect:
+            self.on_connect(self, self.userdata, {}, 0)
+        return 0
+
+    def disconnect(self):
+        self.connected = False
+        return 0
+
+    def loop_start(self):
+        return 0
+
+    def loop_stop(self):
+        return 0
+
+    def subscribe(self, topic, qos=0):
+        self.broker.subscribe(self, topic)
+        return (0, 0)
+
+    def unsubscribe(self, topic):
+        self.broker.unsubscribe(self, topic)
+        return (0, 0)
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        mid = self.broker.publish(topic, payload, qos, retain)
+        if self.on_publish:
+            self.on_publish(self, self.userdata, mid)
+        return LocalPublishInfo(mid)
+
+    def _deliver(self, msg):
+        if self.on_message:
+            self.on_message(self, self.userdata, msg)
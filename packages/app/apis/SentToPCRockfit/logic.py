@@ -1,22 +1,41 @@
 import paho.mqtt.client as mqtt
-import json
+import atexit
 import time
-import logging
-import datetime
-import threading
-import uuid
+import functools
+import itertools
+from array import array
+from collections import deque
+from operator import attrgetter
 
+import animation
 import config
-
-# ======================
-# Estados del circuito
-# ======================
-STATE_WAITING     = "waiting"
-STATE_READY       = "ready"
-STATE_IN_PROGRESS = "in_progress"
-STATE_COMPLETED   = "completed"
-STATE_TIMEOUT     = "timeout"
-STATE_DISABLED    = "disabled"
+import config_loader
+from circuit_registry import registry
+from circuit_spec import (
+    STATE_WAITING, STATE_READY, STATE_IN_PROGRESS, STATE_COMPLETED, STATE_TIMEOUT, STATE_DISABLED,
+    ACTION_START, ACTION_CHANGE_COLOR, ACTION_NEED_DOUBLE, ACTION_RESET, ACTION_ADVANCE,
+)
+from debounce import Debouncer
+import device_mirror
+from device_mirror import mirror
+import engine_snapshot
+from device_registry import device_name
+from engine_loop import EngineLoop
+from led_shadow import shadow, state_to_command
+import liveness
+from results_store import ResultsStore
+from scheduler import Scheduler
+import timebase
+import rockfit_logging
+import metrics
+from outbound import OutboundQueue, PRIORITY_CRITICAL, PRIORITY_COSMETIC
+import ratelimit
+
+# Loggers por categoría (ver rockfit_logging): llamadas siempre con argumentos %-style
+log = rockfit_logging.get_logger("engine")
+event_log = rockfit_logging.get_logger("events")
+rx_log = rockfit_logging.get_logger("mqtt.rx")
+tx_log = rockfit_logging.get_logger("mqtt.tx")
 
 # ======================
 # Ciclo de colores para color_mode = variable
@@ -29,86 +48,249 @@ COLOR_CYCLE = [
 ]
 
 # ======================
-# Parámetro para ignorar eventos repetidos en menos de X segundos (global)
+# Ventana por defecto para ignorar eventos repetidos del MISMO dispositivo (s).
+# Se puede ajustar por dispositivo con "debounce_window" en config.DEVICES.
 # ======================
 DUPLICATE_EVENT_WINDOW = 0.10
 
 # ======================
-# Marca de tiempo global por tipo de evento (para filtrar "golpes fantasmas")
+# Filtro de "golpes fantasma" por dispositivo y tipo de evento
 # ======================
-last_global_ts_for_event_type = {
-    "tap": 0.0,
-    "double_tap": 0.0
-}
+debouncer = Debouncer(DUPLICATE_EVENT_WINDOW)
 
 # ======================
 # Listas globales
 # ======================
-circuits = []
-completed_circuits = []
+circuits = registry.instances   # mismo objeto que el registro (dict ordenado de instancias): no reasignar
+completed_circuits = deque(maxlen=config.COMPLETED_HISTORY_SIZE)  # solo los más recientes; el resto va a results_store
+# Copia inmutable de completed_circuits para la GUI: se rehace en el hilo del motor en cada
+# cambio, así que se puede recorrer desde otro hilo (la deque lanzaría "mutated during iteration")
+completed_snapshot = ()
 mqtt_client = None
 mqtt_client_ready = False
 desired_active_ids = set()
 
+# ======================
+# Duración de las animaciones de fin de circuito y retardo hasta finalize (s)
+# ======================
+END_ANIMATION_TIME = 3.0
+
+# ======================
+# Bucle único del motor: todas las mutaciones de circuitos pasan por aquí.
+# Los callbacks MQTT y la GUI solo encolan (submit).
+# ======================
+ENGINE_QUEUE_SIZE = 1024
+engine = EngineLoop(ENGINE_QUEUE_SIZE)
+
+# ======================
+# Planificador único del motor (finalize, plazos de timeout, fotogramas de animación...).
+# Sus tareas se ejecutan en el hilo del motor.
+# ======================
+scheduler = Scheduler(executor=functools.partial(engine.submit, block=True))
+
+
+def _schedule(delay, fn, *args):
+    # Se resuelve en cada llamada: async_runtime sustituye logic.scheduler al instalarse
+    scheduler.call_later(delay, fn, *args)
+
+
+def _publish_now(client, topic, payload, qos, retain, priority=PRIORITY_CRITICAL):
+    t1 = time.perf_counter_ns()
+    info = client.publish(topic, payload, qos=qos, retain=retain)
+    metrics.PUBLISH_ENQUEUE.observe_ns(time.perf_counter_ns() - t1)
+    mid = getattr(info, "mid", None)
+    if mid is not None:
+        metrics.acks.sent(mid, t1)
+    return mid
+
+
+# ======================
+# Limitador por LED adaptado a la latencia de eco de cada dispositivo (ver ratelimit.py).
+# Compartido con logic_devices; los ecos se los pasa el espejo de estado.
+# ======================
+rate_limiter = ratelimit.limiter
+rate_limiter.configure(
+    min_rate=config.RATE_LIMIT_MIN,
+    max_rate=config.RATE_LIMIT_MAX,
+    burst=config.RATE_LIMIT_BURST,
+    window=config.RATE_LIMIT_WINDOW,
+    headroom=config.RATE_LIMIT_HEADROOM,
+)
+
+# ======================
+# Espejo de lo que muestra cada LED según sus ecos (ver device_mirror.py), alimentado por
+# on_message. Confirma los comandos, ahorra los que el LED ya muestra y mide la latencia
+# que usa el limitador.
+# ======================
+mirror.configure(expect_timeout=config.MIRROR_EXPECT_TIMEOUT)
+if config.RATE_LIMIT_ENABLED:
+    mirror.subscribe(lambda record, previous: rate_limiter.echo(record.topic, record.last_seen), echoes=True)
+
+# ======================
+# Dispositivos vivos (ver liveness.py): on_message le pasa cada mensaje de un dispositivo y
+# los cambios de estado se tratan en el hilo del motor (_on_liveness_change).
+# A un dispositivo sin conexión no se le mandan animaciones (carril cosmético); los comandos
+# del juego y los forzados sí salen, y la sombra guarda lo que debería mostrar.
+# ======================
+liveness.tracker.configure(
+    stale_after=config.LIVENESS_STALE_AFTER,
+    probe_timeout=config.LIVENESS_PROBE_TIMEOUT,
+    wheel_tick=config.LIVENESS_TICK or 1.0,
+)
+liveness.tracker.subscribe(lambda device, old, new: engine.submit(_on_liveness_change, device, old, new))
+
+# ======================
+# Cola de salida de los comandos de LED (ver outbound.py): acotada, último gana por LED,
+# carril prioritario para el juego y, por debajo, el limitador por LED.
+# Un comando descartado invalida la sombra de su LED.
+# ======================
+outbox = OutboundQueue(
+    publish=_publish_now,
+    max_pending=config.OUTBOUND_MAX_PENDING,
+    max_inflight=config.OUTBOUND_MAX_INFLIGHT,
+    ack_timeout=config.OUTBOUND_ACK_TIMEOUT,
+    on_drop=lambda topic: shadow.invalidate([topic]),
+    limiter=rate_limiter if config.RATE_LIMIT_ENABLED else None,
+    schedule=_schedule,
+)
+
+# ======================
+# Animaciones de LEDs (celebraciones, parpadeos de fallo): un único renderer compone todos
+# los clips activos y publica como mucho un comando por LED y fotograma, desde el hilo del motor.
+# ======================
+animator = animation.Renderer(
+    publish=lambda topic, cmd: send_led_command(mqtt_client, topic, cmd, priority=PRIORITY_COSMETIC),
+    fps=config.ANIMATION_FPS,
+    schedule=_schedule,
+    backlog=outbox.backlog,
+    max_backlog=config.ANIMATION_MAX_BACKLOG,
+)
+
+
+def submit(fn, *args):
+    """Encola fn(*args) en el hilo del motor (para la GUI y otros hilos)."""
+    return engine.submit(fn, *args, block=True)
+
+# ======================
+# Índice global tópico -> instancias suscritas (solo circuitos que usan ese dispositivo).
+# Lo mantiene el registro de circuitos junto con los índices por circuito y por estado.
+# ======================
+topic_index = registry.topic_index
+
+
+def send_led_command(client, light_topic, cmd, force=False, who="anim", priority=PRIORITY_CRITICAL):
+    """Encola `cmd` para `light_topic` si cambia el estado conocido del LED (o si force=True)."""
+    if client is None or not shadow.should_send(light_topic, cmd, force):
+        return
+    if (priority == PRIORITY_COSMETIC and not force
+            and liveness.tracker.is_offline(liveness.device_of(light_topic))):
+        # Se reenvía el estado de la sombra cuando el dispositivo vuelva (_on_liveness_change)
+        liveness.tracker.suppressed += 1
+        return
+    state = shadow.get(light_topic)
+    if config.MIRROR_SKIP_CONFIRMED and not force and mirror.shows(light_topic, state):
+        # La sombra no lo sabía (reconexión, descarte...), pero el eco dice que ya se ve así
+        return
+    mirror.expect(light_topic, state)
+    tx_log.debug("[%s] cmd to %s: %s", who, light_topic, cmd)
+    t0 = time.perf_counter_ns()
+    payload = config.get_command_payload(cmd)
+    metrics.COMMAND_BUILD.observe_ns(time.perf_counter_ns() - t0)
+    outbox.put(light_topic, payload, priority, client)
+
+
+# Ids de instancia: enteros crecientes durante la sesión
+_instance_ids = itertools.count(1)
+
+
+def _spec_attr(name):
+    """Atributo de solo lectura que se lee de la especificación compartida."""
+    return property(attrgetter("spec." + name))
+
 
 class CircuitBase:
+    # Solo el estado propio de la instancia; la definición vive en self.spec (compartida)
+    __slots__ = (
+        "client", "spec", "_state", "current_index", "start_time", "timestamps", "splits",
+        "user_color", "instance_id", "assigned_users", "total_time", "deadline_task",
+    )
+
+    config = _spec_attr("source")
+    id = _spec_attr("id")
+    name = _spec_attr("name")
+    description = _spec_attr("description")
+    steps = _spec_attr("steps")
+    sequence = _spec_attr("sequence")
+    sequence_ids = _spec_attr("sequence_ids")
+    step_events = _spec_attr("step_events")
+    control_device = _spec_attr("control_device")
+    color_initial = _spec_attr("color_initial")
+    color_mode = _spec_attr("color_mode")
+    max_time = _spec_attr("max_time")
+    completion_effect = _spec_attr("completion_effect")
+    order_mode = _spec_attr("order_mode")
+    state_reposo = _spec_attr("state_reposo")
+    surpassed_light = _spec_attr("surpassed_light")
+    default_wait_brightness_strict = _spec_attr("default_wait_brightness_strict")
+    default_wait_brightness_flexible = _spec_attr("default_wait_brightness_flexible")
+    topic_map = _spec_attr("topic_map")
+    transitions = _spec_attr("transitions")
+
     def __init__(self, circuit_config, client):
         self.client = client
-        self.config = circuit_config
-        self.id = circuit_config["id"]
-        self.name = circuit_config.get("name", self.id)
-        self.description = circuit_config.get("description", "")
-
-        # Primero definir steps y sequence
-        self.steps = sorted(circuit_config.get("steps", []), key=lambda x: x["order"])
-        self.sequence = [step["device"] for step in self.steps]
-
-        # Luego asignar control_device (por defecto, el device del primer paso)
-        self.control_device = circuit_config.get("control_device", self.steps[0]["device"] if self.steps else None)
-
-        self.color_initial = circuit_config.get("color_initial", {"r": 0, "g": 255, "b": 0})
-        self.color_mode = circuit_config.get("color_mode", "variable")
-        self.max_time = circuit_config.get("max_time", 0)
-        self.completion_effect = circuit_config.get("completion_effect", "celebration")
-        self.order_mode = circuit_config.get("order_mode", "strict")
-        self.state_reposo = circuit_config.get("state_reposo", "only_active")
-        self.surpassed_light = circuit_config.get("surpassed_light", 0)
-        self.default_wait_brightness_strict = circuit_config.get("default_wait_brightness_strict", 50)
-        self.default_wait_brightness_flexible = circuit_config.get("default_wait_brightness_flexible", 60)
+        # Definición compilada y compartida con el resto de instancias del circuito
+        self.spec = config.get_circuit_spec(circuit_config)
 
-        self.state = STATE_WAITING
+        self._state = STATE_WAITING
         self.current_index = 0
-        self.start_time = None
-        self.timestamps = []
-        self.user_color = self.color_initial.copy()
-
-        self.topic_map = {}
-        for device in set(self.sequence):
-            dev_cfg = config.DEVICES_CONFIG.get(device, {})
-            tap_topic = dev_cfg.get("tap_topic")
-            double_tap_topic = dev_cfg.get("double_tap_topic")
-            if tap_topic:
-                self.topic_map[tap_topic] = (device, "tap")
-            if double_tap_topic:
-                self.topic_map[double_tap_topic] = (device, "double_tap")
-
-        self.instance_id = str(uuid.uuid4())[:8]
+        self.start_time = None   # time.monotonic_ns() al arrancar
+        self.timestamps = []     # (evento, dispositivo, monotonic_ns); se formatean con timebase.format_ts
+        # Tiempo parcial de cada paso, preasignado: enteros int64 ("q") en ns desde el inicio,
+        # no segundos en coma flotante (el resultado los pasa a s al completarse)
+        self.splits = array("q", bytes(8 * len(self.spec.sequence)))
+        # El color inicial se comparte con la especificación hasta que el usuario lo cambia
+        self.user_color = self.spec.color_initial
+
+        self.instance_id = next(_instance_ids)
         self.assigned_users = []
         self.total_time = 0
+        self.deadline_task = None
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, new):
+        # Cada cambio de estado actualiza el índice por estado del registro
+        old = self._state
+        self._state = new
+        if old != new:
+            registry.state_changed(self, old, new)
 
     def log_event(self, event, device):
-        ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-        self.timestamps.append((event, device, ts))
-        logging.info(f"[{self.name}] Evento '{event}' en {device} a las {ts}")
+        self.timestamps.append((event, device, timebase.now_ns()))
+        event_log.info("[%s] Evento '%s' en %s", self.name, event, device)
 
-    def publish_command(self, device, cmd):
+    def elapsed(self):
+        """Segundos desde start_circuit (0 si no ha arrancado)."""
+        if self.start_time is None:
+            return 0
+        return timebase.elapsed_s(self.start_time)
+
+    def publish_command(self, device, cmd, force=False):
+        """Publica el comando solo si cambia el estado conocido del LED (o si force=True)."""
         dev_cfg = config.DEVICES_CONFIG.get(device, {})
         light_topic = dev_cfg.get("light_command_topic")
         if light_topic:
-            logging.debug(f"[{self.name}] (debug) cmd to {light_topic}: {cmd}")
-            self.client.publish(light_topic, json.dumps(cmd))
+            send_led_command(self.client, light_topic, cmd, force, self.name)
         else:
-            logging.warning(f"[{self.name}] No se encontró light_command_topic para {device}.")
+            log.warning("[%s] No se encontró light_command_topic para %s.", self.name, device)
+
+    def light_topics(self):
+        """Tópicos de LED de la secuencia, sin repetir y en orden."""
+        topics = (config.DEVICES_CONFIG.get(dev, {}).get("light_command_topic") for dev in self.sequence)
+        return list(dict.fromkeys(t for t in topics if t))
 
     def update_led(self, device, brightness):
         cmd = config.get_led_on_command(color=self.get_current_color(), brightness=brightness)
@@ -139,7 +321,7 @@ class CircuitBase:
                 self.user_color = COLOR_CYCLE[(idx + 1) % len(COLOR_CYCLE)]
             except ValueError:
                 self.user_color = COLOR_CYCLE[0]
-            logging.info(f"[{self.name}] COLOR -> {self.user_color}")
+            log.info("[%s] COLOR -> %s", self.name, self.user_color)
             if self.state == STATE_WAITING:
                 self.update_all_leds()
             elif self.state == STATE_IN_PROGRESS:
@@ -182,51 +364,63 @@ class CircuitBase:
             # Quien está en current_index se enciende fuerte
             if self.state == STATE_IN_PROGRESS and self.current_index < len(self.sequence):
                 dev = self.sequence[self.current_index]
-                evt = self.steps[self.current_index]["event"]
+                evt = self.step_events[self.current_index]
                 if evt == "double_tap":
                     self.update_led_effect(dev, "Fast Pulse")
                 else:
                     self.update_led(dev, config.DEFAULT_BRIGHTNESS)
 
+    def force_resend_leds(self):
+        """Reenvía el estado completo de los LEDs del circuito aunque la sombra diga que no cambió."""
+        topics = [config.DEVICES_CONFIG.get(d, {}).get("light_command_topic") for d in set(self.sequence)]
+        shadow.invalidate([t for t in topics if t])
+        self.update_all_leds()
+
+    def record_split(self, index):
+        """Guarda el tiempo parcial del paso `index` en el array preasignado."""
+        if self.start_time is not None:
+            self.splits[index] = timebase.now_ns() - self.start_time
+
     def reset_and_activate_ready(self):
         """Devuelve el circuito a waiting, reiluminándolo como tal."""
+        scheduler.cancel_owner(self)
+        animator.stop_owner(self)
         self.state = STATE_WAITING
         self.current_index = 0
         self.timestamps.clear()
+        self.splits = array("q", bytes(8 * len(self.sequence)))
         self.start_time = None
         for d in self.sequence:
             self.turn_off_led(d)
         self.user_color = self.color_initial.copy()
         if self.steps:
-            next_evt = self.steps[0]["event"]
+            next_evt = self.step_events[0]
         else:
             next_evt = "tap"
         self.update_led_effect(self.control_device, "Fast Pulse")
-        logging.info(f"[{self.name}] RESET -> OFF en {len(self.sequence)} disp, "
-                     f"FastPulse en '{self.control_device}', color {self.get_current_color()}, "
-                     f"esperando '{next_evt}'")
+        log.info("[%s] RESET -> OFF en %d disp, FastPulse en '%s', color %s, esperando '%s'",
+                 self.name, len(self.sequence), self.control_device, self.get_current_color(), next_evt)
 
     def start_circuit(self):
         """Pasa a in_progress, enciende leds y avanza current_index a 1 (primer step consumido)."""
         self.turn_off_led(self.control_device)
-        self.start_time = time.time()
+        self.start_time = timebase.now_ns()
         self.state = STATE_IN_PROGRESS
         self.current_index = 1
+        self.arm_deadline()
         self.update_all_leds()
 
-        ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
         nxt_dev = self.sequence[self.current_index] if self.current_index < len(self.sequence) else None
-        nxt_evt = self.steps[self.current_index]["event"] if self.current_index < len(self.steps) else None
-        logging.info(
-            f"[{self.name}] START @ {ts} -> ctrl '{self.control_device}' OFF, "
-            f"paso {self.current_index}/{len(self.sequence)} con '{nxt_dev}' ({nxt_evt}), t=0s"
-        )
+        nxt_evt = self.step_events[self.current_index] if self.current_index < len(self.steps) else None
+        log.info("[%s] START -> ctrl '%s' OFF, paso %d/%d con '%s' (%s), t=0s",
+                 self.name, self.control_device, self.current_index, len(self.sequence), nxt_dev, nxt_evt)
 
     def advance_step(self):
         """Llamado cuando se detecta el evento correcto en el step actual."""
         dev_act = self.sequence[self.current_index]
         old_index = self.current_index
         self.log_event("advance", dev_act)
+        self.record_split(old_index)
 
         self.current_index += 1
         self.update_all_leds()
@@ -235,12 +429,10 @@ class CircuitBase:
             self.complete_circuit()
         else:
             nxt_dev = self.sequence[self.current_index]
-            nxt_evt = self.steps[self.current_index]["event"]
-            elapsed = time.time() - self.start_time if self.start_time else 0
-            logging.info(
-                f"[{self.name}] STEP -> {old_index}->{self.current_index}/{len(self.sequence)} "
-                f"({dev_act} ok). Próximo: '{nxt_dev}' ({nxt_evt}). Tiempo: {elapsed:.2f}s"
-            )
+            nxt_evt = self.step_events[self.current_index]
+            log.info("[%s] STEP -> %d->%d/%d (%s ok). Próximo: '%s' (%s). Tiempo: %.2fs",
+                     self.name, old_index, self.current_index, len(self.sequence), dev_act, nxt_dev, nxt_evt,
+                     self.elapsed())
 
     def skip_step(self):
         """
@@ -256,11 +448,13 @@ class CircuitBase:
             return
 
         if self.state not in [STATE_WAITING, STATE_IN_PROGRESS] or self.current_index >= len(self.sequence):
-            logging.info(f"[{self.name}] skip_step llamado en un estado no válido (state={self.state}, current_index={self.current_index}).")
+            log.info("[%s] skip_step llamado en un estado no válido (state=%s, current_index=%d).",
+                     self.name, self.state, self.current_index)
             return
 
         dev_act = self.sequence[self.current_index]
         self.log_event("skip_step", dev_act)
+        self.record_split(self.current_index)
         self.current_index += 1
         self.update_all_leds()
 
@@ -268,173 +462,153 @@ class CircuitBase:
             self.complete_circuit()
         else:
             nxt_dev = self.sequence[self.current_index]
-            nxt_evt = self.steps[self.current_index]["event"]
-            elapsed = time.time() - self.start_time if self.start_time else 0
-            logging.info(
-                f"[{self.name}] STEP (skip) -> {self.current_index}/{len(self.sequence)} "
-                f"(saltado: {dev_act}). Próximo: '{nxt_dev}' ({nxt_evt}). Tiempo: {elapsed:.2f}s"
-            )
+            nxt_evt = self.step_events[self.current_index]
+            log.info("[%s] STEP (skip) -> %d/%d (saltado: %s). Próximo: '%s' (%s). Tiempo: %.2fs",
+                     self.name, self.current_index, len(self.sequence), dev_act, nxt_dev, nxt_evt, self.elapsed())
 
     def complete_circuit(self):
         """Marca el circuito como completado y lanza la celebración si corresponde."""
+        self.disarm_deadline()
         self.state = STATE_COMPLETED
-        elapsed = time.time() - self.start_time if self.start_time else 0
+        end_ns = timebase.now_ns()
+        elapsed = timebase.elapsed_s(self.start_time, end_ns) if self.start_time is not None else 0
         self.total_time = elapsed
 
-        ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
         snapshot = {
             "instance_id": self.instance_id,
+            "circuit_id": self.id,
             "name": self.name,
             "assigned_users": self.assigned_users[:],
             "total_time": elapsed,
+            "finished_at": timebase.to_wall(end_ns),
             "timestamps": self.timestamps[:],
-            "steps": self.steps,
+            "splits": [ns / 1e9 for ns in self.splits[:self.current_index]],
             "final_color": self.get_current_color()
         }
-        completed_circuits.append(snapshot)
+        record_result(snapshot)
 
-        logging.info(f"[{self.name}] DONE @ {ts} -> {elapsed:.2f}s. Ejecutando celebración.")
+        log.info("[%s] DONE -> %.2fs. Ejecutando celebración.", self.name, elapsed)
 
         def finalize():
             self.remove_from_circuits()
             create_new_instance_if_still_active(self.id)
 
         if self.completion_effect == "celebration":
-            threading.Thread(target=self.run_celebration, daemon=True).start()
-            threading.Timer(3.0, finalize).start()
+            self.run_celebration()
+            scheduler.call_later(END_ANIMATION_TIME, finalize, owner=self)
         else:
             finalize()
 
     def remove_from_circuits(self):
-        global circuits
+        animator.stop_owner(self)
         try:
-            circuits.remove(self)
-            logging.info(f"[{self.name}] Eliminado de circuits tras completarse.")
+            unregister_circuit(self)
+            log.info("[%s] Eliminado de circuits tras completarse.", self.name)
         except ValueError:
-            logging.warning(f"[{self.name}] No se encontró en circuits al intentar eliminarlo.")
+            log.warning("[%s] No se encontró en circuits al intentar eliminarlo.", self.name)
+
+    def arm_deadline(self, delay=None):
+        """Programa el TIMEOUT en start_time + max_time (el montículo del planificador es el índice de plazos)."""
+        self.disarm_deadline()
+        if self.max_time > 0:
+            if delay is None:
+                delay = self.max_time
+            self.deadline_task = scheduler.call_later(delay, self.timeout_check, owner=self)
+
+    def disarm_deadline(self):
+        if self.deadline_task is not None:
+            scheduler.cancel(self.deadline_task)
+            self.deadline_task = None
 
     def timeout_check(self):
-        """Si max_time>0, verifica si excedió el tiempo."""
-        if self.max_time > 0 and self.start_time:
-            elapsed = time.time() - self.start_time
-            if elapsed >= self.max_time:
+        """Llamado al vencer el plazo: si max_time>0 y sigue in_progress, pasa a TIMEOUT."""
+        self.deadline_task = None
+        if self.state != STATE_IN_PROGRESS:
+            return
+        if self.max_time > 0 and self.start_time is not None:
+            elapsed = self.elapsed()
+            if elapsed < self.max_time:
+                # Si el planificador despierta un poco antes, reprogramar lo que falta
+                self.arm_deadline(self.max_time - elapsed)
+            else:
                 self.state = STATE_TIMEOUT
-                logging.info(f"[{self.name}] TIMEOUT tras {elapsed:.2f} s.")
+                log.info("[%s] TIMEOUT tras %.2f s.", self.name, elapsed)
 
                 def finalize_timeout():
                     self.remove_from_circuits()
                     create_new_instance_if_still_active(self.id)
 
-                threading.Thread(target=self.run_failure, daemon=True).start()
-                threading.Timer(3.0, finalize_timeout).start()
+                self.run_failure()
+                scheduler.call_later(END_ANIMATION_TIME, finalize_timeout, owner=self)
 
     def handle_event(self, client_topic, msg_payload):
-        """Recibe un evento ya filtrado por topic_map."""
-        if client_topic not in self.topic_map:
+        """Recibe un evento ya filtrado por topic_map y aplica la tabla de transiciones."""
+        ev = self.topic_map.get(client_topic)
+        if ev is None:
             return False
 
-        device, event_type = self.topic_map[client_topic]
+        dev_id, event_type = ev
+        device = device_name(dev_id)
         self.log_event(event_type, device)
 
-        if self.state in [STATE_COMPLETED, STATE_TIMEOUT, STATE_DISABLED]:
-            return False
-
-        if device == self.control_device:
-            if self.state in [STATE_WAITING, STATE_READY]:
-                if not self.steps:
-                    return False
-                exp_evt = self.steps[0]["event"]
-                if exp_evt == "double_tap":
-                    if event_type == "tap":
-                        if self.color_mode == "variable":
-                            self.change_color()
-                        else:
-                            logging.info(f"[{self.name}] Tap en ctrl ignorado; se requiere double_tap.")
-                        return True
-                    elif event_type == "double_tap":
-                        self.start_circuit()
-                        return True
-                else:
-                    if event_type == "tap":
-                        self.start_circuit()
-                        return True
-                    elif event_type == "double_tap":
-                        self.reset_and_activate_ready()
-                        return True
-            elif self.state == STATE_IN_PROGRESS:
-                if self.current_index < len(self.sequence) and self.sequence[self.current_index] == self.control_device:
-                    exp_evt = self.steps[self.current_index]["event"]
-                    if event_type == exp_evt:
-                        self.advance_step()
-                        return True
-                    else:
-                        logging.info(f"[{self.name}] Evento incorrecto en ctrl; se esperaba {exp_evt}.")
-                        return False
+        action = self.spec.transitions.get((self.state, self.current_index, dev_id, event_type))
+        if action is None:
             return False
+        if action == ACTION_ADVANCE:
+            self.advance_step()
+        elif action == ACTION_START:
+            self.start_circuit()
+        elif action == ACTION_CHANGE_COLOR:
+            self.change_color()
+        elif action == ACTION_RESET:
+            self.reset_and_activate_ready()
+        elif action == ACTION_NEED_DOUBLE:
+            event_log.info("[%s] Tap en ctrl ignorado; se requiere double_tap.", self.name)
         else:
-            if self.state == STATE_IN_PROGRESS and self.current_index < len(self.sequence):
-                if device == self.sequence[self.current_index]:
-                    exp_evt = self.steps[self.current_index]["event"]
-                    if event_type == exp_evt:
-                        self.advance_step()
-                        return True
-                    else:
-                        logging.info(f"[{self.name}] Evento incorrecto en {device}: se esperaba {exp_evt}.")
-                        return False
+            event_log.info("[%s] Evento incorrecto en %s: se esperaba %s.", self.name, device, self.step_events[self.current_index])
             return False
+        return True
 
     def run_celebration(self):
-        start_time = time.time()
-        while time.time() - start_time < 3.0:
-            for color in config.CELEBRATION_COLORS:
-                cmd = {
-                    "state": "ON",
-                    "brightness": config.DEFAULT_BRIGHTNESS,
-                    "color": color,
-                    "effect": "none"
-                }
-                for dev in self.sequence:
-                    self.publish_command(dev, cmd)
-                time.sleep(config.CELEBRATION_INTERVAL)
-                if time.time() - start_time >= 3.0:
-                    break
+        """Reproduce la celebración (ciclo de CELEBRATION_COLORS) en el renderer de animaciones."""
+        cmds = [{"state": "ON", "brightness": config.DEFAULT_BRIGHTNESS, "color": color, "effect": "none"}
+                for color in config.CELEBRATION_COLORS]
+        clip = animation.cycle(self.light_topics(), cmds, config.CELEBRATION_INTERVAL, END_ANIMATION_TIME,
+                               name="celebration")
+        animator.play(clip, owner=self)
 
     def run_failure(self):
-        start_time = time.time()
-        while time.time() - start_time < 3.0:
-            cmd_on = {
-                "state": "ON",
-                "brightness": config.DEFAULT_BRIGHTNESS,
-                "color": config.COLOR_RED,
-                "effect": "none"
-            }
-            for dev in self.sequence:
-                self.publish_command(dev, cmd_on)
-            time.sleep(0.5)
-            cmd_off = config.get_led_off_command()
-            for dev in self.sequence:
-                self.publish_command(dev, cmd_off)
-            time.sleep(0.5)
+        """Reproduce el parpadeo rojo de fallo (0.5 s ON / 0.5 s OFF) en el renderer de animaciones."""
+        red = {"state": "ON", "brightness": config.DEFAULT_BRIGHTNESS, "color": config.COLOR_RED, "effect": "none"}
+        clip = animation.blink(self.light_topics(), red, config.get_led_off_command(), 0.5,
+                               int(END_ANIMATION_TIME), name="failure")
+        animator.play(clip, owner=self)
 
     def deactivate(self):
         """Desactiva manualmente este circuito (apaga LEDs, marca state=DISABLED)."""
+        scheduler.cancel_owner(self)
+        animator.stop_owner(self)
         self.state = STATE_DISABLED
         for dev in self.sequence:
             self.turn_off_led(dev)
-        logging.info(f"[{self.name}] Desactivado manualmente (state=DISABLED).")
+        log.info("[%s] Desactivado manualmente (state=DISABLED).", self.name)
 
     def restart(self):
         """Reinicia manualmente el circuito, volviendo a waiting."""
         self.reset_and_activate_ready()
-        logging.info(f"[{self.name}] Reiniciado manualmente (state=WAITING).")
+        log.info("[%s] Reiniciado manualmente (state=WAITING).", self.name)
 
 
 class StrictCircuit(CircuitBase):
+    __slots__ = ()
+
     def _get_default_wait_brightness(self):
         return int(self.default_wait_brightness_strict / 100 * config.DEFAULT_BRIGHTNESS)
 
 
 class FlexibleCircuit(CircuitBase):
+    __slots__ = ()
+
     def _get_default_wait_brightness(self):
         return int(self.default_wait_brightness_flexible / 100 * config.DEFAULT_BRIGHTNESS)
 
@@ -445,16 +619,247 @@ class FlexibleCircuit(CircuitBase):
 
 
 class CompetitionCircuit(CircuitBase):
+    __slots__ = ()
+
     def _get_default_wait_brightness(self):
         return int(self.default_wait_brightness_strict / 100 * config.DEFAULT_BRIGHTNESS)
 
     def start_circuit(self):
-        logging.info(f"[{self.name}] Modo competition no implementado aún.")
+        log.info("[%s] Modo competition no implementado aún.", self.name)
         raise NotImplementedError("La lógica para Competition aún no está desarrollada.")
 
 
+# ======================
+# Instantánea del motor y arranque en caliente (ver engine_snapshot.py)
+# ======================
+_snapshot_task = None
+_booted = False   # main() ya se llamó una vez (las siguientes solo reconfiguran)
+
+
+def _events_to_wall(timestamps):
+    return [(event, device, timebase.to_wall_ns(ts)) for event, device, ts in timestamps]
+
+
+def _events_from_wall(timestamps):
+    return [(event, device, timebase.from_wall_ns(ts)) for event, device, ts in timestamps]
+
+
+def snapshot_state():
+    """Estado reanudable del motor como dict serializable (en el hilo del motor)."""
+    instances = []
+    for c in circuits:
+        if c.state not in (STATE_WAITING, STATE_IN_PROGRESS):
+            continue
+        instances.append({
+            "instance_id": c.instance_id,
+            "circuit_id": c.id,
+            "state": c.state,
+            "current_index": c.current_index,
+            "start_time": timebase.to_wall_ns(c.start_time) if c.start_time is not None else None,
+            "splits": c.splits.tolist(),
+            "user_color": c.user_color,
+            "assigned_users": c.assigned_users,
+            "timestamps": _events_to_wall(c.timestamps),
+        })
+    return {
+        "active": sorted(desired_active_ids),
+        "instances": instances,
+        "leds": shadow.dump(),
+        "results": [dict(r, timestamps=_events_to_wall(r["timestamps"])) for r in completed_circuits],
+    }
+
+
+def save_snapshot():
+    try:
+        engine_snapshot.save(snapshot_state(), config.SNAPSHOT_PATH)
+    except OSError as e:
+        log.warning("No se pudo guardar la instantánea del motor: %s", e)
+
+
+def _snapshot_tick():
+    global _snapshot_task
+    save_snapshot()
+    _snapshot_task = scheduler.call_later(config.SNAPSHOT_INTERVAL, _snapshot_tick)
+
+
+def start_snapshots():
+    """Arranca las instantáneas periódicas (una sola vez; SNAPSHOT_INTERVAL=0 las desactiva)."""
+    global _snapshot_task
+    if _snapshot_task is None and config.SNAPSHOT_INTERVAL:
+        _snapshot_task = scheduler.call_later(config.SNAPSHOT_INTERVAL, _snapshot_tick)
+
+
+def load_snapshot():
+    """Última instantánea válida y reciente, o None (se lee fuera del hilo del motor)."""
+    return engine_snapshot.load(config.SNAPSHOT_PATH, config.SNAPSHOT_MAX_AGE)
+
+
+def restore_state(snap, active_circuits_param=None):
+    """
+    Reanuda la sesión guardada en `snap` (en el hilo del motor): recrea las instancias con su
+    paso, inicio, parciales, color y usuarios, recupera la sombra de LEDs y los resultados
+    recientes, y solo reenvía los LEDs cuyo estado deseado difiere del que tenían.
+    Los circuitos deseados sin instancia guardada se crean de cero como en apply_active_circuits.
+    """
+    global _instance_ids
+    t0 = time.perf_counter()
+    active = list(snap.get("active", [])) if active_circuits_param is None else list(active_circuits_param)
+
+    shadow.load(snap.get("leds", {}))
+    for r in snap.get("results", []):
+        r["timestamps"] = _events_from_wall(r["timestamps"])
+        completed_circuits.append(r)
+    _refresh_completed_snapshot()
+
+    restored = 0
+    last_id = 0
+    for saved in snap.get("instances", []):
+        last_id = max(last_id, saved["instance_id"])
+        conf = registry.get(saved["circuit_id"])
+        if conf is None or saved["circuit_id"] not in active:
+            continue
+        inst = make_circuit(conf)
+        if len(saved["splits"]) != len(inst.sequence) or saved["current_index"] > len(inst.sequence):
+            log.warning("[%s] La definición cambió desde la instantánea; se arranca de cero.", inst.name)
+            continue
+        inst.instance_id = saved["instance_id"]
+        inst.state = saved["state"]
+        inst.current_index = saved["current_index"]
+        if saved["start_time"] is not None:
+            inst.start_time = timebase.from_wall_ns(saved["start_time"])
+        inst.splits = array("q", saved["splits"])
+        inst.user_color = saved["user_color"]
+        inst.assigned_users = list(saved["assigned_users"])
+        inst.timestamps = _events_from_wall(saved["timestamps"])
+        register_circuit(inst)
+        if inst.state == STATE_IN_PROGRESS:
+            # El plazo sigue corriendo durante el reinicio: si ya venció, timeout_check lo cierra
+            inst.arm_deadline(max(0.0, inst.max_time - inst.elapsed()))
+        restored += 1
+
+    last_id = max([last_id] + [r["instance_id"] for r in completed_circuits])
+    _instance_ids = itertools.count(last_id + 1)
+
+    # Los comandos se retienen para enviar solo el estado final de cada LED que cambió
+    shadow.hold()
+    try:
+        apply_active_circuits(active, reset_colors=False)
+    finally:
+        changed = shadow.release()
+    for topic, state in changed.items():
+        mirror.expect(topic, state)
+        outbox.put(topic, config.get_command_payload(state_to_command(state)), PRIORITY_CRITICAL, mqtt_client)
+    shadow.sent += len(changed)
+    log.info("Arranque en caliente: %d instancias y %d resultados restaurados en %.1f ms; %d comandos LED reenviados.",
+             restored, len(snap.get("results", [])), (time.perf_counter() - t0) * 1000, len(changed))
+
+
+@atexit.register
+def save_snapshot_at_exit():
+    if _snapshot_task is None:
+        return
+    try:
+        save_snapshot()
+    except RuntimeError as e:   # el motor seguía modificando circuits: vale la última periódica
+        log.warning("Instantánea final descartada: %s", e)
+
+
+# ======================
+# Historial de resultados: cada resultado va al almacén SQLite al completarse (por lotes y,
+# como mucho, RESULTS_FLUSH_INTERVAL s después); la deque solo es la caché de la GUI
+# ======================
+results_store = None
+_results_task = None
+
+
+def get_results_store():
+    global results_store
+    if results_store is None:
+        results_store = ResultsStore(config.RESULTS_DB_PATH, config.RESULTS_BATCH_SIZE)
+    return results_store
+
+
+def record_result(result):
+    """Guarda un resultado en el almacén y lo añade al historial reciente de la GUI."""
+    get_results_store().add(export_result(result))
+    completed_circuits.append(result)
+    _refresh_completed_snapshot()
+
+
+def assign_result_users(result, users):
+    """Cambia los usuarios de un resultado ya completado, en memoria y en el almacén (hilo del motor)."""
+    result["assigned_users"] = list(users)
+    if not get_results_store().set_users(result["instance_id"], result["assigned_users"]):
+        log.warning("Resultado %s no encontrado en el almacén al asignar usuarios.", result["instance_id"])
+
+
+def _refresh_completed_snapshot():
+    global completed_snapshot
+    completed_snapshot = tuple(completed_circuits)
+
+
+def export_result(result):
+    """Copia del resultado con los instantes de sus eventos ya formateados (almacén, API)."""
+    return dict(result, timestamps=timebase.format_events(result["timestamps"]))
+
+
+def query_results(circuit_id=None, user=None, day=None, limit=100):
+    """Resultados guardados (incluidos los del lote pendiente), más recientes primero."""
+    return get_results_store().query(circuit_id, user, day, limit)
+
+
+@atexit.register
+def flush_results():
+    """Escribe el lote pendiente del almacén (al salir y periódicamente)."""
+    if results_store is not None:
+        results_store.flush()
+
+
+def _results_flush_tick():
+    global _results_task
+    flush_results()
+    _results_task = scheduler.call_later(config.RESULTS_FLUSH_INTERVAL, _results_flush_tick)
+
+
+def start_results_flush():
+    """Arranca el volcado periódico del almacén (una sola vez; RESULTS_FLUSH_INTERVAL=0 lo desactiva)."""
+    global _results_task
+    if _results_task is None and config.RESULTS_FLUSH_INTERVAL:
+        _results_task = scheduler.call_later(config.RESULTS_FLUSH_INTERVAL, _results_flush_tick)
+
+
+def register_circuit(inst):
+    """Da de alta la instancia en el registro (circuits, índices por circuito, estado y tópico)."""
+    registry.add_instance(inst)
+
+
+def unregister_circuit(inst):
+    """Da de baja la instancia del registro. Lanza ValueError si no estaba."""
+    registry.remove_instance(inst)
+
+
+def rebuild_topic_index():
+    """Reconstruye topic_index desde cero a partir de circuits."""
+    registry.reindex_topics()
+
+
+def dispatch_event(topic, payload):
+    """Entrega el evento solo a los circuitos suscritos a ese tópico."""
+    subs = topic_index.get(topic)
+    if not subs:
+        return
+    # Copia: handle_event puede terminar eliminando la instancia del índice
+    for c in tuple(subs):
+        t0 = time.perf_counter_ns()
+        c.handle_event(topic, payload)
+        metrics.HANDLER.observe_ns(time.perf_counter_ns() - t0)
+
+
 def on_connect(client, userdata, flags, rc):
-    logging.info(f"Conectado al broker {config.MQTT_BROKER}:{config.MQTT_PORT} con código {rc}")
+    log.info("Conectado al broker %s:%s con código %s", config.MQTT_BROKER, config.MQTT_PORT, rc)
+    # Tras (re)conectar no sabemos qué muestran los dispositivos: el próximo comando se envía siempre
+    shadow.invalidate()
+    outbox.reset_inflight()
     topics = set()
     for dev in config.DEVICES_CONFIG.values():
         for key in ["tap_topic", "double_tap_topic"]:
@@ -463,122 +868,340 @@ def on_connect(client, userdata, flags, rc):
                 topics.add(t)
     for t in topics:
         client.subscribe(t)
-    logging.info(f"Suscrito a {len(topics)} tópicos: {', '.join(sorted(topics))}")
+    log.info("Suscrito a %d tópicos: %s", len(topics), ", ".join(sorted(topics)))
+    mirror.subscribe_mqtt(client)
+    liveness.tracker.subscribe_mqtt(client)
 
 
 def on_message(client, userdata, msg):
-    payload = msg.payload.decode("utf-8", errors="replace")
-    logging.info(f"Mensaje recibido: {msg.topic} - {payload}")
-
-    event_type = None
-    if "/tap" in msg.topic:
-        event_type = "tap"
-    elif "/double_tap" in msg.topic:
-        event_type = "double_tap"
-
-    if event_type in ("tap", "double_tap"):
-        now_ts = time.time()
-        global last_global_ts_for_event_type
-        last_ts = last_global_ts_for_event_type[event_type]
-        if (now_ts - last_ts) < DUPLICATE_EVENT_WINDOW:
-            ignored_time = datetime.datetime.fromtimestamp(now_ts).strftime("%H:%M:%S.%f")[:-3]
-            logging.info(f"Ignorando globalmente '{event_type}' repetido en menos de {DUPLICATE_EVENT_WINDOW}s. (Timestamp: {ignored_time})")
+    # Hilo de red de paho: solo se encola, sin tocar el estado del motor
+    t0 = time.perf_counter_ns()
+    liveness.tracker.seen_topic(msg.topic, msg.payload)
+    if liveness.is_status(msg.topic):
+        return
+    if device_mirror.is_light_state(msg.topic):
+        # Eco de estado de un LED: solo actualiza el espejo (seguro entre hilos), no pasa por el motor
+        mirror.handle(msg.topic, msg.payload)
+        return
+    engine.submit(handle_message, msg.topic, msg.payload, time.monotonic(), t0)
+    metrics.CALLBACK.observe_ns(time.perf_counter_ns() - t0)
+
+
+def on_publish(client, userdata, mid, *args):
+    # paho 1.x: (client, userdata, mid); paho 2.x VERSION2 añade reason_code y properties
+    metrics.acks.acked(mid, time.perf_counter_ns())
+    outbox.acked(mid)
+
+
+def handle_message(topic, raw_payload, received_at, enqueued_ns=None):
+    """Procesa un mensaje MQTT en el hilo del motor (enqueued_ns: perf_counter_ns de on_message)."""
+    if enqueued_ns is not None:
+        metrics.QUEUE_WAIT.observe_ns(time.perf_counter_ns() - enqueued_ns)
+    payload = raw_payload.decode("utf-8", errors="replace")
+    rx_log.info("Mensaje recibido: %s - %s", topic, payload)
+
+    event = config.EVENT_TOPICS.get(topic)
+    if event is not None:
+        device, event_type = event
+        window = config.DEVICES_CONFIG[device].get("debounce_window")
+        if not debouncer.accept(device, event_type, received_at, window):
+            rx_log.info("Ignorando '%s' repetido en %s (ventana %ss).", event_type, device, window or DUPLICATE_EVENT_WINDOW)
             return
-        last_global_ts_for_event_type[event_type] = now_ts
 
-    for c in circuits:
-        c.handle_event(msg.topic, payload)
-    for c in circuits:
-        if c.state == STATE_IN_PROGRESS:
-            c.timeout_check()
+    t0 = time.perf_counter_ns()
+    dispatch_event(topic, payload)
+    metrics.DISPATCH.observe_ns(time.perf_counter_ns() - t0)
 
 
-def init_mqtt_client():
+def init_mqtt_client(client=None, start_loop=True):
+    """
+    Crea y conecta el cliente MQTT del motor.
+    `client` permite inyectar otro cliente compatible (p. ej. local_broker.LocalClient);
+    con start_loop=False no se arranca el hilo de red de paho (modo asyncio).
+    """
     global mqtt_client, mqtt_client_ready
     if mqtt_client is None:
-        mqtt_client = mqtt.Client()
+        mqtt_client = client if client is not None else mqtt.Client()
         mqtt_client.on_connect = on_connect
         mqtt_client.on_message = on_message
+        mqtt_client.on_publish = on_publish
         mqtt_client.connect(config.MQTT_BROKER, config.MQTT_PORT, 60)
-        mqtt_client.loop_start()
+        if start_loop:
+            mqtt_client.loop_start()
         mqtt_client_ready = True
     else:
-        logging.info("Cliente MQTT ya existente; no se crea uno nuevo.")
+        log.info("Cliente MQTT ya existente; no se crea uno nuevo.")
+
+
+def make_circuit(conf):
+    """Nueva instancia WAITING de la clase que corresponde a su order_mode."""
+    order_mode = conf.get("order_mode", "strict")
+    if order_mode == "flexible":
+        return FlexibleCircuit(conf, mqtt_client)
+    if order_mode == "competition":
+        return CompetitionCircuit(conf, mqtt_client)
+    return StrictCircuit(conf, mqtt_client)
 
 
 def create_new_instance_if_still_active(circuit_id):
     """Si un circuito finaliza pero ese ID sigue siendo deseado, se crea una nueva instancia en WAITING."""
-    if circuit_id not in desired_active_ids:
+    if circuit_id not in desired_active_ids or registry.live_instance(circuit_id) is not None:
         return
-    for inst in circuits:
-        if inst.id == circuit_id and inst.state in [STATE_WAITING, STATE_IN_PROGRESS]:
-            return
-    from config import CIRCUITS
-    conf = next((c for c in CIRCUITS if c["id"] == circuit_id), None)
+    conf = registry.get(circuit_id)
     if not conf:
         return
-    order_mode = conf.get("order_mode", "strict")
-    if order_mode == "strict":
-        inst = StrictCircuit(conf, mqtt_client)
-    elif order_mode == "flexible":
-        inst = FlexibleCircuit(conf, mqtt_client)
-    elif order_mode == "competition":
-        inst = CompetitionCircuit(conf, mqtt_client)
-    else:
-        inst = StrictCircuit(conf, mqtt_client)
-    circuits.append(inst)
-    logging.info(f"[{inst.name}] Se crea nueva instancia WAITING (ID={inst.instance_id}) por reactivación inmediata tras completarse.")
+    inst = make_circuit(conf)
+    register_circuit(inst)
+    log.info("[%s] Se crea nueva instancia WAITING (ID=%s) por reactivación inmediata tras completarse.", inst.name, inst.instance_id)
     inst.user_color = inst.color_initial.copy()
     inst.update_all_leds()
 
 
-def main(active_circuits_param=None):
-    global circuits, desired_active_ids
-    init_mqtt_client()
+def restart_circuits():
+    """Reinicia todos los circuitos que no estén en waiting/disabled."""
+    for circuit in list(circuits):
+        if circuit.state not in [STATE_WAITING, STATE_DISABLED]:
+            circuit.restart()
+
+
+def deactivate_circuits():
+    """Desactiva todos los circuitos que no estén ya desactivados."""
+    for circuit in list(circuits):
+        if circuit.state != STATE_DISABLED:
+            circuit.deactivate()
+
+
+def main(active_circuits_param=None, client=None, restore=None):
+    """
+    Arranca el motor (o lo reconfigura si ya estaba en marcha). En el primer arranque del proceso,
+    con restore (por defecto config.SNAPSHOT_RESTORE) se reanuda la sesión desde la última
+    instantánea si la hay; si no, se parte de cero con active_circuits_param.
+    """
+    global _booted
+    if restore is None:
+        restore = config.SNAPSHOT_RESTORE
+    snap = load_snapshot() if restore and not _booted else None
+    _booted = True
+    init_mqtt_client(client)
+    engine.start()
+    # Primero la configuración del fichero externo, para que el arranque ya la use
+    start_config_watch()
+    if snap is not None:
+        submit(restore_state, snap, active_circuits_param)
+    else:
+        submit(apply_active_circuits, list(active_circuits_param or []))
+    start_metrics_export()
+    start_snapshots()
+    start_liveness()
+    start_results_flush()
+
+
+# ======================
+# Recarga en caliente de config.CIRCUITS / DEVICES (ver config_loader.py)
+# ======================
+config_watcher = None
+
+
+def apply_config_diff(diff):
+    """
+    Aplica al motor una recarga de configuración (en el hilo del motor): (des)suscripciones
+    de tópicos y sustitución de las instancias de circuitos quitados o cambiados.
+    Las instancias de los demás circuitos no se tocan.
+    """
+    if mqtt_client is not None:
+        for topic in sorted(diff.unsubscribe):
+            mqtt_client.unsubscribe(topic)
+        for topic in sorted(diff.subscribe):
+            mqtt_client.subscribe(topic)
+    shadow.invalidate(diff.stale_light_topics)
+    liveness.tracker.watch(config.DEVICES_CONFIG)
+
+    replaced = set(diff.circuits_removed) | set(diff.circuits_changed)
+    for inst in [c for c in circuits if c.id in replaced]:
+        if inst.state == STATE_IN_PROGRESS:
+            log.warning("[%s] Circuito cambiado en la configuración: se descarta la ejecución en curso.", inst.name)
+        inst.deactivate()
+        unregister_circuit(inst)
+    desired_active_ids.difference_update(diff.circuits_removed)
+
+    for cid in diff.circuits_changed + diff.circuits_added:
+        create_new_instance_if_still_active(cid)
+
+
+def _config_tick(settle=True):
+    try:
+        diff = config_watcher.poll(settle)
+    except config_loader.ConfigError as e:
+        log.error("Configuración no aplicada: %s", e)
+    else:
+        if diff is not None and not diff.empty():
+            apply_config_diff(diff)
+            log.info("Configuración recargada desde %s: %s", config_watcher.path, diff)
+    scheduler.call_later(config.CONFIG_WATCH_INTERVAL, _config_tick)
+
+
+def start_config_watch():
+    """
+    Aplica config.CONFIG_FILE si existe y lo vigila cada CONFIG_WATCH_INTERVAL s
+    (una sola vez; CONFIG_WATCH_INTERVAL=0 desactiva la recarga).
+    """
+    global config_watcher
+    if config_watcher is not None or not config.CONFIG_WATCH_INTERVAL:
+        return
+    config_watcher = config_loader.ConfigWatcher(config.CONFIG_FILE)
+    submit(_config_tick, False)
+
+
+# ======================
+# Dispositivos vivos (ver liveness.py)
+# ======================
+_liveness_task = None
+
+
+def _resend_led(device, who, probe=False):
+    """
+    Reenvía a `device` el estado que debe mostrar según la sombra o, si la sombra lo ha
+    olvidado (reconexión), según su último eco. Con probe=True el envío es una pregunta de
+    liveness (se anota antes de publicar: el eco puede llegar antes de que vuelva).
+    Devuelve False si no se sabe ningún estado y no se ha enviado nada.
+    """
+    topic = config.DEVICES_CONFIG.get(device, {}).get("light_command_topic")
+    if not topic or mqtt_client is None:
+        return False
+    state = shadow.get(topic) or mirror.state(topic)
+    if state is None:
+        return False
+    if probe:
+        liveness.tracker.probe(device)
+    send_led_command(mqtt_client, topic, state_to_command(state), force=True, who=who)
+    return True
+
+
+def _on_liveness_change(device, old, new):
+    """Cambio de estado de un dispositivo (en el hilo del motor)."""
+    if new == liveness.OFFLINE:
+        log.warning("Dispositivo %s sin conexión (antes %s): no se le mandarán animaciones hasta que vuelva.", device, old)
+        if config.LIVENESS_AUTO_SKIP:
+            skip_offline_steps()
+    elif new == liveness.STALE:
+        # Solo se pregunta si tiene un comando sin confirmar por su eco: un dispositivo en
+        # reposo que ya confirmó lo último se queda en STALE sin tráfico hasta que vuelva a
+        # hablar (nunca pasa a OFFLINE por callar). El eco de la pregunta cuenta como respuesta.
+        topic = config.DEVICES_CONFIG.get(device, {}).get("light_command_topic")
+        if topic and mirror.pending(topic):
+            _resend_led(device, "liveness", probe=True)
+    elif new == liveness.ONLINE and old == liveness.OFFLINE:
+        log.info("Dispositivo %s de nuevo conectado: se le reenvía su estado de LED.", device)
+        _resend_led(device, "liveness")
+
+
+def skip_offline_steps():
+    """Salta los pasos en curso cuyo dispositivo está sin conexión (LIVENESS_AUTO_SKIP)."""
+    for c in registry.in_state(STATE_IN_PROGRESS):
+        while (c.state == STATE_IN_PROGRESS and c.current_index < len(c.sequence)
+               and liveness.tracker.is_offline(c.sequence[c.current_index])):
+            log.warning("[%s] Paso %d saltado: %s sin conexión.", c.name, c.current_index, c.sequence[c.current_index])
+            c.skip_step()
+
+
+def _liveness_tick():
+    global _liveness_task
+    liveness.tracker.tick()
+    if config.LIVENESS_AUTO_SKIP and liveness.tracker.offline():
+        # Un circuito puede haber llegado después a un paso de un dispositivo ya caído
+        skip_offline_steps()
+    _liveness_task = scheduler.call_later(config.LIVENESS_TICK, _liveness_tick)
+
+
+def start_liveness():
+    """Sigue los dispositivos de config.DEVICES_CONFIG (una sola vez; LIVENESS_TICK=0 lo desactiva)."""
+    global _liveness_task
+    if _liveness_task is None and config.LIVENESS_TICK:
+        liveness.tracker.watch(config.DEVICES_CONFIG)
+        _liveness_task = scheduler.call_later(config.LIVENESS_TICK, _liveness_tick)
 
-    if active_circuits_param is None:
-        active_circuits_param = []
 
+# ======================
+# Exportación periódica de métricas (la sirve apis/rockfit_metrics.py)
+# ======================
+_metrics_task = None
+
+
+def metrics_gauges():
+    """Valores instantáneos que acompañan a los histogramas en cada exportación."""
+    gauges = {"active_instances": len(circuits), "completed_in_memory": len(completed_circuits)}
+    for prefix, stats in (("engine", engine.stats()), ("scheduler", scheduler.stats()), ("shadow", shadow.stats()),
+                          ("animation", animator.stats()), ("outbound", outbox.stats()),
+                          ("ratelimit", rate_limiter.stats()), ("mirror", mirror.stats()),
+                          ("liveness", liveness.tracker.stats())):
+        for key, value in stats.items():
+            gauges[f"{prefix}_{key}"] = value
+    return gauges
+
+
+def export_metrics():
+    """Vuelca los histogramas a config.METRICS_EXPORT_PATH y se vuelve a programar."""
+    global _metrics_task
+    try:
+        metrics.export(config.METRICS_EXPORT_PATH, metrics_gauges())
+        liveness.export(config.LIVENESS_EXPORT_PATH, devices_report())
+    except OSError as e:
+        log.warning("No se pudieron exportar las métricas: %s", e)
+    _metrics_task = scheduler.call_later(config.METRICS_EXPORT_INTERVAL, export_metrics)
+
+
+def devices_report():
+    """Estado de cada dispositivo para la API: vida (liveness) y lo que muestra su LED (espejo)."""
+    report = liveness.tracker.dump()
+    for name, entry in report.items():
+        record = mirror.device(name)
+        entry["led"] = record.as_dict() if record is not None else None
+    return report
+
+
+def start_metrics_export():
+    """Arranca la exportación periódica (una sola vez; METRICS_EXPORT_INTERVAL=0 la desactiva)."""
+    global _metrics_task
+    if _metrics_task is None and config.METRICS_EXPORT_INTERVAL:
+        _metrics_task = scheduler.call_later(config.METRICS_EXPORT_INTERVAL, export_metrics)
+
+
+def apply_active_circuits(active_circuits_param, reset_colors=True):
+    """
+    Crea/descarta instancias según la lista de circuitos deseados (en el hilo del motor).
+    Con reset_colors=False se conserva el color elegido por el usuario (arranque en caliente).
+    """
+    global desired_active_ids
     desired_active_ids = set(active_circuits_param)
 
-    new_list = []
-    for c in circuits:
-        if c.id in desired_active_ids and c.state in [STATE_WAITING, STATE_IN_PROGRESS]:
-            new_list.append(c)
-    circuits[:] = new_list
-
-    from config import CIRCUITS
-    waiting_ids = {c.id for c in circuits if c.state in [STATE_WAITING, STATE_IN_PROGRESS]}
-    for conf in CIRCUITS:
-        cid = conf["id"]
-        if cid in desired_active_ids and cid not in waiting_ids:
-            order_mode = conf.get("order_mode", "strict")
-            if order_mode == "strict":
-                cinst = StrictCircuit(conf, mqtt_client)
-            elif order_mode == "flexible":
-                cinst = FlexibleCircuit(conf, mqtt_client)
-            elif order_mode == "competition":
-                cinst = CompetitionCircuit(conf, mqtt_client)
-            else:
-                cinst = StrictCircuit(conf, mqtt_client)
-            circuits.append(cinst)
+    for c in list(circuits):
+        if c.id not in desired_active_ids or c.state not in (STATE_WAITING, STATE_IN_PROGRESS):
+            unregister_circuit(c)
+
+    for cid in dict.fromkeys(active_circuits_param):
+        conf = registry.get(cid)
+        if conf is not None and registry.live_instance(cid) is None:
+            cinst = make_circuit(conf)
+            register_circuit(cinst)
             e = cinst.steps[0]["event"] if cinst.steps else "tap"
-            logging.info(f"[{cinst.name}] RESET -> OFF en {len(cinst.sequence)} disp, FastPulse en '{cinst.control_device}', "
-                         f"color {cinst.get_current_color()}, esperando '{e}'")
+            log.info("[%s] RESET -> OFF en %d disp, FastPulse en '%s', color %s, esperando '%s'",
+                     cinst.name, len(cinst.sequence), cinst.control_device, cinst.get_current_color(), e)
 
-    logging.info("Resumen de circuitos activos:")
+    log.info("Resumen de circuitos activos:")
     for c in circuits:
         start_evt = c.steps[0]["event"] if c.steps else "tap?"
-        logging.info(f" - {c.name} (ID={c.instance_id}): ctrl={c.control_device}, color={c.get_current_color()}, "
-                     f"modo={c.order_mode}, evento_inicio={start_evt}")
+        log.info(" - %s (ID=%s): ctrl=%s, color=%s, modo=%s, evento_inicio=%s",
+                 c.name, c.instance_id, c.control_device, c.get_current_color(), c.order_mode, start_evt)
 
-    logging.info("Sistema listo para recibir eventos de dispositivos.")
+    log.info("Sistema listo para recibir eventos de dispositivos.")
     for c in circuits:
-        c.user_color = c.color_initial.copy()
+        if reset_colors:
+            c.user_color = c.color_initial.copy()
         c.update_all_leds()
 
 
 if __name__ == '__main__':
+    rockfit_logging.setup_from_config(config)
     main(["circuito_2"])
     while True:
         time.sleep(0.5)
@@ -1,27 +1,67 @@
 import paho.mqtt.client as mqtt
-import json
-import logging
 import config
+import logic
+import rockfit_logging
+from device_mirror import mirror
+import liveness
+from led_shadow import shadow, state_to_command
+from outbound import OutboundQueue, PRIORITY_COSMETIC
+from ratelimit import limiter
 
-# Quitamos logging.basicConfig(...) aquí
+# La configuración del logging la hace rockfit_logging.setup(); aquí solo loggers por categoría
+log = rockfit_logging.get_logger("devices")
+tx_log = rockfit_logging.get_logger("mqtt.tx")
 
 devices_client = None
 
+# Las órdenes masivas (turn_on_all...) pasan por una cola acotada con último gana por LED:
+# si los ESP32 van atrasados, un comando nuevo sustituye al que aún no salió
+outbox = OutboundQueue(
+    max_pending=config.OUTBOUND_MAX_PENDING,
+    max_inflight=config.OUTBOUND_MAX_INFLIGHT,
+    ack_timeout=config.OUTBOUND_ACK_TIMEOUT,
+    on_drop=lambda topic: shadow.invalidate([topic]),
+    limiter=limiter if config.RATE_LIMIT_ENABLED else None,
+    # El planificador del motor (se resuelve en cada llamada: async_runtime lo sustituye).
+    # put() corre en el hilo de la GUI y acked() en el de paho: los dos planificadores
+    # admiten call_later desde otro hilo
+    schedule=lambda delay, fn, *args: logic.scheduler.call_later(delay, fn, *args),
+)
+
 def init_devices_client():
     global devices_client
     devices_client = mqtt.Client()
+    devices_client.on_publish = lambda client, userdata, mid, *args: outbox.acked(mid)
     devices_client.connect(config.MQTT_BROKER, config.MQTT_PORT, 60)
     devices_client.loop_start()
-    logging.info("Devices MQTT client initialized and loop started.")
+    log.info("Devices MQTT client initialized and loop started.")
 
-def publish_device_command(device, cmd):
+def publish_device_command(device, cmd, force=False):
     dev_cfg = config.DEVICES_CONFIG.get(device, {})
     light_topic = dev_cfg.get("light_command_topic")
     if light_topic:
-        logging.debug(f"[Devices] (debug) to {light_topic}: {cmd}")
-        devices_client.publish(light_topic, json.dumps(cmd))
+        if not shadow.should_send(light_topic, cmd, force):
+            return
+        if liveness.tracker.is_offline(device):
+            # Orden explícita: sale igualmente y, si responde, su eco lo devuelve a ONLINE
+            log.info("[Devices] %s figura sin conexión; se le manda igualmente.", device)
+        state = shadow.get(light_topic)
+        if config.MIRROR_SKIP_CONFIRMED and not force and mirror.shows(light_topic, state):
+            return
+        mirror.expect(light_topic, state)
+        tx_log.debug("[Devices] to %s: %s", light_topic, cmd)
+        outbox.put(light_topic, config.get_command_payload(cmd), PRIORITY_COSMETIC, devices_client)
     else:
-        logging.warning(f"[Devices] No light_command_topic found for {device}.")
+        log.warning("[Devices] No light_command_topic found for %s.", device)
+
+def device_state(device):
+    """Registro del espejo (device_mirror.DeviceRecord) con lo que muestra el LED de `device`, o None."""
+    light_topic = config.DEVICES_CONFIG.get(device, {}).get("light_command_topic")
+    return mirror.get(light_topic) if light_topic else None
+
+def offline_devices():
+    """Dispositivos de config.DEVICES_CONFIG sin conexión ahora mismo (ver liveness.py)."""
+    return liveness.tracker.offline()
 
 def turn_on_device(device, brightness=100, color=config.DEFAULT_COLOR):
     cmd = config.get_led_on_command(color=color, brightness=brightness)
@@ -38,28 +78,36 @@ def update_device_effect(device, effect_name):
         cmd["brightness"] = 100
     publish_device_command(device, cmd)
 
+def resend_all():
+    for device, dev_cfg in config.DEVICES_CONFIG.items():
+        light_topic = dev_cfg.get("light_command_topic")
+        last = shadow.get(light_topic) if light_topic else None
+        if last is not None:
+            publish_device_command(device, state_to_command(last), force=True)
+    log.info("Last known LED state resent to ALL devices.")
+
 def turn_on_all():
     for device in config.DEVICES_CONFIG.keys():
         turn_on_device(device)
-    logging.info("Turn on command sent to ALL devices.")
+    log.info("Turn on command sent to ALL devices.")
 
 def turn_off_all():
     for device in config.DEVICES_CONFIG.keys():
         turn_off_device(device)
-    logging.info("Turn off command sent to ALL devices.")
+    log.info("Turn off command sent to ALL devices.")
 
 def activate_fast_pulse_global():
     for device in config.DEVICES_CONFIG.keys():
         update_device_effect(device, "Fast Pulse")
-    logging.info("Fast Pulse activated on ALL devices.")
+    log.info("Fast Pulse activated on ALL devices.")
 
 def deactivate_fast_pulse_global():
     for device in config.DEVICES_CONFIG.keys():
         turn_off_device(device)
-    logging.info("Fast Pulse deactivated on ALL devices.")
+    log.info("Fast Pulse deactivated on ALL devices.")
 
 def apply_color_to_all(color, brightness_value):
     new_color = {"r": int(color[0]*255), "g": int(color[1]*255), "b": int(color[2]*255)}
     for device in config.DEVICES_CONFIG.keys():
         turn_on_device(device, brightness=brightness_value, color=new_color)
-    logging.info(f"New color applied to ALL devices: {new_color}")
+    log.info("New color applied to ALL devices: %s", new_color)
@@ -0,0 +1,177 @@
+"""
+metrics.py
+----------
+Histogramas de latencia por etapa del motor (de la llegada de un tap al comando LED),
+con cubetas fijas para que observar cueste solo un bisect y dos sumas.
+
+Etapas instrumentadas en logic.py:
+    callback        duración de on_message en el hilo de red de paho
+    queue_wait      desde on_message hasta que el motor empieza a tratar el mensaje
+    dispatch        dispatch_event completo (índice de tópicos + circuitos suscritos)
+    handler         handle_event de cada circuito
+    command_build   serialización del comando LED (config.get_command_payload)
+    publish_enqueue llamada a client.publish
+    broker_ack      desde publish hasta el on_publish de paho
+
+El motor exporta una instantánea JSON a disco (export) y el blueprint apis/rockfit_metrics.py
+la sirve en JSON y en formato de texto de Prometheus (render_prometheus).
+Solo usa la librería estándar para poder importarse tanto desde el motor como desde Flask.
+Las observaciones no toman cerrojos: con el GIL, como mucho se pierde alguna cuenta suelta.
+"""
+
+import json
+import os
+import time
+from bisect import bisect_left
+
+DEFAULT_EXPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics.json")
+
+# Límites superiores de las cubetas en microsegundos (la última cubeta es +Inf)
+BUCKETS_US = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 500000)
+
+STAGES = (
+    ("callback", "on_message en el hilo de red de paho"),
+    ("queue_wait", "espera en la cola del motor"),
+    ("dispatch", "dispatch_event completo"),
+    ("handler", "handle_event de un circuito"),
+    ("command_build", "serialización del comando LED"),
+    ("publish_enqueue", "llamada a client.publish"),
+    ("broker_ack", "publish -> on_publish"),
+)
+
+
+class Histogram:
+    __slots__ = ("name", "help", "bounds_ns", "counts", "sum_ns", "count")
+
+    def __init__(self, name, help_text="", buckets_us=BUCKETS_US):
+        self.name = name
+        self.help = help_text
+        self.bounds_ns = [b * 1000 for b in buckets_us]
+        self.counts = [0] * (len(buckets_us) + 1)
+        self.sum_ns = 0
+        self.count = 0
+
+    def observe_ns(self, ns):
+        self.counts[bisect_left(self.bounds_ns, ns)] += 1
+        self.sum_ns += ns
+        self.count += 1
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.sum_ns = 0
+        self.count = 0
+
+    def snapshot(self):
+        return {
+            "help": self.help,
+            "buckets_us": [b / 1000 for b in self.bounds_ns],
+            "counts": list(self.counts),
+            "count": self.count,
+            "sum_us": self.sum_ns / 1000,
+        }
+
+
+class AckTracker:
+    """
+    Empareja cada publish con su on_publish por mid, llegue antes uno u otro
+    (paho puede llamar a on_publish antes de que publish() devuelva).
+    """
+
+    MAX_PENDING = 4096
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self._sent = {}
+        self._acked = {}
+
+    def sent(self, mid, t_ns):
+        acked = self._acked.pop(mid, None)
+        if acked is not None:
+            self.histogram.observe_ns(acked - t_ns)
+        else:
+            if len(self._sent) >= self.MAX_PENDING:
+                self._sent.clear()
+            self._sent[mid] = t_ns
+
+    def pending(self):
+        """Publicaciones aún sin on_publish (cola de salida de paho / broker atrasado)."""
+        return len(self._sent)
+
+    def acked(self, mid, t_ns):
+        sent = self._sent.pop(mid, None)
+        if sent is not None:
+            self.histogram.observe_ns(t_ns - sent)
+        else:
+            if len(self._acked) >= self.MAX_PENDING:
+                self._acked.clear()
+            self._acked[mid] = t_ns
+
+
+# ======================
+# Registro global
+# ======================
+histograms = {name: Histogram(name, help_text) for name, help_text in STAGES}
+
+CALLBACK = histograms["callback"]
+QUEUE_WAIT = histograms["queue_wait"]
+DISPATCH = histograms["dispatch"]
+HANDLER = histograms["handler"]
+COMMAND_BUILD = histograms["command_build"]
+PUBLISH_ENQUEUE = histograms["publish_enqueue"]
+BROKER_ACK = histograms["broker_ack"]
+
+acks = AckTracker(BROKER_ACK)
+
+
+def reset():
+    for h in histograms.values():
+        h.reset()
+
+
+def snapshot(gauges=None):
+    """Estado actual de todos los histogramas, más gauges opcionales {nombre: valor}."""
+    return {
+        "ts": time.time(),
+        "histograms": {name: h.snapshot() for name, h in histograms.items()},
+        "gauges": dict(gauges or {}),
+    }
+
+
+def export(path=DEFAULT_EXPORT_PATH, gauges=None):
+    """Escribe la instantánea en `path` de forma atómica (fichero temporal + os.replace)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot(gauges), f)
+    os.replace(tmp, path)
+
+
+def load(path=DEFAULT_EXPORT_PATH):
+    """Última instantánea exportada, o None si todavía no existe."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def render_prometheus(snap):
+    """Texto de exposición de Prometheus para una instantánea (segundos como unidad base)."""
+    lines = [
+        "# HELP rockfit_stage_latency_seconds Latencia por etapa del motor de circuitos.",
+        "# TYPE rockfit_stage_latency_seconds histogram",
+    ]
+    for stage, h in snap.get("histograms", {}).items():
+        cumulative = 0
+        for bound_us, count in zip(h["buckets_us"], h["counts"]):
+            cumulative += count
+            lines.append(f'rockfit_stage_latency_seconds_bucket{{stage="{stage}",le="{bound_us / 1e6:g}"}} {cumulative}')
+        lines.append(f'rockfit_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {h["count"]}')
+        lines.append(f'rockfit_stage_latency_seconds_sum{{stage="{stage}"}} {h["sum_us"] / 1e6:.9f}')
+        lines.append(f'rockfit_stage_latency_seconds_count{{stage="{stage}"}} {h["count"]}')
+    for name, value in sorted(snap.get("gauges", {}).items()):
+        metric = f"rockfit_{name}"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {value}")
+    lines.append("# TYPE rockfit_metrics_export_timestamp_seconds gauge")
+    lines.append(f"rockfit_metrics_export_timestamp_seconds {snap.get('ts', 0):.3f}")
+    return "\n".join(lines) + "\n"
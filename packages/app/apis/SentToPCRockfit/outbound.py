@@ -0,0 +1,238 @@
+"""
+outbound.py
+-----------
+Cola de salida acotada para los comandos de LED, delante de client.publish:
+
+    - Como mucho max_inflight publicaciones sin confirmar (on_publish) en paho; el resto
+      espera aquí en vez de acumularse sin límite en la cola interna de paho.
+    - Último gana por tópico: un comando nuevo sustituye al anterior aún no enviado del
+      mismo LED (conserva su puesto en la cola).
+    - Dos carriles: PRIORITY_CRITICAL (juego: pasos, arranques, reinicios) sale siempre
+      antes que PRIORITY_COSMETIC (animaciones, órdenes masivas de la pantalla de dispositivos).
+    - Con max_pending comandos en cola (tras olvidar los envíos sin confirmar caducados) se
+      descarta el cosmético más antiguo, o el nuevo si también es cosmético y no hay otro;
+      on_drop(topic) avisa para invalidar la sombra. Un comando crítico nunca se descarta: ya
+      se fusiona por LED, así que su carril pasa de max_pending como mucho hasta uno por LED.
+
+    - Con un limiter (ratelimit.RateLimiter), un comando cuyo LED no tiene ficha queda aparcado
+      hasta la siguiente y los que lleguen mientras tanto lo sustituyen (se fusionan, no se
+      encolan); los demás LEDs siguen saliendo sin esperar. Su salida se programa con
+      schedule(delay, fn, *args), obligatorio con limiter: el call_later de un planificador
+      (scheduler.Scheduler) que ya exista, nunca un hilo por comando aparcado.
+
+publish(client, topic, payload, qos, retain, priority) publica y devuelve el mid; recibe el
+carril del comando por si el destino lo necesita (p. ej. el frontal de sharding.py).
+
+Sin carga (paho confirma al ritmo que se publica) put() publica en el acto y la cola está vacía.
+Las confirmaciones llegan con acked(mid) desde on_publish; si una no llega en ack_timeout s
+(p. ej. se perdió la conexión) deja de contar. Es segura entre hilos y no importa config ni
+logic, así que la usan también logic_devices y los scripts de prueba de baldosas.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+PRIORITY_CRITICAL = 0
+PRIORITY_COSMETIC = 1
+
+
+def publish_with_client(client, topic, payload, qos, retain, priority=PRIORITY_CRITICAL):
+    """Publicación por defecto: mid de paho (None si el cliente no lo da). La prioridad no se usa."""
+    info = client.publish(topic, payload, qos=qos, retain=retain)
+    return getattr(info, "mid", None)
+
+
+class OutboundQueue:
+    def __init__(self, publish=publish_with_client, max_pending=256, max_inflight=32, ack_timeout=2.0,
+                 on_drop=None, limiter=None, schedule=None, clock=time.monotonic):
+        if limiter is not None and schedule is None:
+            raise ValueError("OutboundQueue con limiter necesita schedule(delay, fn, *args)")
+        self.publish = publish
+        self.limiter = limiter
+        self.schedule = schedule
+        self.max_pending = max_pending
+        self.max_inflight = max_inflight
+        self.ack_timeout = ack_timeout
+        self.on_drop = on_drop
+        self.clock = clock
+        self._lanes = (OrderedDict(), OrderedDict())   # carril -> {tópico: (client, payload, qos, retain)}
+        self._lane_of = {}       # tópico en cola -> carril
+        self._inflight = {}      # mid -> instante de envío
+        self._early_acks = set() # on_publish llegado antes de que publish() devolviera el mid
+        self._parked = {}        # tópico sin ficha -> (carril, entrada), a la espera de schedule
+        self._lock = threading.RLock()
+        self._draining = False
+        self.sent = 0
+        self.merges = 0
+        self.drops = 0
+        self.expired = 0
+        self.throttled = 0
+        self.max_depth = 0
+
+    # ======================
+    # Entrada
+    # ======================
+    def put(self, topic, payload, priority=PRIORITY_CRITICAL, client=None, qos=0, retain=False):
+        """Encola (o publica ya, si hay hueco) el comando de `topic`."""
+        entry = (client, payload, qos, retain)
+        with self._lock:
+            parked = self._parked.get(topic)
+            if parked is not None:
+                # LED limitado: el comando nuevo sustituye al aparcado y sale con su ficha
+                self.merges += 1
+                self._parked[topic] = (min(parked[0], priority), entry)
+                return True
+            lane = self._lane_of.get(topic)
+            if lane is not None:
+                # Último gana; si el nuevo es más prioritario, el comando sube de carril
+                self.merges += 1
+                if priority < lane:
+                    del self._lanes[lane][topic]
+                    self._lanes[priority][topic] = entry
+                    self._lane_of[topic] = priority
+                else:
+                    self._lanes[lane][topic] = entry
+            else:
+                if len(self._lane_of) >= self.max_pending and not self._make_room(priority, topic):
+                    return False
+                self._lanes[priority][topic] = entry
+                self._lane_of[topic] = priority
+                depth = len(self._lane_of)
+                if depth > self.max_depth:
+                    self.max_depth = depth
+            self._drain()
+        return True
+
+    def _make_room(self, priority, topic):
+        """
+        Con la cola llena: si caducó algún envío sin confirmar, vacía lo que pueda; si sigue
+        llena descarta el cosmético más antiguo o el nuevo (cosmético). False si es el nuevo.
+        """
+        if self._expire():
+            self._drain()
+            if len(self._lane_of) < self.max_pending:
+                return True
+        cosmetic = self._lanes[PRIORITY_COSMETIC]
+        if cosmetic:
+            victim, _ = cosmetic.popitem(last=False)
+        elif priority == PRIORITY_COSMETIC:
+            victim = topic
+        else:
+            return True   # crítico: se encola por encima de max_pending
+        self._lane_of.pop(victim, None)
+        self.drops += 1
+        if self.on_drop is not None:
+            self.on_drop(victim)
+        return victim != topic
+
+    # ======================
+    # Salida
+    # ======================
+    def acked(self, mid):
+        """Confirmación de paho (on_publish): libera un hueco y envía lo siguiente."""
+        with self._lock:
+            if self._inflight.pop(mid, None) is None:
+                if len(self._early_acks) < 4 * self.max_inflight:
+                    self._early_acks.add(mid)
+            self._drain()
+
+    def _drain(self):
+        if self._draining:   # on_publish síncrono dentro de publish(): ya estamos vaciando
+            return
+        self._draining = True
+        try:
+            while self._lane_of:
+                if len(self._inflight) >= self.max_inflight and not self._expire():
+                    return
+                lane = self._lanes[PRIORITY_CRITICAL] or self._lanes[PRIORITY_COSMETIC]
+                topic, entry = lane.popitem(last=False)
+                priority = self._lane_of.pop(topic)
+                if self.limiter is not None:
+                    wait = self.limiter.acquire(topic)
+                    if wait > 0:
+                        self._parked[topic] = (priority, entry)
+                        self.throttled += 1
+                        self.schedule(wait, self._unpark, topic)
+                        continue
+                    self.limiter.sent(topic)
+                client, payload, qos, retain = entry
+                mid = self.publish(client, topic, payload, qos, retain, priority)
+                self.sent += 1
+                if mid is not None:
+                    if mid in self._early_acks:
+                        self._early_acks.discard(mid)
+                    else:
+                        self._inflight[mid] = self.clock()
+        finally:
+            self._draining = False
+
+    def _unpark(self, topic):
+        """Vuelve a poner en cabeza de su carril el comando aparcado de `topic`."""
+        with self._lock:
+            parked = self._parked.pop(topic, None)
+            if parked is None:
+                return
+            priority, entry = parked
+            lane = self._lanes[priority]
+            lane[topic] = entry
+            lane.move_to_end(topic, last=False)
+            self._lane_of[topic] = priority
+            self._drain()
+
+    def _expire(self):
+        """Olvida los envíos sin confirmar desde hace ack_timeout s; True si liberó alguno."""
+        limit = self.clock() - self.ack_timeout
+        stale = [mid for mid, sent_at in self._inflight.items() if sent_at < limit]
+        for mid in stale:
+            del self._inflight[mid]
+        self.expired += len(stale)
+        return bool(stale)
+
+    def reset_inflight(self):
+        """Tras (re)conectar no llegarán las confirmaciones pendientes."""
+        with self._lock:
+            self._inflight.clear()
+            self._early_acks.clear()
+            self._drain()
+
+    def flush(self):
+        """Envía lo que quede en cola sin esperar confirmaciones ni fichas (p. ej. al salir)."""
+        with self._lock:
+            for topic, (priority, entry) in self._parked.items():
+                self._lanes[priority][topic] = entry
+                self._lane_of[topic] = priority
+            self._parked.clear()
+            limit, self.max_inflight = self.max_inflight, float("inf")
+            limiter, self.limiter = self.limiter, None
+            try:
+                self._drain()
+            finally:
+                self.max_inflight = limit
+                self.limiter = limiter
+
+    # ======================
+    # Estado
+    # ======================
+    def depth(self):
+        return len(self._lane_of) + len(self._parked)
+
+    def backlog(self):
+        """Comandos en cola (o aparcados) más publicaciones sin confirmar."""
+        return len(self._lane_of) + len(self._parked) + len(self._inflight)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "depth": len(self._lane_of) + len(self._parked),
+                "depth_critical": len(self._lanes[PRIORITY_CRITICAL]),
+                "depth_cosmetic": len(self._lanes[PRIORITY_COSMETIC]),
+                "max_depth": self.max_depth,
+                "parked": len(self._parked),
+                "inflight": len(self._inflight),
+                "sent": self.sent,
+                "merges": self.merges,
+                "drops": self.drops,
+                "expired": self.expired,
+                "throttled": self.throttled,
+            }
@@ -0,0 +1,173 @@
+"""
+ratelimit.py
+------------
+Limitador de comandos por LED (light_command_topic) con cubeta de fichas cuya tasa se adapta
+a la latencia medida de cada dispositivo: ping.csv muestra baldosas que confirman en 15 ms
+y otras que tardan más de 600 ms, y mandarles más rápido solo las atrasa más.
+
+La latencia se mide con los ecos de estado del ESP32: tras aplicar un comando publica
+su estado en .../light/<id>/state (echo() recibe el light_command_topic de ese LED). Un eco confirma todos los comandos enviados antes y su
+latencia es la del más antiguo pendiente; la media móvil (EWMA) fija la tasa:
+
+    tasa = clamp(headroom / latencia, min_rate, max_rate)
+
+Además, como mucho `window` comandos sin eco por LED: antes de la primera medida la tasa es
+max_rate y sin ventana una baldosa lenta recibiría toda la animación de golpe. Un LED que no
+responde nunca (firmware sin eco) se queda sin ventana al primer echo_timeout. Los dispositivos que ya han respondido alguna vez y dejan de
+hacerlo cuentan como latencia echo_timeout. El limitador no retiene comandos: acquire() dice
+cuánto esperar y quien lo usa (outbound.OutboundQueue) deja el comando aparcado, fusionándolo
+con los que lleguen después para ese LED, en lugar de encolarlos.
+
+En el motor los ecos le llegan del espejo de estado (device_mirror.mirror.subscribe(..., echoes=True)) en el
+hilo de red de paho, así que es seguro entre hilos. No importa config ni logic.
+"""
+
+import threading
+import time
+from collections import deque
+
+MIN_WAIT = 0.001   # s
+_EPSILON = 1e-9
+
+
+class _Bucket:
+    __slots__ = ("tokens", "last", "rate", "latency", "pending", "echoed", "silent")
+
+    def __init__(self, rate, burst, now):
+        self.tokens = burst
+        self.last = now
+        self.rate = rate
+        self.latency = None          # EWMA en s
+        self.pending = deque(maxlen=32)   # instantes de los comandos sin eco
+        self.echoed = False
+        self.silent = False          # no respondió nunca antes de echo_timeout: sin ventana
+
+
+class RateLimiter:
+    def __init__(self, min_rate=2.0, max_rate=50.0, burst=3, window=3, headroom=1.0, alpha=0.2,
+                 echo_timeout=2.0, clock=time.monotonic):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.window = window
+        self.headroom = headroom
+        self.alpha = alpha
+        self.echo_timeout = echo_timeout
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.throttled = 0
+        self.samples = 0
+        self.timeouts = 0
+
+    def configure(self, **settings):
+        """Cambia parámetros (p. ej. desde config al arrancar el motor)."""
+        for name, value in settings.items():
+            if not hasattr(self, name):
+                raise AttributeError(name)
+            setattr(self, name, value)
+
+    def _bucket(self, topic, now):
+        bucket = self._buckets.get(topic)
+        if bucket is None:
+            bucket = self._buckets[topic] = _Bucket(self.max_rate, self.burst, now)
+        return bucket
+
+    # ======================
+    # Fichas
+    # ======================
+    def acquire(self, topic, now=None):
+        """0.0 si se puede enviar ya (y consume la ficha); si no, segundos hasta la siguiente."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            bucket = self._bucket(topic, now)
+            self._check_timeout(bucket, now)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.last) * bucket.rate)
+            bucket.last = now
+            if len(bucket.pending) >= self.window and not bucket.silent:
+                # Ventana: como mucho `window` comandos sin eco por LED (también antes de la
+                # primera medida, cuando la tasa aún es max_rate)
+                self.throttled += 1
+                return max(MIN_WAIT, 1.0 / bucket.rate)
+            if bucket.tokens >= 1.0 - _EPSILON:
+                bucket.tokens = max(0.0, bucket.tokens - 1.0)
+                return 0.0
+            self.throttled += 1
+            # Nunca menos de MIN_WAIT: con esperas ínfimas el temporizador vence en el mismo
+            # instante (redondeo) y la ficha no llega a completarse
+            return max(MIN_WAIT, (1.0 - bucket.tokens) / bucket.rate)
+
+    # ======================
+    # Latencia por ecos
+    # ======================
+    def sent(self, topic, now=None):
+        """Registra un comando publicado en `topic` (a la espera de su eco)."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            self._bucket(topic, now).pending.append(now)
+
+    def echo(self, topic, now=None):
+        """Eco de estado del LED de `topic`: confirma sus comandos pendientes. Devuelve la latencia o None."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(topic)
+            if bucket is None or not bucket.pending:
+                return None
+            latency = now - bucket.pending[0]
+            bucket.pending.clear()
+            bucket.echoed = True
+            bucket.silent = False
+            self._observe(bucket, latency)
+            return latency
+
+    def _check_timeout(self, bucket, now):
+        if bucket.pending and now - bucket.pending[0] > self.echo_timeout:
+            bucket.pending.clear()
+            if bucket.echoed:   # solo cuenta si el dispositivo suele responder
+                self.timeouts += 1
+                self._observe(bucket, self.echo_timeout)
+            else:
+                bucket.silent = True
+
+    def _observe(self, bucket, latency):
+        self.samples += 1
+        if bucket.latency is None:
+            bucket.latency = latency
+        else:
+            bucket.latency += self.alpha * (latency - bucket.latency)
+        rate = self.headroom / bucket.latency if bucket.latency > 0 else self.max_rate
+        bucket.rate = min(self.max_rate, max(self.min_rate, rate))
+
+    # ======================
+    # Consultas
+    # ======================
+    def rate(self, topic):
+        bucket = self._buckets.get(topic)
+        return bucket.rate if bucket is not None else self.max_rate
+
+    def latency(self, topic):
+        """Latencia media de eco en s (None si aún no hay medidas)."""
+        bucket = self._buckets.get(topic)
+        return bucket.latency if bucket is not None else None
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            measured = [b.latency for b in self._buckets.values() if b.latency is not None]
+            limited = sum(1 for b in self._buckets.values() if b.rate < self.max_rate)
+            return {
+                "topics": len(self._buckets),
+                "measured": len(measured),
+                "limited": limited,
+                "max_latency_ms": max(measured) * 1000 if measured else 0.0,
+                "throttled": self.throttled,
+                "samples": self.samples,
+                "timeouts": self.timeouts,
+            }
+
+
+# Limitador único del proceso (motor y logic_devices comparten las medidas por dispositivo)
+limiter = RateLimiter()
@@ -0,0 +1,162 @@
+"""
+results_store.py
+----------------
+Almacén local de resultados de circuitos completados: SQLite en modo WAL, solo inserciones,
+con escrituras por lotes e índices por circuito, usuario y día.
+Solo usa la librería estándar para poder importarse tanto desde el motor como desde Flask.
+"""
+
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.db")
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY,
+        instance_id TEXT,
+        circuit_id TEXT,
+        name TEXT,
+        finished_at REAL,
+        day TEXT,
+        total_time REAL,
+        final_color TEXT,
+        timestamps TEXT
+    )""",
+    "CREATE TABLE IF NOT EXISTS result_users (result_id INTEGER, user TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_results_circuit ON results (circuit_id, finished_at)",
+    "CREATE INDEX IF NOT EXISTS idx_results_day ON results (day)",
+    "CREATE INDEX IF NOT EXISTS idx_result_users_user ON result_users (user, result_id)",
+    "CREATE INDEX IF NOT EXISTS idx_result_users_result ON result_users (result_id)",
+    "CREATE INDEX IF NOT EXISTS idx_results_instance ON results (instance_id)",
+)
+
+
+class ResultsStore:
+    def __init__(self, path=DEFAULT_DB_PATH, batch_size=50):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = []
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            for stmt in _SCHEMA:
+                self._conn.execute(stmt)
+
+    def add(self, result):
+        """Añade un resultado al lote pendiente; escribe el lote al llegar a batch_size."""
+        with self._lock:
+            self._pending.append(result)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    def set_users(self, instance_id, users):
+        """
+        Sustituye los usuarios asignados al resultado de `instance_id` (el más reciente con ese
+        id). Devuelve False si no hay ningún resultado guardado con ese id.
+        """
+        with self._lock:
+            self._flush_locked()
+            row = self._conn.execute(
+                "SELECT id FROM results WHERE instance_id = ? ORDER BY id DESC LIMIT 1", (str(instance_id),)
+            ).fetchone()
+            if row is None:
+                return False
+            with self._conn:
+                self._conn.execute("DELETE FROM result_users WHERE result_id = ?", row)
+                self._conn.executemany(
+                    "INSERT INTO result_users (result_id, user) VALUES (?, ?)",
+                    [(row[0], user) for user in users],
+                )
+            return True
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+    def query(self, circuit_id=None, user=None, day=None, limit=100):
+        """
+        Resultados guardados (más recientes primero), filtrados por circuito, usuario
+        y/o día ("YYYY-MM-DD"). Devuelve dicts con la misma forma que logic.completed_circuits.
+        """
+        sql = "SELECT r.id, r.instance_id, r.circuit_id, r.name, r.finished_at, r.total_time, r.final_color, r.timestamps FROM results r"
+        where, params = [], []
+        if user is not None:
+            sql += " JOIN result_users u ON u.result_id = r.id"
+            where.append("u.user = ?")
+            params.append(user)
+        if circuit_id is not None:
+            where.append("r.circuit_id = ?")
+            params.append(circuit_id)
+        if day is not None:
+            where.append("r.day = ?")
+            params.append(day)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY r.finished_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute(sql, params).fetchall()
+            users = self._users_for([row[0] for row in rows])
+        return [
+            {
+                "instance_id": instance_id,
+                "circuit_id": cid,
+                "name": name,
+                "finished_at": finished_at,
+                "total_time": total_time,
+                "final_color": json.loads(final_color) if final_color else None,
+                "timestamps": [tuple(ev) for ev in json.loads(timestamps or "[]")],
+                "assigned_users": users.get(rid, []),
+            }
+            for rid, instance_id, cid, name, finished_at, total_time, final_color, timestamps in rows
+        ]
+
+    # ----------------------------------------------------------------------
+    # Interno
+    # ----------------------------------------------------------------------
+    def _users_for(self, ids):
+        users = {}
+        if not ids:
+            return users
+        marks = ",".join("?" * len(ids))
+        for rid, user in self._conn.execute(f"SELECT result_id, user FROM result_users WHERE result_id IN ({marks})", ids):
+            users.setdefault(rid, []).append(user)
+        return users
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        with self._conn:
+            for result in batch:
+                finished_at = result.get("finished_at", 0.0)
+                cur = self._conn.execute(
+                    "INSERT INTO results (instance_id, circuit_id, name, finished_at, day, total_time, final_color, timestamps) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        str(result.get("instance_id")),
+                        result.get("circuit_id"),
+                        result.get("name"),
+                        finished_at,
+                        datetime.date.fromtimestamp(finished_at).isoformat(),
+                        result.get("total_time", 0.0),
+                        json.dumps(result.get("final_color")),
+                        json.dumps(result.get("timestamps", [])),
+                    ),
+                )
+                self._conn.executemany(
+                    "INSERT INTO result_users (result_id, user) VALUES (?, ?)",
+                    [(cur.lastrowid, user) for user in result.get("assigned_users", [])],
+                )
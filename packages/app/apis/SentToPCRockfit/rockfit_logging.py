@@ -0,0 +1,171 @@
+"""
+rockfit_logging.py
+------------------
+Logging estructurado y de bajo coste para el camino caliente MQTT.
+
+- Cada categoría tiene su logger ("rockfit.mqtt.rx", "rockfit.mqtt.tx", "rockfit.engine"...),
+  obtenido con get_logger(categoria).
+- Los hilos que registran (red de paho, motor) solo encolan el LogRecord con un QueueHandler.
+  El formateo y la E/S (consola y ficheros rotativos en logs/) los hace un QueueListener
+  en su propio hilo. Las llamadas deben usar argumentos %-style, p. ej.
+  log.info("Mensaje recibido: %s", topic), nunca f-strings: si el nivel está desactivado,
+  no se formatea nada.
+- Muestreo por categoría: con sampling={"mqtt.rx": 10} solo pasa 1 de cada 10 registros
+  INFO/DEBUG de esa categoría. WARNING y superiores pasan siempre.
+
+Solo usa la librería estándar, para poder usarlo desde el motor y desde los scripts de tiles.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+
+ROOT = "rockfit"
+DEFAULT_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+CONSOLE_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Tipos que se pueden formatear más tarde en otro hilo sin riesgo de que cambien
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+_listener = None
+_queue_handler = None
+_samplers = {}
+
+
+def get_logger(category):
+    """Logger de la categoría (p. ej. "mqtt.rx" -> "rockfit.mqtt.rx")."""
+    return logging.getLogger(f"{ROOT}.{category}")
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no formatea en el hilo que registra: el mensaje se compone en el hilo
+    del listener. Si algún argumento es mutable (dict, list...) se formatea en el acto,
+    porque podría cambiar antes de que el listener lo procese.
+    """
+
+    def prepare(self, record):
+        args = record.args
+        if args and not all(isinstance(a, _IMMUTABLE_ARGS) for a in (args if isinstance(args, tuple) else (args,))):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar 1 de cada `every` registros por debajo de WARNING."""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, int(every))
+        self.seen = 0
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.every == 1:
+            return True
+        self.seen += 1
+        if self.seen % self.every == 1:
+            return True
+        self.dropped += 1
+        return False
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Una línea JSON por registro para los ficheros de logs/."""
+
+    def format(self, record):
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "category": record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + ".") else record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def set_sampling(category, every):
+    """Cambia el muestreo de una categoría (every=1 lo desactiva)."""
+    logger = get_logger(category)
+    old = _samplers.pop(category, None)
+    if old is not None:
+        logger.removeFilter(old)
+    if every and every > 1:
+        sampler = SamplingFilter(every)
+        logger.addFilter(sampler)
+        _samplers[category] = sampler
+
+
+def sampling_stats():
+    return {cat: {"every": s.every, "dropped": s.dropped} for cat, s in _samplers.items()}
+
+
+def setup(level=logging.INFO, log_dir=DEFAULT_LOG_DIR, filename="rockfit.log", console=True,
+          max_bytes=5 * 1024 * 1024, backup_count=5, sampling=None):
+    """
+    Instala el pipeline en el logger "rockfit" (una sola vez por proceso; las siguientes
+    llamadas solo ajustan nivel y muestreo). log_dir=None desactiva los ficheros.
+    El logger raíz no se toca: sus handlers y su nivel son de la aplicación que nos aloja
+    (Kivy, Flask...), y los registros "rockfit.*" no se propagan a ellos.
+    """
+    global _listener, _queue_handler
+    logger = logging.getLogger(ROOT)
+    logger.setLevel(level)
+    for category, every in (sampling or {}).items():
+        set_sampling(category, every)
+    if _listener is not None:
+        return _listener
+
+    handlers = []
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, filename), maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        file_handler.setFormatter(JsonLineFormatter())
+        handlers.append(file_handler)
+    if console:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(stream_handler)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = DeferredQueueHandler(log_queue)
+    logger.addHandler(_queue_handler)
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+    return _listener
+
+
+def setup_from_config(cfg):
+    """setup() con los parámetros LOG_* del módulo config del motor."""
+    return setup(
+        level=cfg.LOG_LEVEL,
+        log_dir=cfg.LOG_DIR,
+        max_bytes=cfg.LOG_MAX_BYTES,
+        backup_count=cfg.LOG_BACKUP_COUNT,
+        sampling=cfg.LOG_SAMPLING,
+    )
+
+
+def shutdown():
+    """Vacía la cola y cierra los ficheros."""
+    global _listener, _queue_handler
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    logger = logging.getLogger(ROOT)
+    logger.removeHandler(_queue_handler)
+    logger.propagate = True
+    _queue_handler = None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
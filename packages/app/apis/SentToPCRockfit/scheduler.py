@@ -0,0 +1,188 @@
+"""
+scheduler.py
+------------
+Planificador de acciones diferidas del motor de circuitos: un único hilo y un montículo
+(heapq) ordenado por instante de ejecución (time.monotonic).
+Sustituye a los threading.Timer / threading.Thread que se creaban por cada evento
+(finalize, fotogramas de celebración, parpadeos de fallo...).
+Las tareas pueden agruparse por "owner" (p. ej. una instancia de circuito) para
+cancelarlas todas de golpe al reiniciar o desactivar.
+Si se indica un `executor` (p. ej. EngineLoop.submit), el hilo del planificador no ejecuta
+las tareas: se las entrega al executor, que las corre en su propio hilo.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class ScheduledTask:
+    """Tarea programada. Se cancela con Scheduler.cancel / cancel_owner."""
+    __slots__ = ("when", "fn", "args", "owner", "cancelled", "queued")
+
+    def __init__(self, when, fn, args, owner):
+        self.when = when
+        self.fn = fn
+        self.args = args
+        self.owner = owner
+        self.cancelled = False
+        self.queued = True
+
+
+class Scheduler:
+    def __init__(self, name="rockfit-scheduler", executor=None):
+        self.name = name
+        self.executor = executor
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._by_owner = {}
+        self._pending = 0
+
+        # Contadores
+        self.executed = 0
+        self.cancelled = 0
+        self.errors = 0
+        self.late_total = 0.0
+        self.late_max = 0.0
+
+    # ----------------------------------------------------------------------
+    # Ciclo de vida
+    # ----------------------------------------------------------------------
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    # ----------------------------------------------------------------------
+    # API
+    # ----------------------------------------------------------------------
+    def call_later(self, delay, fn, *args, owner=None):
+        """Ejecuta fn(*args) dentro de `delay` segundos. Devuelve la ScheduledTask."""
+        return self.call_at(time.monotonic() + delay, fn, *args, owner=owner)
+
+    def call_at(self, when, fn, *args, owner=None):
+        """Ejecuta fn(*args) en el instante `when` (reloj time.monotonic)."""
+        task = ScheduledTask(when, fn, args, owner)
+        with self._cond:
+            heapq.heappush(self._heap, (when, next(self._seq), task))
+            self._pending += 1
+            if owner is not None:
+                self._by_owner.setdefault(owner, set()).add(task)
+            # Solo hace falta despertar al hilo si esta tarea pasa a ser la primera
+            if self._heap[0][2] is task:
+                self._cond.notify()
+        if not self._running:
+            self.start()
+        return task
+
+    def cancel(self, task):
+        with self._cond:
+            self._cancel_locked(task)
+
+    def cancel_owner(self, owner):
+        """Cancela todas las tareas pendientes de `owner`. Devuelve cuántas se cancelaron."""
+        with self._cond:
+            tasks = self._by_owner.pop(owner, ())
+            for task in tasks:
+                self._cancel_locked(task, forget_owner=False)
+            return len(tasks)
+
+    def pending(self):
+        return self._pending
+
+    def stats(self):
+        executed = self.executed
+        return {
+            "pending": self._pending,
+            "executed": executed,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+            "late_avg_ms": (self.late_total / executed * 1000.0) if executed else 0.0,
+            "late_max_ms": self.late_max * 1000.0,
+        }
+
+    # ----------------------------------------------------------------------
+    # Interno
+    # ----------------------------------------------------------------------
+    def _cancel_locked(self, task, forget_owner=True):
+        if task.cancelled:
+            return
+        task.cancelled = True
+        if task.queued:
+            self._pending -= 1
+        self.cancelled += 1
+        if forget_owner:
+            self._forget_owner(task)
+
+    def _forget_owner(self, task):
+        if task.owner is None:
+            return
+        tasks = self._by_owner.get(task.owner)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._by_owner[task.owner]
+
+    def _next_due(self):
+        """Espera a la siguiente tarea vencida y la devuelve (None si se detiene el hilo)."""
+        with self._cond:
+            while self._running:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                when, _, task = self._heap[0]
+                if task.cancelled:
+                    heapq.heappop(self._heap)
+                    continue
+                now = time.monotonic()
+                if when > now:
+                    self._cond.wait(when - now)
+                    continue
+                heapq.heappop(self._heap)
+                task.queued = False
+                self._pending -= 1
+                return task
+            return None
+
+    def _execute(self, task):
+        # Puede haberse cancelado mientras esperaba en la cola del executor
+        with self._cond:
+            self._forget_owner(task)
+            if task.cancelled:
+                return
+        late = time.monotonic() - task.when
+        self.late_total += late
+        if late > self.late_max:
+            self.late_max = late
+        try:
+            task.fn(*task.args)
+        except Exception:
+            self.errors += 1
+            logging.exception("[%s] Error ejecutando tarea programada %r", self.name, task.fn)
+        self.executed += 1
+
+    def _run(self):
+        while True:
+            task = self._next_due()
+            if task is None:
+                return
+            if self.executor is None:
+                self._execute(task)
+            else:
+                self.executor(self._execute, task)
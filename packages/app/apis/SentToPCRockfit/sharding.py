@@ -0,0 +1,537 @@
+"""
+sharding.py
+-----------
+Modo multiproceso del motor (config.ENGINE_RUNTIME = "sharded"): un proceso frontal tiene la
+conexión MQTT y reparte cada evento, según su dispositivo, a uno de N procesos de circuitos
+(shards). Cada shard es un motor completo de logic con su propio hilo, planificador, sombra
+de LEDs y animaciones, dueño de un conjunto disjunto de circuitos; sus comandos de LED
+vuelven al frontal por una tubería y es el frontal quien los publica.
+
+El reparto se calcula con el grafo de dispositivos de config.CIRCUITS (las definiciones de
+config.registry): los circuitos que comparten algún dispositivo (unión-búsqueda) van siempre
+al mismo shard, así que cada
+dispositivo pertenece a un único shard y su sombra de LEDs, su filtro de rebotes y sus
+animaciones no se reparten. Los grupos se asignan al shard menos cargado, del más
+grande al más pequeño (carga = pasos de sus circuitos).
+
+Entre procesos se mandan lotes: los mensajes que se acumulan mientras la tubería está
+ocupada salen juntos, sin esperar cuando no hay carga.
+
+Cada shard guarda su instantánea y sus métricas en <ruta>.shard<i> y registra en
+logs/rockfit.shard<i>.log. La recarga en caliente de config_loader no está disponible en
+este modo: el reparto depende del grafo de circuitos, así que hay que reiniciar.
+Tampoco la GUI (limbx): lee logic.circuits y usa logic.submit en el proceso frontal, que no
+tiene circuitos; con la GUI el motor arranca en "threads".
+
+Uso:
+    python sharding.py --workers 4 circuito_2 circuito_3
+o, desde otro programa sin GUI, sharding.start(["circuito_2"]).
+"""
+
+import argparse
+import heapq
+import logging
+import multiprocessing
+import threading
+import time
+from multiprocessing.connection import wait
+
+import paho.mqtt.client as mqtt
+
+import config
+import rockfit_logging
+from outbound import OutboundQueue, PRIORITY_CRITICAL
+from scheduler import Scheduler
+import device_mirror
+import liveness
+import ratelimit
+
+log = rockfit_logging.get_logger("engine")
+
+# Ajustes de config que los shards heredan del frontal (los benchmarks los cambian en caliente)
+INHERITED_SETTINGS = (
+    "MQTT_BROKER", "MQTT_PORT", "LOG_LEVEL", "LOG_DIR", "LOG_MAX_BYTES", "LOG_BACKUP_COUNT", "LOG_SAMPLING",
+    "METRICS_EXPORT_INTERVAL", "SNAPSHOT_INTERVAL", "SNAPSHOT_RESTORE", "SNAPSHOT_MAX_AGE",
+    "RESULTS_DB_PATH", "RESULTS_BATCH_SIZE", "RESULTS_FLUSH_INTERVAL", "ANIMATION_FPS", "ANIMATION_MAX_BACKLOG",
+)
+
+
+# ======================
+# Reparto de circuitos
+# ======================
+class ShardPlan:
+    def __init__(self, workers):
+        self.workers = workers
+        self.circuit_shard = {}                      # id de circuito -> shard
+        self.device_shard = {}                       # dispositivo -> shard
+        self.shards = [[] for _ in range(workers)]   # shard -> [ids de circuito]
+        self.loads = [0] * workers                   # shard -> pasos asignados
+
+    def __str__(self):
+        return ", ".join(f"shard{i}: {len(ids)} circuitos/{load} pasos"
+                         for i, (ids, load) in enumerate(zip(self.shards, self.loads)))
+
+
+def circuit_devices(conf):
+    devices = [step["device"] for step in conf.get("steps", [])]
+    if conf.get("control_device"):
+        devices.append(conf["control_device"])
+    return devices
+
+
+def plan_shards(circuits, workers):
+    """Reparte `circuits` en `workers` shards sin separar circuitos que comparten dispositivo."""
+    parent = {}
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    for conf in circuits:
+        devices = circuit_devices(conf)
+        for device in devices:
+            parent.setdefault(device, device)
+        for device in devices[1:]:
+            a, b = find(devices[0]), find(device)
+            if a != b:
+                parent[b] = a
+
+    groups = {}   # raíz -> ([ids], {dispositivos}, carga)
+    for conf in circuits:
+        devices = circuit_devices(conf)
+        key = find(devices[0]) if devices else ("sin dispositivos", conf["id"])
+        ids, group_devices, load = groups.get(key, ([], set(), 0))
+        ids.append(conf["id"])
+        group_devices.update(devices)
+        groups[key] = (ids, group_devices, load + max(1, len(conf.get("steps", []))))
+
+    plan = ShardPlan(workers)
+    heap = [(0, i) for i in range(workers)]
+    for ids, devices, load in sorted(groups.values(), key=lambda g: -g[2]):
+        shard_load, shard = heapq.heappop(heap)
+        plan.shards[shard].extend(ids)
+        plan.loads[shard] = shard_load + load
+        for cid in ids:
+            plan.circuit_shard[cid] = shard
+        for device in devices:
+            plan.device_shard[device] = shard
+        heapq.heappush(heap, (plan.loads[shard], shard))
+    return plan
+
+
+# ======================
+# Envío por lotes
+# ======================
+class BatchSender:
+    """
+    Hilo que manda por `conn` lo que se va encolando con put(): todo lo acumulado mientras
+    se enviaba el lote anterior sale en el siguiente (una sola serialización y llamada al sistema).
+    """
+
+    def __init__(self, conn, name):
+        self.conn = conn
+        self._items = []
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._closed = False
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, item):
+        with self._lock:
+            self._items.append(item)
+        self._ready.set()
+
+    def _run(self):
+        while True:
+            self._ready.wait()
+            self._ready.clear()
+            with self._lock:
+                items, self._items = self._items, []
+                closed = self._closed
+            if items:
+                try:
+                    self.conn.send(items)
+                except (BrokenPipeError, EOFError, OSError):
+                    return
+                self.batches += 1
+            if closed:
+                return
+
+    def close(self, timeout=2.0):
+        """Envía lo pendiente y termina el hilo."""
+        with self._lock:
+            self._closed = True
+        self._ready.set()
+        self._thread.join(timeout)
+
+
+# ======================
+# Proceso de circuitos (shard)
+# ======================
+class PipeClient:
+    """
+    Cliente MQTT del shard con la interfaz de paho que usa logic: las publicaciones se
+    mandan al frontal y las suscripciones las hace el frontal.
+    """
+
+    def __init__(self, sender):
+        self.sender = sender
+        self.userdata = None
+        self.on_connect = None
+        self.on_message = None
+        self.on_publish = None
+        self.published = 0
+
+    def connect(self, host=None, port=None, keepalive=60):
+        if self.on_connect:
+            self.on_connect(self, self.userdata, {}, 0)
+        return 0
+
+    def disconnect(self):
+        return 0
+
+    def loop_start(self):
+        return 0
+
+    def loop_stop(self):
+        return 0
+
+    def subscribe(self, topic, qos=0):
+        return (0, 0)
+
+    def unsubscribe(self, topic):
+        return (0, 0)
+
+    def publish(self, topic, payload=None, qos=0, retain=False, priority=PRIORITY_CRITICAL):
+        # Sin mid: la confirmación del broker solo la ve el frontal
+        self.sender.put(("pub", topic, payload, qos, retain, priority))
+        self.published += 1
+        return None
+
+
+def publish_to_front(client, topic, payload, qos, retain, priority):
+    """publish de la cola de salida del shard: el frontal recibe también el carril del comando."""
+    return client.publish(topic, payload, qos, retain, priority)
+
+
+def _shard_settings(index):
+    settings = {name: getattr(config, name) for name in INHERITED_SETTINGS}
+    settings["SNAPSHOT_PATH"] = f"{config.SNAPSHOT_PATH}.shard{index}"
+    settings["METRICS_EXPORT_PATH"] = f"{config.METRICS_EXPORT_PATH}.shard{index}"
+    settings["CONFIG_WATCH_INTERVAL"] = 0
+    settings["RATE_LIMIT_ENABLED"] = False   # los ecos los recibe el frontal, que es quien limita
+    settings["LIVENESS_TICK"] = 0            # solo el frontal ve todos los mensajes de cada dispositivo
+    return settings
+
+
+def _shard_payload(index, plan, active):
+    """Lo que necesita el shard `index` para montar su configuración en un proceso nuevo."""
+    ids = set(plan.shards[index])
+    circuits = [conf for conf in config.registry.definitions() if conf["id"] in ids]
+    devices = {name: config.DEVICES_CONFIG[name]
+               for name, shard in plan.device_shard.items()
+               if shard == index and name in config.DEVICES_CONFIG}
+    return {
+        "settings": _shard_settings(index),
+        "devices": devices,
+        "circuits": circuits,
+        "active": [cid for cid in active if cid in ids],
+    }
+
+
+def worker_main(index, payload, inbox, outbox):
+    """Punto de entrada del proceso del shard `index`."""
+    for name, value in payload["settings"].items():
+        setattr(config, name, value)
+    for entry in payload["devices"].values():
+        config.install_device_config(entry)
+    config.CIRCUITS[:] = payload["circuits"]
+    config.registry.load(config.CIRCUITS, config.DEVICES_CONFIG)
+    rockfit_logging.setup(
+        level=config.LOG_LEVEL,
+        log_dir=config.LOG_DIR,
+        filename=f"rockfit.shard{index}.log",
+        console=False,
+        max_bytes=config.LOG_MAX_BYTES,
+        backup_count=config.LOG_BACKUP_COUNT,
+        sampling=config.LOG_SAMPLING,
+    )
+
+    import logic   # después de ajustar config: logic lee parte de ella al importarse
+
+    sender = BatchSender(outbox, f"shard{index}-out")
+    client = PipeClient(sender)
+    received = 0
+
+    def reply_stats():
+        # Se ejecuta en el hilo del motor, detrás de todo lo encolado antes: sirve de barrera
+        sender.put(("stats", index, {
+            "circuits": len(logic.circuits),
+            "received": received,
+            "published": client.published,
+            "engine": logic.engine.stats(),
+            "shadow": logic.shadow.stats(),
+        }))
+
+    # Los cosméticos tienen que seguir siéndolo en la cola del frontal (se descartan con presión)
+    logic.outbox.publish = publish_to_front
+    logic.main(payload["active"], client)
+    log.info("Shard %d listo: %d circuitos, %d activos.", index, len(config.CIRCUITS), len(payload["active"]))
+    try:
+        while True:
+            try:
+                batch = inbox.recv()
+            except EOFError:
+                break
+            for item in batch:
+                kind = item[0]
+                if kind == "msg":
+                    received += 1
+                    logic.engine.submit(logic.handle_message, *item[1:], block=True)
+                elif kind == "active":
+                    logic.submit(logic.apply_active_circuits, item[1])
+                elif kind == "stats":
+                    logic.submit(reply_stats)
+                elif kind == "stop":
+                    return
+    finally:
+        logic.engine.stop()
+        logic.save_snapshot_at_exit()
+        logic.flush_results()
+        sender.close()
+        rockfit_logging.shutdown()
+
+
+# ======================
+# Proceso frontal
+# ======================
+class ShardedEngine:
+    def __init__(self, workers=None, client=None, start_method=None):
+        self.workers = workers or config.SHARD_WORKERS
+        self.start_method = start_method or config.SHARD_START_METHOD
+        self.client = client
+        self.plan = None
+        self._senders = []
+        self._outboxes = []
+        self._processes = []
+        self._pump = None
+        self._stats = {}
+        self._stats_cond = threading.Condition()
+        ratelimit.limiter.configure(
+            min_rate=config.RATE_LIMIT_MIN,
+            max_rate=config.RATE_LIMIT_MAX,
+            burst=config.RATE_LIMIT_BURST,
+            window=config.RATE_LIMIT_WINDOW,
+            headroom=config.RATE_LIMIT_HEADROOM,
+        )
+        # La rueda de dispositivos vivos avanza en _pump_outbound cada LIVENESS_TICK s
+        liveness.tracker.configure(
+            stale_after=config.LIVENESS_STALE_AFTER,
+            probe_timeout=config.LIVENESS_PROBE_TIMEOUT,
+            wheel_tick=config.LIVENESS_TICK or 1.0,
+        )
+        # Los shards ya publican solo lo que cambia; aquí se acota lo que espera al broker.
+        # El frontal no tiene motor: un planificador propio saca los comandos aparcados
+        self.scheduler = Scheduler("rockfit-front-scheduler")
+        self.outbox = OutboundQueue(
+            max_pending=config.OUTBOUND_MAX_PENDING,
+            max_inflight=config.OUTBOUND_MAX_INFLIGHT,
+            ack_timeout=config.OUTBOUND_ACK_TIMEOUT,
+            limiter=ratelimit.limiter if config.RATE_LIMIT_ENABLED else None,
+            schedule=self.scheduler.call_later,
+        )
+        # Los ecos de estado llegan al frontal: su espejo alimenta al limitador
+        device_mirror.mirror.configure(expect_timeout=config.MIRROR_EXPECT_TIMEOUT)
+        if config.RATE_LIMIT_ENABLED:
+            device_mirror.mirror.subscribe(self._on_echo, echoes=True)
+        self.routed = 0
+        self.unrouted = 0
+        self.published = 0
+
+    def start(self, active_circuits, connect=True):
+        """Arranca los shards con `active_circuits` y, con connect=True, la conexión MQTT."""
+        self.plan = plan_shards(config.registry.definitions(), self.workers)
+        log.info("Reparto de %d circuitos en %d shards: %s", len(config.registry), self.workers, self.plan)
+        ctx = multiprocessing.get_context(self.start_method)
+        for index in range(self.workers):
+            inbox_r, inbox_w = ctx.Pipe(duplex=False)
+            outbox_r, outbox_w = ctx.Pipe(duplex=False)
+            process = ctx.Process(
+                target=worker_main,
+                args=(index, _shard_payload(index, self.plan, active_circuits), inbox_r, outbox_w),
+                name=f"rockfit-shard{index}",
+                daemon=True,
+            )
+            process.start()
+            inbox_r.close()
+            outbox_w.close()
+            self._processes.append(process)
+            self._senders.append(BatchSender(inbox_w, f"shard{index}-in"))
+            self._outboxes.append(outbox_r)
+        if config.LIVENESS_TICK:
+            liveness.tracker.watch(config.DEVICES_CONFIG)
+        self._pump = threading.Thread(target=self._pump_outbound, name="shards-out", daemon=True)
+        self._pump.start()
+        if connect:
+            self._connect()
+        return self
+
+    def _connect(self):
+        if self.client is None:
+            self.client = mqtt.Client()
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.on_publish = self.on_publish
+        self.client.connect(config.MQTT_BROKER, config.MQTT_PORT, 60)
+        self.client.loop_start()
+
+    def on_connect(self, client, userdata, flags, rc, *args):
+        topics = sorted(topic for topic, (device, _) in config.EVENT_TOPICS.items()
+                        if device in self.plan.device_shard)
+        for topic in topics:
+            client.subscribe(topic)
+        device_mirror.mirror.subscribe_mqtt(client)
+        liveness.tracker.subscribe_mqtt(client)
+        self.outbox.reset_inflight()
+        log.info("Frontal conectado (código %s); suscrito a %d tópicos.", rc, len(topics))
+
+    def on_publish(self, client, userdata, mid, *args):
+        self.outbox.acked(mid)
+
+    def on_message(self, client, userdata, msg):
+        self.route(msg.topic, msg.payload)
+
+    def _on_echo(self, record, previous):
+        ratelimit.limiter.echo(record.topic, record.last_seen)
+
+    def route(self, topic, payload, received_at=None):
+        """Manda el mensaje al shard de su dispositivo. False si ningún circuito lo usa."""
+        liveness.tracker.seen_topic(topic, payload)
+        if liveness.is_status(topic):
+            return False
+        if device_mirror.is_light_state(topic):
+            device_mirror.mirror.handle(topic, payload)
+            return False
+        event = config.EVENT_TOPICS.get(topic)
+        shard = self.plan.device_shard.get(event[0]) if event is not None else None
+        if shard is None:
+            self.unrouted += 1
+            return False
+        if received_at is None:
+            received_at = time.monotonic()
+        self._senders[shard].put(("msg", topic, payload, received_at, time.perf_counter_ns()))
+        self.routed += 1
+        return True
+
+    def _pump_outbound(self):
+        """Publica los comandos de LED que devuelven los shards y recoge sus estadísticas."""
+        conns = list(self._outboxes)
+        while conns:
+            # La rueda de dispositivos vivos avanza aquí: el frontal no tiene planificador
+            ready = wait(conns, config.LIVENESS_TICK or None)
+            liveness.tracker.tick()
+            for conn in ready:
+                try:
+                    batch = conn.recv()
+                except (EOFError, OSError):
+                    conns.remove(conn)
+                    continue
+                for item in batch:
+                    if item[0] == "pub":
+                        # No se filtran los dispositivos sin conexión: aquí no se sabe si es un
+                        # comando forzado; los shards no tienen seguimiento de vida
+                        if self.client is not None:
+                            topic, payload, qos, retain, priority = item[1:]
+                            self.outbox.put(topic, payload, priority, client=self.client, qos=qos, retain=retain)
+                        self.published += 1
+                    elif item[0] == "stats":
+                        with self._stats_cond:
+                            self._stats[item[1]] = item[2]
+                            self._stats_cond.notify_all()
+
+    def set_active(self, active_circuits):
+        """Cambia los circuitos activos; cada shard recibe los suyos."""
+        for index, sender in enumerate(self._senders):
+            ids = set(self.plan.shards[index])
+            sender.put(("active", [cid for cid in active_circuits if cid in ids]))
+
+    def stats(self, timeout=5.0):
+        """
+        Estadísticas del frontal y de cada shard. Cada shard responde después de procesar
+        todo lo que se le mandó antes, así que también sirve para esperar a que se vacíen.
+        """
+        with self._stats_cond:
+            self._stats.clear()
+        for sender in self._senders:
+            sender.put(("stats",))
+        deadline = time.monotonic() + timeout
+        with self._stats_cond:
+            while len(self._stats) < self.workers:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._stats_cond.wait(remaining)
+            shards = [self._stats.get(i) for i in range(self.workers)]
+        return {
+            "workers": self.workers,
+            "routed": self.routed,
+            "unrouted": self.unrouted,
+            "published": self.published,
+            "outbound": self.outbox.stats(),
+            "liveness": liveness.tracker.stats(),
+            "shards": shards,
+        }
+
+    def stop(self, timeout=5.0):
+        """Detiene los shards (guardan instantánea y resultados) y la conexión MQTT."""
+        device_mirror.mirror.unsubscribe(self._on_echo)
+        for sender in self._senders:
+            sender.put(("stop",))
+            sender.close()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                log.warning("El shard %s no terminó a tiempo; se fuerza la salida.", process.name)
+                process.terminate()
+        if self._pump is not None:
+            self._pump.join(timeout)
+        self.scheduler.stop()
+        if self.client is not None and hasattr(self.client, "loop_stop"):
+            self.client.loop_stop()
+            self.client.disconnect()
+
+
+# Motor en marcha en este proceso (GUI)
+current = None
+
+
+def start(active_circuits, workers=None, client=None):
+    """Arranca el modo multiproceso y lo deja en `current`."""
+    global current
+    current = ShardedEngine(workers, client).start(active_circuits)
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Motor de circuitos repartido en varios procesos")
+    parser.add_argument("circuits", nargs="*", default=["circuito_2"])
+    parser.add_argument("--workers", type=int, default=config.SHARD_WORKERS)
+    args = parser.parse_args()
+    rockfit_logging.setup_from_config(config)
+    engine = start(args.circuits, args.workers)
+    try:
+        while True:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        logging.info("Deteniendo shards...")
+        engine.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+test_results_store.py
+---------------------
+Usuarios asignados a un resultado después de completarse (la GUI los cambia más tarde):
+tienen que llegar a result_users para que la consulta por usuario lo encuentre.
+
+    python -m unittest test_results_store   (desde SentToPCRockfit)
+"""
+
+import os
+import tempfile
+import time
+import unittest
+
+from results_store import ResultsStore
+
+
+def _result(instance_id, users=()):
+    return {
+        "instance_id": instance_id,
+        "circuit_id": "circuito_1",
+        "name": "Circuito 1",
+        "finished_at": time.time(),
+        "total_time": 12.5,
+        "final_color": None,
+        "timestamps": [],
+        "assigned_users": list(users),
+    }
+
+
+class SetUsersTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = ResultsStore(os.path.join(self.tmp.name, "results.db"), batch_size=20)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_user_assigned_after_completion_is_queryable(self):
+        self.store.add(_result(7))
+        self.assertEqual(self.store.query(user="ana"), [])
+
+        self.assertTrue(self.store.set_users(7, ["ana"]))
+
+        found = self.store.query(user="ana")
+        self.assertEqual([r["instance_id"] for r in found], ["7"])
+        self.assertEqual(found[0]["assigned_users"], ["ana"])
+
+    def test_set_users_replaces_previous_assignment(self):
+        self.store.add(_result(3, ["ana"]))
+        self.store.set_users(3, ["luis"])
+        self.assertEqual(self.store.query(user="ana"), [])
+        self.assertEqual(self.store.query(user="luis")[0]["assigned_users"], ["luis"])
+
+    def test_unknown_instance(self):
+        self.assertFalse(self.store.set_users(99, ["ana"]))
+
+
+class AssignResultUsersTest(unittest.TestCase):
+    def test_engine_assignment_reaches_store(self):
+        import config
+        import logic
+
+        with tempfile.TemporaryDirectory() as tmp:
+            config.RESULTS_DB_PATH = os.path.join(tmp, "results.db")
+            logic.results_store = None
+            try:
+                result = _result(42)
+                logic.record_result(result)
+                logic.assign_result_users(result, ["marta"])
+                self.assertEqual(result["assigned_users"], ["marta"])
+                found = logic.query_results(user="marta")
+                self.assertEqual([r["instance_id"] for r in found], ["42"])
+            finally:
+                logic.results_store.close()
+                logic.results_store = None
+
+
+if __name__ == "__main__":
+    unittest.main()
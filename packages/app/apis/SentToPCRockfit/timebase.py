@@ -0,0 +1,55 @@
+"""
+timebase.py
+-----------
+Base de tiempos del motor: los eventos se marcan con time.monotonic_ns() (entero, inmune a
+saltos de NTP) y un único ancla de reloj de pared por sesión permite convertirlos a fecha.
+El formateo a texto solo se hace cuando la GUI o una exportación lo piden.
+"""
+
+import datetime
+import time
+
+# Ancla de la sesión: mismo instante en reloj de pared y en reloj monotónico
+SESSION_WALL_NS = time.time_ns()
+SESSION_MONO_NS = time.monotonic_ns()
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+now_ns = time.monotonic_ns
+
+
+def to_wall(mono_ns):
+    """Instante monotónico (ns) -> segundos epoch, según el ancla de la sesión."""
+    return (SESSION_WALL_NS + (mono_ns - SESSION_MONO_NS)) / 1e9
+
+
+def to_wall_ns(mono_ns):
+    """Instante monotónico (ns) -> ns epoch (para guardarlo fuera del proceso)."""
+    return SESSION_WALL_NS + (mono_ns - SESSION_MONO_NS)
+
+
+def from_wall_ns(wall_ns):
+    """ns epoch -> instante monotónico de esta sesión (inverso de to_wall_ns)."""
+    return SESSION_MONO_NS + (wall_ns - SESSION_WALL_NS)
+
+
+def format_ts(value):
+    """
+    Texto "YYYY-MM-DD HH:MM:SS.mmm" para un instante monotónico en ns.
+    Los valores que ya son texto (resultados guardados en el almacén) se devuelven tal cual.
+    """
+    if isinstance(value, str):
+        return value
+    return datetime.datetime.fromtimestamp(to_wall(value)).strftime(TS_FORMAT)[:-3]
+
+
+def elapsed_s(start_ns, end_ns=None):
+    """Segundos entre start_ns y end_ns (por defecto, ahora)."""
+    if end_ns is None:
+        end_ns = time.monotonic_ns()
+    return (end_ns - start_ns) / 1e9
+
+
+def format_events(timestamps):
+    """Copia de una lista de eventos (evento, dispositivo, ns) con el instante ya formateado."""
+    return [(event, device, format_ts(ts)) for event, device, ts in timestamps]
@@ -0,0 +1,125 @@
+"""
+traffic_recorder.py
+-------------------
+Grabador del tráfico MQTT del gimnasio: cada tap / double_tap / loadcell entrante y cada
+comando LED saliente, con su instante, en un fichero JSONL comprimido con gzip.
+La sesión grabada se reproduce contra el motor con benchmarks/replay.py.
+
+Formato: la primera línea es la cabecera
+    {"version": 1, "started_at": <epoch s>, "circuits": [...]}
+y cada línea siguiente un mensaje
+    [<ns desde el inicio>, "in" | "out", <tópico>, <payload como texto>]
+
+Uso (desde SentToPCRockfit):
+    python traffic_recorder.py sesion.jsonl.gz --duration 600 --circuits circuito_2
+"""
+
+import argparse
+import gzip
+import json
+import threading
+import time
+
+import config
+
+FORMAT_VERSION = 1
+DIRECTION_IN = "in"
+DIRECTION_OUT = "out"
+
+
+def record_topics():
+    """(tópicos entrantes, tópicos salientes) de todos los dispositivos de config."""
+    inbound, outbound = set(), set()
+    for dev in config.DEVICES_CONFIG.values():
+        for key in ("tap_topic", "double_tap_topic", "loadcell_topic"):
+            if dev.get(key):
+                inbound.add(dev[key])
+        if dev.get("light_command_topic"):
+            outbound.add(dev["light_command_topic"])
+    return inbound, outbound
+
+
+class TrafficRecorder:
+    """Se suscribe a los tópicos de config y escribe cada mensaje en `path`."""
+
+    def __init__(self, path, circuits=()):
+        self.path = path
+        self.circuits = list(circuits)
+        self.inbound, self.outbound = record_topics()
+        self.count = {DIRECTION_IN: 0, DIRECTION_OUT: 0}
+        self._file = None
+        self._lock = threading.Lock()
+        self._t0 = None
+
+    def start(self, client):
+        self._file = gzip.open(self.path, "wt", encoding="utf-8")
+        self._t0 = time.monotonic_ns()
+        header = {"version": FORMAT_VERSION, "started_at": time.time(), "circuits": self.circuits}
+        self._file.write(json.dumps(header) + "\n")
+        client.on_connect = self.on_connect
+        client.on_message = self.on_message
+
+    def on_connect(self, client, userdata, flags, rc, *args):
+        for topic in sorted(self.inbound | self.outbound):
+            client.subscribe(topic)
+
+    def on_message(self, client, userdata, msg):
+        offset = time.monotonic_ns() - self._t0
+        direction = DIRECTION_OUT if msg.topic in self.outbound else DIRECTION_IN
+        payload = msg.payload.decode("utf-8", errors="replace")
+        line = json.dumps([offset, direction, msg.topic, payload], separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self.count[direction] += 1
+
+    def stop(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_recording(path):
+    """Devuelve (cabecera, [(ns, dirección, tópico, payload bytes), ...]) en orden de grabación."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Versión de grabación no soportada: {header.get('version')}")
+        messages = []
+        for line in f:
+            if line.strip():
+                offset, direction, topic, payload = json.loads(line)
+                messages.append((offset, direction, topic, payload.encode("utf-8")))
+    return header, messages
+
+
+def main():
+    import paho.mqtt.client as mqtt
+
+    parser = argparse.ArgumentParser(description="Graba el tráfico MQTT de taps, loadcells y comandos LED")
+    parser.add_argument("path", help="fichero de salida (.jsonl.gz)")
+    parser.add_argument("--duration", type=float, default=0, help="segundos de grabación (0 = hasta Ctrl+C)")
+    parser.add_argument("--circuits", nargs="*", default=[], help="circuitos activos durante la sesión")
+    args = parser.parse_args()
+
+    recorder = TrafficRecorder(args.path, args.circuits)
+    client = mqtt.Client()
+    recorder.start(client)
+    client.connect(config.MQTT_BROKER, config.MQTT_PORT, 60)
+    client.loop_start()
+    print(f"Grabando en {args.path} ({len(recorder.inbound)} tópicos entrantes, {len(recorder.outbound)} salientes)")
+    try:
+        end = time.monotonic() + args.duration if args.duration else None
+        while end is None or time.monotonic() < end:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    client.loop_stop()
+    recorder.stop()
+    print(f"Grabados {recorder.count[DIRECTION_IN]} mensajes entrantes y {recorder.count[DIRECTION_OUT]} salientes.")
+
+
+if __name__ == "__main__":
+    main()
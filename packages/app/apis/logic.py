@@ -21,11 +21,15 @@ import json
 import time
 import logging
 import datetime
-import threading
+import os
+import sys
 
 import config_base
 import config_params
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "SentToPCRockfit"))
+from scheduler import Scheduler  # noqa: E402
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s [%(levelname)s] %(message)s',
@@ -37,6 +41,9 @@ STATE_READY       = "ready"
 STATE_IN_PROGRESS = "in_progress"
 STATE_COMPLETED   = "completed"
 
+# Un único hilo para las acciones diferidas (pulso tras el encendido, reinicio tras completar)
+scheduler = Scheduler("legacy-scheduler")
+
 class Circuit:
     def __init__(self, name, game_number, user_color, client):
         self.name = name
@@ -138,7 +145,7 @@ class Circuit:
                     logging.info(f"[{self.name}] Usuario reasignado, nuevo color: {self.user_color}.")
                 self.turn_off_led(device)
                 self.update_led(device, 100)
-                threading.Timer(0.01, lambda: self.update_led_effect(device, "Fast Pulse")).start()
+                scheduler.call_later(0.01, self.update_led_effect, device, "Fast Pulse", owner=self)
                 logging.info(f"[{self.name}] Espera DOUBLE TAP para iniciar.")
             else:
                 logging.info(f"[{self.name}] TAP en {device} ignorado en estado {self.state}.")
@@ -152,7 +159,7 @@ class Circuit:
                     if self.current_index >= len(self.sequence):
                         self.state = STATE_COMPLETED
                         logging.info(f"[{self.name}] Secuencia COMPLETADA.")
-                        threading.Timer(0.5, self.reset_and_activate_ready).start()
+                        scheduler.call_later(0.5, self.reset_and_activate_ready, owner=self)
                 else:
                     logging.info(f"[{self.name}] TAP en {device} pero no es el pulsador esperado ({expected_device}).")
             else:
@@ -0,0 +1,40 @@
+"""
+rockfit_devices.py
+------------------
+Blueprint de Flask con el estado de los dispositivos que ve el motor (SentToPCRockfit):
+si siguen vivos (liveness.py) y qué muestra su LED según su último eco (device_mirror.py),
+leído de la última exportación a disco (config.LIVENESS_EXPORT_PATH).
+
+GET /pyapi/v1/rockfit/devices           -> JSON con todos los dispositivos
+GET /pyapi/v1/rockfit/devices/offline   -> JSON con los que están sin conexión
+"""
+
+import json
+
+from flask import Blueprint, Response
+
+from .SentToPCRockfit.liveness import OFFLINE, load
+
+rockfit_devices = Blueprint("rockfit_devices", __name__)
+
+
+def _not_exported():
+    return Response(json.dumps({"error": "El motor aún no ha exportado el estado de los dispositivos."}),
+                    status=404, mimetype="application/json")
+
+
+@rockfit_devices.route('/pyapi/v1/rockfit/devices')
+def devices_json():
+    snap = load()
+    if snap is None:
+        return _not_exported()
+    return Response(json.dumps(snap), mimetype="application/json")
+
+
+@rockfit_devices.route('/pyapi/v1/rockfit/devices/offline')
+def devices_offline():
+    snap = load()
+    if snap is None:
+        return _not_exported()
+    offline = sorted(name for name, entry in snap["devices"].items() if entry["state"] == OFFLINE)
+    return Response(json.dumps({"ts": snap["ts"], "offline": offline}), mimetype="application/json")
@@ -0,0 +1,34 @@
+"""
+rockfit_metrics.py
+------------------
+Blueprint de Flask con los histogramas de latencia por etapa del motor (SentToPCRockfit),
+leídos de la última instantánea que el motor exporta a disco (config.METRICS_EXPORT_PATH).
+
+GET /pyapi/v1/rockfit/metrics             -> JSON
+GET /pyapi/v1/rockfit/metrics/prometheus  -> formato de texto de Prometheus
+"""
+
+import json
+
+from flask import Blueprint, Response
+
+from .SentToPCRockfit.metrics import load, render_prometheus
+
+rockfit_metrics = Blueprint("rockfit_metrics", __name__)
+
+
+@rockfit_metrics.route('/pyapi/v1/rockfit/metrics')
+def metrics_json():
+    snap = load()
+    if snap is None:
+        return Response(json.dumps({"error": "El motor aún no ha exportado métricas."}),
+                        status=404, mimetype="application/json")
+    return Response(json.dumps(snap), mimetype="application/json")
+
+
+@rockfit_metrics.route('/pyapi/v1/rockfit/metrics/prometheus')
+def metrics_prometheus():
+    snap = load()
+    if snap is None:
+        return Response("# El motor aún no ha exportado métricas.\n", status=404, mimetype="text/plain")
+    return Response(render_prometheus(snap), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,36 @@
+"""
+rockfit_results.py
+------------------
+Blueprint de Flask para consultar los resultados de circuitos que el motor
+(SentToPCRockfit) ha guardado en su almacén SQLite.
+
+GET /pyapi/v1/rockfit/results?circuit_id=...&user=...&day=YYYY-MM-DD&limit=100
+"""
+
+import json
+
+from flask import Blueprint, Response, request
+
+from .SentToPCRockfit.results_store import ResultsStore
+
+rockfit_results = Blueprint("rockfit_results", __name__)
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = ResultsStore()
+    return _store
+
+
+@rockfit_results.route('/pyapi/v1/rockfit/results')
+def list_results():
+    results = get_store().query(
+        circuit_id=request.args.get("circuit_id"),
+        user=request.args.get("user"),
+        day=request.args.get("day"),
+        limit=request.args.get("limit", 100, type=int),
+    )
+    return Response(json.dumps(results), mimetype="application/json")
@@ -13,12 +13,21 @@ La detección de carga permanece igual.
 
 import json
 import logging
+import os
+import sys
 import threading
-import time
 from collections import defaultdict
 
 import paho.mqtt.client as mqtt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "SentToPCRockfit"))
+import animation  # noqa: E402
+import rockfit_logging  # noqa: E402
+from outbound import OutboundQueue  # noqa: E402
+from device_mirror import command_topic_for, is_light_state  # noqa: E402
+from ratelimit import RateLimiter  # noqa: E402
+from scheduler import Scheduler  # noqa: E402
+
 # --------------------------------------------------------------------------- #
 # Configuración
 # --------------------------------------------------------------------------- #
@@ -28,19 +37,25 @@ TILES  = [f"tile{i}" for i in range(1, 19)]     # tile1 … tile18
 
 THRESHOLDS = defaultdict(lambda: 500)
 STEP_DELAY = 0.20
+ANIMATION_FPS = 20
+MAX_INFLIGHT = 18     # publicaciones qos=1 sin PUBACK; el resto espera en la cola de salida
+MAX_BACKLOG  = 100    # comandos en cola + sin PUBACK a partir de los que se descartan fotogramas
 
 SPECIAL_GREEN = {"tile1", "tile3", "tile8", "tile14", "tile18"}
 
 # --------------------------------------------------------------------------- #
-# Paleta
+# Paleta (serializada una sola vez: se publica directamente como bytes)
 # --------------------------------------------------------------------------- #
-RED       = {"state": "ON", "brightness": 255, "color": {"r": 255, "g":   0, "b":   0}}
-YELLOW    = {"state": "ON", "brightness": 255, "color": {"r": 255, "g": 255, "b":   0}}
-GREEN     = {"state": "ON", "brightness": 255, "color": {"r":   0, "g": 255, "b":   0}}
-OFF       = {"state": "OFF"}
+def _payload(cmd: dict) -> bytes:
+    return json.dumps(cmd, separators=(",", ":")).encode("utf-8")
+
+RED       = _payload({"state": "ON", "brightness": 255, "color": {"r": 255, "g":   0, "b":   0}})
+YELLOW    = _payload({"state": "ON", "brightness": 255, "color": {"r": 255, "g": 255, "b":   0}})
+GREEN     = _payload({"state": "ON", "brightness": 255, "color": {"r":   0, "g": 255, "b":   0}})
+OFF       = _payload({"state": "OFF"})
 
-RED_DIM   = {"state": "ON", "brightness": 128, "color": {"r": 255, "g": 0, "b": 0}}
-WHITE_DIM = {"state": "ON", "brightness": 32,  "color": {"r": 255, "g": 255, "b": 255}}
+RED_DIM   = _payload({"state": "ON", "brightness": 128, "color": {"r": 255, "g": 0, "b": 0}})
+WHITE_DIM = _payload({"state": "ON", "brightness": 32,  "color": {"r": 255, "g": 255, "b": 255}})
 
 # --------------------------------------------------------------------------- #
 # Estado
@@ -50,53 +65,62 @@ tare         = {t: None   for t in TILES}
 last_value   = {t: None   for t in TILES}
 samples_left = {t: 10     for t in TILES}
 loaded_tiles = set()
+limiter      = RateLimiter()   # ritmo por baldosa según su latencia de eco
+scheduler    = Scheduler("tiles-scheduler")   # saca los comandos aparcados por el limitador
+outbox       = OutboundQueue(max_inflight=MAX_INFLIGHT, limiter=limiter, schedule=scheduler.call_later)
 
 # --------------------------------------------------------------------------- #
 # Logger
 # --------------------------------------------------------------------------- #
-logging.basicConfig(
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    level=logging.INFO,
-)
-log = logging.getLogger("tiles")
+# Cola + logs/tiles.log rotativo; las llamadas usan argumentos %-style (formateo diferido)
+rockfit_logging.setup(logging.INFO, filename="tiles.log")
+log = rockfit_logging.get_logger("tiles")
 
 # --------------------------------------------------------------------------- #
 # Utilidades MQTT
 # --------------------------------------------------------------------------- #
-def mqtt_pub(client: mqtt.Client, tile: str, payload: dict):
-    client.publish(f"devices/{tile}/light/leds/command",
-                   json.dumps(payload), qos=1)
+def light_topic(tile: str) -> str:
+    return f"devices/{tile}/light/leds/command"
 
-def sequential_show(client: mqtt.Client, payload: dict, delay: float):
-    for tile in TILES:
-        mqtt_pub(client, tile, payload)
-        time.sleep(delay)
+def mqtt_pub(client: mqtt.Client, tile: str, payload: bytes):
+    publish_topic(client, light_topic(tile), payload)
 
-def all_show(client: mqtt.Client, payload: dict):
-    for tile in TILES:
-        mqtt_pub(client, tile, payload)
+def publish_topic(client: mqtt.Client, topic: str, payload: bytes):
+    outbox.put(topic, payload, client=client, qos=1)
 
-def red_green_mix(client: mqtt.Client):
-    """Todas rojo tenue salvo las SPECIAL_GREEN en verde brillante."""
-    for tile in TILES:
-        mqtt_pub(client, tile, GREEN if tile in SPECIAL_GREEN else RED_DIM)
+def make_renderer(client: mqtt.Client) -> animation.Renderer:
+    """Renderer con hilo propio: como mucho un comando por baldosa y fotograma."""
+    return animation.Renderer(
+        publish=lambda topic, payload: publish_topic(client, topic, payload),
+        fps=ANIMATION_FPS,
+        backlog=outbox.backlog,
+        max_backlog=MAX_BACKLOG,
+    )
+
+renderer = None
 
 # --------------------------------------------------------------------------- #
 # Callbacks MQTT
 # --------------------------------------------------------------------------- #
 def on_connect(client, userdata, flags, rc, *_):
     if rc:
-        log.error(f"Error de conexión (rc={rc})"); return
-    log.info(f"Conectado a {BROKER}:{PORT}")
+        log.error("Error de conexión (rc=%s)", rc); return
+    log.info("Conectado a %s:%s", BROKER, PORT)
 
     for tile in TILES:
         client.subscribe(f"devices/{tile}/sensor/loadcell/state", qos=1)
+        client.subscribe(f"devices/{tile}/light/leds/state", qos=0)
     log.info("Suscrito a todos los loadcells")
 
-    threading.Thread(target=startup_animation,
-                     args=(client,), daemon=True).start()
+    startup_animation()
+
+def on_publish(client, userdata, mid, *_):
+    outbox.acked(mid)
 
 def on_message(client, userdata, msg):
+    if is_light_state(msg.topic):
+        limiter.echo(command_topic_for(msg.topic))
+        return
     tile = msg.topic.split("/")[1]
     try:
         raw = int(msg.payload.decode())
@@ -110,7 +134,7 @@ def on_message(client, userdata, msg):
         if samples_left[tile] == 0:
             tare[tile] //= 10
             state[tile] = "armed"
-            log.info(f"{tile}  Tara={tare[tile]}")
+            log.info("%s  Tara=%s", tile, tare[tile])
         return
 
     delta = raw - tare[tile]
@@ -119,48 +143,45 @@ def on_message(client, userdata, msg):
         loaded_tiles.add(tile)
         state[tile] = "loaded"
         mqtt_pub(client, tile, GREEN)
-        log.info(f"{tile}  **LOAD**  delta={delta}")
+        log.info("%s  **LOAD**  delta=%d", tile, delta)
         if len(loaded_tiles) == len(TILES):
             log.info("Todas las baldosas cargadas → parpadeo final")
-            blink_all(client, GREEN, 0.25, 3)
-            all_show(client, OFF)
-            threading.Timer(0.5, client.disconnect).start()
+            blink_all(GREEN, 0.25, 3, on_done=lambda: threading.Timer(0.5, client.disconnect).start())
 
 # --------------------------------------------------------------------------- #
 # Animaciones
 # --------------------------------------------------------------------------- #
-def startup_animation(client: mqtt.Client):
-    """RGB secuencial → 5 s rojo/verde → 20 s blanco tenue → apagado"""
+ALL = [light_topic(t) for t in TILES]
+
+def startup_clip() -> animation.Clip:
+    """RGB secuencial → 5 s rojo/verde → 20 s blanco tenue → apagado"""
+    clip = animation.chase(ALL, RED, STEP_DELAY)                     # Fase 1 – RGB secuencial
+    clip = clip.then(animation.chase(ALL, YELLOW, STEP_DELAY))
+    clip = clip.then(animation.chase(ALL, GREEN, STEP_DELAY))
+    clip = clip.then(animation.mix(                                   # Fase 2 – rojo tenue + verdes (5 s)
+        {light_topic(t): GREEN if t in SPECIAL_GREEN else RED_DIM for t in TILES}, 5))
+    clip = clip.then(animation.hold(ALL, WHITE_DIM, 20))              # Fase 3 – blanco tenue (20 s)
+    return clip.then(animation.hold(ALL, OFF), name="startup")        # Fase 4 – apagado
+
+def startup_animation():
     log.info(">> Animación de arranque")
+    renderer.play(startup_clip(), on_done=lambda: log.info(">> Animación completada; sistema ARMADO"))
 
-    # Fase 1 – RGB secuencial
-    for payload in (RED, YELLOW, GREEN):
-        sequential_show(client, payload, STEP_DELAY)
-
-    # Fase 2 – rojo tenue + verdes especiales (5 s)
-    red_green_mix(client)
-    time.sleep(5)
-
-    # Fase 3 – blanco tenue (20 s)
-    all_show(client, WHITE_DIM)
-    time.sleep(20)
-
-    # Fase 4 – apagado
-    all_show(client, OFF)
-    log.info(">> Animación completada; sistema ARMADO")
-
-def blink_all(client: mqtt.Client, payload_on: dict, delay: float, times: int):
-    for _ in range(times):
-        all_show(client, payload_on); time.sleep(delay)
-        all_show(client, OFF);       time.sleep(delay)
+def blink_all(payload_on: bytes, delay: float, times: int, on_done=None):
+    """`times` parpadeos de todas las baldosas; terminan apagadas."""
+    renderer.play(animation.blink(ALL, payload_on, OFF, delay, times, name="blink_all"), on_done=on_done)
 
 # --------------------------------------------------------------------------- #
 def main():
     client = mqtt.Client()           # añade callback_api_version=5 si tu Paho 2.x lo requiere
     client.on_connect = on_connect
     client.on_message = on_message
+    client.on_publish = on_publish
     client.enable_logger(log)
 
+    global renderer
+    renderer = make_renderer(client)
+
     client.connect(BROKER, PORT, keepalive=60)
     client.loop_forever()
 
@@ -9,11 +9,20 @@ Calibración rápida de tile4‑tile6 con lectura a la máxima velocidad posible
 
 import json
 import logging
+import os
+import sys
 import time
 from collections import defaultdict
 
 import paho.mqtt.client as mqtt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "SentToPCRockfit"))
+import rockfit_logging  # noqa: E402
+from outbound import OutboundQueue  # noqa: E402
+from device_mirror import command_topic_for, is_light_state  # noqa: E402
+from ratelimit import RateLimiter  # noqa: E402
+from scheduler import Scheduler  # noqa: E402
+
 # --------------------------------------------------------------------------- #
 # Configuración
 # --------------------------------------------------------------------------- #
@@ -24,6 +33,11 @@ TILES  = ["tile4", "tile5", "tile6"]
 # Tara en 5 muestras para reaccionar antes
 N_TARE_SAMPLES = 5
 
+# Comandos de LED sin confirmar como máximo; a 80 Hz por baldosa el resto espera en una cola
+# donde cada muestra nueva sustituye a la anterior aún no enviada de esa baldosa.
+# Además cada baldosa recibe comandos al ritmo que marca su latencia de eco (ratelimit.py)
+MAX_INFLIGHT = 6
+
 # Conversión counts → brillo (ajusta a tu rango)
 COUNTS_FULL_SCALE = 4000        # counts ≈ brillo 255
 CHANGE_THRESHOLD  = 1           # 1 count: máximo detalle
@@ -33,6 +47,7 @@ CHANGE_THRESHOLD  = 1           # 1 count: máximo detalle
 # --------------------------------------------------------------------------- #
 LOADCELL_T = "devices/{tile}/sensor/loadcell/state"
 LED_CMD_T  = "devices/{tile}/light/leds/command"
+LED_STATE_T = "devices/{tile}/light/leds/state"
 
 def blue(brightness: int) -> dict:
     return {"state": "OFF"} if brightness <= 0 else {
@@ -47,26 +62,39 @@ def blue(brightness: int) -> dict:
 tare         = {t: None for t in TILES}
 samples_left = {t: N_TARE_SAMPLES for t in TILES}
 last_delta   = defaultdict(lambda: None)
+limiter      = RateLimiter()
+scheduler    = Scheduler("calib-scheduler")   # saca los comandos aparcados por el limitador
+outbox       = OutboundQueue(max_pending=len(TILES), max_inflight=MAX_INFLIGHT, limiter=limiter,
+                             schedule=scheduler.call_later)
 
 # --------------------------------------------------------------------------- #
 # Logger
 # --------------------------------------------------------------------------- #
-logging.basicConfig(
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    level=logging.INFO,
-)
-log = logging.getLogger("calib_fast")
+# Cola + logs/calib_fast.log rotativo. Las lecturas por muestra van a su propia categoría,
+# muestreada 1 de cada SAMPLE_LOG_EVERY para no saturar la consola a 80 Hz por baldosa
+SAMPLE_LOG_EVERY = 10
+rockfit_logging.setup(logging.INFO, filename="calib_fast.log",
+                      sampling={"calib_fast.samples": SAMPLE_LOG_EVERY})
+log = rockfit_logging.get_logger("calib_fast")
+sample_log = rockfit_logging.get_logger("calib_fast.samples")
 
 # --------------------------------------------------------------------------- #
 # MQTT callbacks
 # --------------------------------------------------------------------------- #
 def on_connect(client, *_):
-    log.info(f"Conectado a {BROKER}:{PORT}")
+    log.info("Conectado a %s:%s", BROKER, PORT)
     for tile in TILES:
         client.subscribe(LOADCELL_T.format(tile=tile), qos=0)  # QoS 0 = mínima latencia
+        client.subscribe(LED_STATE_T.format(tile=tile), qos=0)  # ecos: latencia por baldosa
     log.info("Suscrito a loadcells de tile4‑6")
 
+def on_publish(client, userdata, mid, *_):
+    outbox.acked(mid)
+
 def on_message(client, userdata, msg):
+    if is_light_state(msg.topic):
+        limiter.echo(command_topic_for(msg.topic))
+        return
     tile = msg.topic.split("/")[1]
     try:
         raw = int(msg.payload.decode())
@@ -79,7 +107,7 @@ def on_message(client, userdata, msg):
         samples_left[tile] -= 1
         if samples_left[tile] == 0:
             tare[tile] //= N_TARE_SAMPLES
-            log.info(f"{tile}: tara={tare[tile]}")
+            log.info("%s: tara=%s", tile, tare[tile])
         return
 
     delta = raw - tare[tile]
@@ -88,14 +116,15 @@ def on_message(client, userdata, msg):
     if last_delta[tile] is None or abs(delta - last_delta[tile]) >= CHANGE_THRESHOLD:
         last_delta[tile] = delta
         brightness = 0 if delta <= 0 else min(int(delta * 255 / COUNTS_FULL_SCALE), 255)
-        client.publish(LED_CMD_T.format(tile=tile), json.dumps(blue(brightness)), qos=0)
-        log.info(f"{tile:5s} raw={raw:>8d}  Δ={delta:>8d}  br={brightness:3d}")
+        outbox.put(LED_CMD_T.format(tile=tile), json.dumps(blue(brightness)), client=client)
+        sample_log.info("%-5s raw=%8d  Δ=%8d  br=%3d", tile, raw, delta, brightness)
 
 # --------------------------------------------------------------------------- #
 def main():
     client = mqtt.Client()  # callback_api_version=5 si tu Paho es 2.x
     client.on_connect = on_connect
     client.on_message = on_message
+    client.on_publish = on_publish
     client.enable_logger(log)
 
     client.connect(BROKER, PORT, keepalive=30)  # keepalive bajo: detecta cortes antes